@@ -14,6 +14,8 @@
 
 import logging
 import os
+import signal
+import sys
 import traceback
 
 from container_crawler.crawler import Crawler
@@ -49,6 +51,12 @@ def main():
         conf['verification_slack'] = 60
     factory = SyncContainerFactory(conf)
 
+    def _stop(signum, _frame):
+        # Unwinds to the status flush below
+        sys.exit(0)
+
+    signal.signal(signal.SIGTERM, _stop)
+    factory.start_status_flusher()
     try:
         crawler = Crawler(conf, factory, logger)
         if args.once:
@@ -59,6 +67,9 @@ def main():
         logger.error("S3Sync failed: %s" % repr(e))
         logger.error(traceback.format_exc(e))
         exit(1)
+    finally:
+        # Write out any status updates that are still cached
+        factory.flush_status()
 
 
 if __name__ == '__main__':
@@ -12,6 +12,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import eventlet
 import json
 import os
 import pwd
@@ -31,12 +32,12 @@ from swift.proxy.server import Application as ProxyApplication
 from s3_sync.cloud_connector.auth import S3_IDENTITY_ENV_KEY
 from s3_sync.cloud_connector.util import (
     get_and_write_conf_file_from_s3, get_env_options, ConfigReloaderMixin)
-from s3_sync.provider_factory import create_provider
+from s3_sync.provider_factory import ProviderCache
 from s3_sync.shunt import maybe_munge_profile_for_all_containers
 from s3_sync.utils import (
-    get_list_params, filter_hop_by_hop_headers, iter_listing, splice_listing,
-    format_listing_response, SHUNT_BYPASS_HEADER, get_listing_content_type,
-    SeekableFileLikeIter)
+    get_list_params, filter_hop_by_hop_headers, iter_listing,
+    iter_splice_listing, iter_listing_response, SHUNT_BYPASS_HEADER,
+    get_listing_content_type, SeekableFileLikeIter)
 
 
 CLOUD_CONNECTOR_CONF_PATH = os.path.sep + os.path.join(
@@ -66,16 +67,14 @@ class CloudConnectorController(Controller):
         self.local_to_me_profile, per_account = \
             maybe_munge_profile_for_all_containers(local_to_me_profile,
                                                    container_name)
-        self.local_to_me_provider = create_provider(
-            self.local_to_me_profile, max_conns=1, per_account=per_account,
-            logger=self.app.logger)
+        self.local_to_me_provider = self.app.get_provider(
+            self.local_to_me_profile, per_account=per_account)
 
         self.remote_to_me_profile, per_account = \
             maybe_munge_profile_for_all_containers(remote_to_me_profile,
                                                    container_name)
-        self.remote_to_me_provider = create_provider(
-            self.remote_to_me_profile, max_conns=1, per_account=per_account,
-            logger=self.app.logger,
+        self.remote_to_me_provider = self.app.get_provider(
+            self.remote_to_me_profile, per_account=per_account,
             extra_headers={SHUNT_BYPASS_HEADER: 'true'})
 
         self.aco_str = urllib.quote('/'.join(filter(None, (
@@ -125,9 +124,14 @@ class CloudConnectorController(Controller):
         # TODO(darrell): handle "path" presence kind of like the Shunt does?
         # Figure that out when adding Swift API support.
 
+        # Both sides are listed concurrently
+        remote_listing = eventlet.greenthread.spawn(
+            iter_listing, self.remote_to_me_provider.list_objects,
+            self.app.logger, marker, limit, prefix, delimiter,
+            max_entries=limit)
         local_resp, local_iter = iter_listing(
             self.local_to_me_provider.list_objects, self.app.logger, marker,
-            limit, prefix, delimiter)
+            limit, prefix, delimiter, max_entries=limit)
         if local_resp.success:
             final_status = local_resp.status
             final_headers = local_resp.headers
@@ -136,15 +140,14 @@ class CloudConnectorController(Controller):
                 self.app.logger.debug('handle_object_listing: local-to-me '
                                       'for %s got %d', self.aco_str,
                                       local_resp.status)
+                remote_listing.kill()
                 return local_resp.to_swob_response(req=req)
-            # This is ok because splice_listing() only iterates over the
+            # This is ok because iter_splice_listing() only iterates over the
             # local_iter--it doesn't try to call next() or anything if it's
             # empty.
             local_iter = []
 
-        remote_resp, remote_iter = iter_listing(
-            self.remote_to_me_provider.list_objects, self.app.logger, marker,
-            limit, prefix, delimiter)
+        remote_resp, remote_iter = remote_listing.wait()
         if not remote_resp.success:
             if not local_resp.success:
                 # Two strikes and you're OUT!
@@ -166,21 +169,18 @@ class CloudConnectorController(Controller):
         self.app.logger.debug('handle_object_listing: final_status/headers: '
                               '%r %r', final_status, final_headers)
 
-        spliced = splice_listing(local_iter, remote_iter, limit)
-        self.app.logger.debug('handle_object_listing: spliced: %r', spliced)
-
-        response_body = format_listing_response(spliced, resp_type,
-                                                self.container_name)
-        self.app.logger.debug('handle_object_listing: response_body: %r',
-                              response_body)
+        # The spliced listing is streamed, rather than rendered up front
+        spliced = iter_splice_listing(local_iter, remote_iter, limit)
+        app_iter = iter_listing_response(spliced, resp_type,
+                                         self.container_name)
         encoded_headers = {
             k.encode('utf8'): v.encode('utf8')
             for k, v in final_headers.items()
-            if k.lower not in ('content-type', 'content-length')}
+            if k.lower() not in ('content-type', 'content-length')}
 
         no_hop_headers = dict(
             filter_hop_by_hop_headers(encoded_headers.items()))
-        return swob.Response(body=response_body,
+        return swob.Response(app_iter=app_iter,
                              status=final_status,
                              headers=no_hop_headers, request=req,
                              content_type=resp_type)
@@ -490,6 +490,11 @@ class CloudConnectorApplication(ConfigReloaderMixin, ProxyApplication):
         self.memcache = 'look but dont touch'
 
         self.swift_baseurl = conf.get('swift_baseurl')
+        # Providers (and their connections) are reused across requests
+        self.provider_max_conns = int(conf.get('provider_max_conns', 10))
+        self.provider_cache = ProviderCache(
+            int(conf.get('provider_cache_size', 1000)),
+            int(conf.get('provider_idle_timeout', 600)))
         sync_conf_obj_name = conf.get(
             'conf_file', '/etc/swift-s3-sync/sync.json').lstrip('/')
 
@@ -514,6 +519,13 @@ class CloudConnectorApplication(ConfigReloaderMixin, ProxyApplication):
             key = (cont['account'].encode('utf-8'),
                    cont['container'].encode('utf-8'))
             self.sync_profiles[key] = cont
+        self.provider_cache.clear()
+
+    def get_provider(self, profile, per_account=False, extra_headers=None):
+        # Rather than wait on a busy provider, we fall back to a new one
+        return self.provider_cache.get_provider(
+            profile, self.provider_max_conns, per_account=per_account,
+            logger=self.logger, extra_headers=extra_headers, needed_conns=1)
 
     def __call__(self, *args, **kwargs):
         self.reload_confs()
@@ -19,20 +19,27 @@ eventlet.patcher.monkey_patch(all=True)
 
 import datetime
 import errno
+import hashlib
+import heapq
 import itertools
 import json
 import logging
 import os
 import re
+import signal
+import string
+import struct
 import sys
 import tempfile
 import time
 import traceback
+import urllib
 
-from collections import namedtuple
+from collections import deque, namedtuple, OrderedDict
 from container_crawler.utils import create_internal_client
 from functools import partial
 import swift.common.constraints
+import swift.common.utils
 from swift.common.http import HTTP_NOT_FOUND, HTTP_CONFLICT
 from swift.common.internal_client import UnexpectedResponse
 from swift.common import swob
@@ -50,7 +57,8 @@ from .utils import (convert_to_local_headers, convert_to_swift_headers,
                     create_x_timestamp_from_hdrs, diff_container_headers,
                     diff_account_headers, EPOCH, get_container_headers,
                     get_slo_etag, get_sys_migrator_header,
-                    iter_internal_listing, iter_listing, MANIFEST_HEADER,
+                    iter_internal_listing, iter_listing,
+                    iter_prefetched_pages, MANIFEST_HEADER,
                     MigrationContainerStates, REMOTE_ETAG, RemoteHTTPError,
                     SeekableFileLikeIter, SWIFT_TIME_FMT)
 
@@ -59,13 +67,21 @@ ETAG_DIFF = 1
 TIME_DIFF = 2
 LOGGER_NAME = 'swift-s3-migrator'
 
-IGNORE_KEYS = set(('status', 'aws_secret', 'all_buckets', 'custom_prefix'))
+# The scheduling settings of a migration (weight, max_workers) may be changed
+# without starting the migration over.
+IGNORE_KEYS = set(('status', 'aws_secret', 'all_buckets', 'custom_prefix',
+                   'weight', 'max_workers', 'server_side_copy'))
 
 MigrateObjectWork = namedtuple('MigrateObjectWork',
-                               'aws_bucket container key ts')
+                               'aws_bucket container key ts size')
 UploadObjectWork = namedtuple('UploadObjectWork', 'container key object '
                               'headers aws_bucket')
+ObjectEventWork = namedtuple('ObjectEventWork',
+                             'aws_bucket container key event primary')
 S3_MPU_RE = re.compile('[0-9a-z]+-(\d+)$')
+# Characters probed when sampling the source listing for shard boundaries
+SHARD_PROBE_CHARS = sorted(string.digits + string.ascii_letters)
+SHARD_PROBE_DEPTH = 8
 
 
 class Selector(object):
@@ -85,24 +101,88 @@ class Selector(object):
     container and each server will process approximately 1/N objects in
     their primary queue (where N is the number of container servers). The
     remaining objects will be in the verify queue.
+
+    When there are multiple migrator processes on a server, the containers
+    are further divided between them by their ring partition.
+
+    The ring lookups are cached until the ring changes: the containers and
+    whether the local server is the primary for every partition. The objects
+    of a container are hashed starting from the hashed container path, which
+    gives the same partitions as the ring.
     """
+    # Number of objects between checks whether the ring has changed
+    RING_CHECK_OBJECTS = 10000
+    MAX_CACHED_CONTAINERS = 100000
 
-    def __init__(self, myips, ring):
+    def __init__(self, myips, ring, process=0, processes=1):
         self.myips = myips
         self.ring = ring
+        self.process = process
+        self.processes = processes
+        self._devs = None
+        self._containers = {}
+        self._primary_parts = {}
+        self._container_hash = (None, None)
+        self._objects_hashed = 0
+
+    def _check_ring(self):
+        # Reading the devices reloads the ring if it changed
+        devs = self.ring.devs
+        if devs is not self._devs:
+            self._devs = devs
+            self._containers = {}
+            self._primary_parts = {}
+            self._container_hash = (None, None)
+
+    def _get_container(self, account, container):
+        self._check_ring()
+        key = (account, container)
+        if key not in self._containers:
+            if len(self._containers) >= self.MAX_CACHED_CONTAINERS:
+                self._containers = {}
+            part, container_nodes = self.ring.get_nodes(
+                account.encode('utf-8'), container.encode('utf-8'))
+            self._containers[key] = (part, any(
+                is_local_device(self.myips, None, node['ip'], node['port'])
+                for node in container_nodes))
+        return self._containers[key]
+
+    def _get_object_part(self, account, container, obj):
+        # See swift.common.utils.hash_path()
+        if self._objects_hashed % self.RING_CHECK_OBJECTS == 0:
+            self._check_ring()
+        self._objects_hashed += 1
+        if self._container_hash[0] != (account, container):
+            hasher = hashlib.md5(
+                swift.common.utils.HASH_PATH_PREFIX + '/' +
+                account.encode('utf-8') + '/' + container.encode('utf-8') +
+                '/')
+            self._container_hash = ((account, container), hasher)
+        hasher = self._container_hash[1].copy()
+        hasher.update(
+            obj.encode('utf-8') + swift.common.utils.HASH_PATH_SUFFIX)
+        return struct.unpack_from('>I', hasher.digest())[0] >> (
+            32 - self.ring.part_power)
+
+    def is_process_container(self, account, container):
+        if self.processes == 1:
+            return True
+        part, _ = self._get_container(account, container)
+        return part % self.processes == self.process
 
     def is_local_container(self, account, container):
-        _, container_nodes = self.ring.get_nodes(account.encode('utf-8'),
-                                                 container.encode('utf-8'))
-        return any(is_local_device(self.myips, None, node['ip'], node['port'])
-                   for node in container_nodes)
+        part, is_local = self._get_container(account, container)
+        if part % self.processes != self.process:
+            return False
+        return is_local
 
     def is_primary(self, account, container, obj):
-        _, container_nodes = self.ring.get_nodes(account.encode('utf-8'),
-                                                 container.encode('utf-8'),
-                                                 obj.encode('utf-8'))
-        return is_local_device(self.myips, None, container_nodes[0]['ip'],
-                               container_nodes[0]['port'])
+        part = self._get_object_part(account, container, obj)
+        if part not in self._primary_parts:
+            primary = self.ring.get_part_nodes(part)[0]
+            self._primary_parts[part] = is_local_device(
+                self.myips, None, primary['ip'], primary['port'])
+        return self._primary_parts[part]
 
 
 class MigrationError(Exception):
@@ -224,14 +304,61 @@ def _create_put_headers(headers, timestamp=0):
     return ret
 
 
+def _migration_key(migration):
+    key = dict((k, v) for k, v in migration.items() if k not in IGNORE_KEYS)
+    if 'container' not in key:
+        key['container'] = key.get('aws_bucket')
+    return json.dumps(key, sort_keys=True)
+
+
+def _is_partial_migration(migration):
+    # Such migrations may be equal to entries with a different key (see
+    # equal_migration()) and cannot be looked up by their key alone.
+    return 'container' not in migration or '/*' in (
+        migration.get('aws_bucket'), migration.get('container'))
+
+
 class Status(object):
+    """Migration status store.
+
+    The status entries are kept in memory, indexed by the migration they
+    belong to. The status file holds a JSON list of all entries. Rather than
+    rewriting the file on every update, updated entries are appended to a
+    journal next to it, which is replayed on load. The status file is
+    rewritten (and the journal removed) when the entries are pruned at the end
+    of every migrator cycle.
+    """
     CORRUPTED_SUFFIX = 'corrupted'
+    JOURNAL_SUFFIX = 'journal'
 
-    def __init__(self, status_location):
+    def __init__(self, status_location, seed_location=None):
         self.status_location = status_location
-        self.status_list = None
+        self.journal_location = '.'.join(
+            [status_location, self.JOURNAL_SUFFIX])
+        # The status to start from while there is no status file (e.g. the
+        # status of a single migrator process, when switching to several)
+        self.seed_location = seed_location
+        self.status_index = None
+        self.has_partial_entries = False
         self.logger = logging.getLogger(LOGGER_NAME)
 
+    @property
+    def status_list(self):
+        if self.status_index is None:
+            return None
+        return self.status_index.values()
+
+    @status_list.setter
+    def status_list(self, status_list):
+        if status_list is None:
+            self.status_index = None
+            self.has_partial_entries = False
+            return
+        self.status_index = OrderedDict(
+            (_migration_key(entry), entry) for entry in status_list)
+        self.has_partial_entries = any(
+            _is_partial_migration(entry) for entry in status_list)
+
     def _move_stats(self):
         try:
             index = 1
@@ -249,29 +376,85 @@ class Status(object):
         except Exception as e:
             self.logger.error('Fatal error: failed to move stats (%s).' % e)
 
-    def load_status_list(self):
-        self.status_list = []
+    def _load_status_file(self):
         try:
             with open(self.status_location) as fh:
-                self.status_list = json.load(fh)
+                return json.load(fh)
         except ValueError as e:
             if str(e) == 'No JSON object could be decoded':
                 # This happens when we have an empty file
-                return
+                return []
             # Regardless of whether we moved the stats or not, we will be
             # restarting the stats from an empty list.
             self._move_stats()
         except IOError as e:
             if e.errno != errno.ENOENT:
                 raise
+        return []
+
+    def _replay_journal(self):
+        try:
+            with open(self.journal_location) as fh:
+                lines = fh.readlines()
+        except IOError as e:
+            if e.errno != errno.ENOENT:
+                raise
+            return
+        for index, line in enumerate(lines):
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # The last entry may be incomplete if we were killed while
+                # appending it.
+                if index != len(lines) - 1:
+                    self.logger.warning(
+                        'Skipping corrupted status journal entry: %r' % line)
+                continue
+            self._add_entry(entry)
+
+    def _add_entry(self, entry):
+        self.status_index[_migration_key(entry)] = entry
+        if _is_partial_migration(entry):
+            self.has_partial_entries = True
+
+    def _find_entry(self, migration):
+        entry = self.status_index.get(_migration_key(migration))
+        if entry is not None:
+            return entry
+        if not self.has_partial_entries and\
+                not _is_partial_migration(migration):
+            return None
+        for entry in self.status_index.values():
+            if equal_migration(entry, migration):
+                return entry
+        return None
+
+    def load_status_list(self):
+        if self.seed_location and not os.path.exists(self.status_location):
+            seed = Status(self.seed_location)
+            seed.load_status_list()
+            self.status_list = seed.status_list
+        else:
+            self.status_list = self._load_status_file()
+        self._replay_journal()
 
     def get_migration(self, migration):
-        if not self.status_list:
+        if not self.status_index:
             self.load_status_list()
-        for entry in self.status_list:
-            if equal_migration(entry, migration):
-                return entry.get('status', {})
-        return {}
+        entry = self._find_entry(migration)
+        if entry is None:
+            return {}
+        return entry.get('status', {})
+
+    def _create_status_dir(self, write_func):
+        try:
+            write_func()
+        except (IOError, OSError) as e:
+            if e.errno == errno.ENOENT:
+                os.mkdir(os.path.dirname(self.status_location), 0755)
+                write_func()
+            else:
+                raise
 
     def save_status_list(self):
         def _writeout_status_list():
@@ -283,58 +466,408 @@ class Status(object):
                 json.dump(self.status_list, tmp_fh)
             os.rename(tmp_fh.name, self.status_location)
 
+        self._create_status_dir(_writeout_status_list)
+        # All of the journaled entries are now in the status file
         try:
-            _writeout_status_list()
+            os.unlink(self.journal_location)
         except OSError as e:
-            if e.errno == errno.ENOENT:
-                os.mkdir(os.path.dirname(self.status_location), 0755)
-                _writeout_status_list()
-            else:
+            if e.errno != errno.ENOENT:
                 raise
 
+    def save_status_entry(self, entry):
+        def _append_entry():
+            with open(self.journal_location, 'a') as fh:
+                fh.write(json.dumps(entry) + '\n')
+
+        self._create_status_dir(_append_entry)
+
     def save_migration(self, migration, marker, moved_count, scanned_count,
-                       bytes_count, stats_reset=False):
+                       bytes_count, stats_reset=False, shards=None,
+                       extra_status=None):
         if not isinstance(stats_reset, bool):
             raise ValueError('stats_reset must be a boolean')
         if not all(map(lambda k: type(k) is int,
                        [moved_count, scanned_count, bytes_count])):
             raise ValueError('counts must be integers')
-        for entry in self.status_list:
-            if equal_migration(entry, migration):
-                if 'status' not in entry:
-                    entry['status'] = {}
-                if 'aws_secret' in entry:
-                    entry.pop('aws_secret', None)
-                status = entry['status']
-                break
+        if self.status_index is None:
+            self.load_status_list()
+        entry = self._find_entry(migration)
+        if entry is not None:
+            if 'status' not in entry:
+                entry['status'] = {}
+            if 'aws_secret' in entry:
+                entry.pop('aws_secret', None)
         else:
             entry = dict(migration)
             entry.pop('aws_secret', None)
             entry['status'] = {}
-            self.status_list.append(entry)
-            status = entry['status']
+            self._add_entry(entry)
+        status = entry['status']
 
         status['marker'] = marker
+        if shards is not None:
+            status['shards'] = shards
+        else:
+            status.pop('shards', None)
+        if extra_status:
+            status.update(extra_status)
         _update_status_counts(
             status, moved_count, scanned_count, bytes_count, stats_reset)
-        self.save_status_list()
+        self.save_status_entry(entry)
 
     def prune(self, migrations):
         self.load_status_list()
+        keep_keys = set()
+        unmatched = []
+        for migration in migrations:
+            key = _migration_key(migration)
+            if key in self.status_index:
+                keep_keys.add(key)
+            else:
+                unmatched.append(migration)
         keep_status_list = []
-        for entry in self.status_list:
-            for migration in migrations:
-                if equal_migration(entry, migration):
-                    keep_status_list.append(entry)
-                    break
+        for key, entry in self.status_index.items():
+            if key in keep_keys or any(equal_migration(entry, migration)
+                                       for migration in unmatched):
+                keep_status_list.append(entry)
         self.status_list = keep_status_list
         self.save_status_list()
 
 
+class WorkQueue(eventlet.queue.PriorityQueue):
+    '''Queue of the objects to migrate, handed out in the configured order.
+
+    The objects found in the listings are ordered by size (small_first or
+    large_first), by their timestamp (oldest_first or newest_first), by key,
+    or in the order they were listed (fifo). Work queued while migrating
+    another object (e.g. the segments of a large object and its manifest)
+    comes before any of the listed objects and the markers that stop the
+    workers come last.
+    '''
+    ORDERS = {
+        'fifo': None,
+        'small_first': lambda work: work.size,
+        'large_first': lambda work: -work.size,
+        'oldest_first': lambda work: work.ts,
+        'newest_first': lambda work: -work.ts,
+        'key': lambda work: work.key,
+    }
+
+    def __init__(self, maxsize=None, order='fifo'):
+        if order not in self.ORDERS:
+            raise ValueError('Invalid queue order: %s' % order)
+        self.order = order
+        self._counter = itertools.count()
+        super(WorkQueue, self).__init__(maxsize)
+
+    def _priority(self, work):
+        if self.order == 'fifo':
+            return (1,)
+        if work is None:
+            return (2,)
+        if isinstance(work, MigrateObjectWork) and work.size is not None:
+            return (1, self.ORDERS[self.order](work))
+        return (0,)
+
+    def _put(self, item, heappush=heapq.heappush):
+        super(WorkQueue, self)._put(
+            (self._priority(item), next(self._counter), item), heappush)
+
+    def _get(self, heappop=heapq.heappop):
+        return super(WorkQueue, self)._get(heappop)[-1]
+
+
+class WorkSpool(object):
+    '''Backlog of the objects to verify after the primary pass.
+
+    The first memory_limit objects are kept in memory and the rest are
+    written to a temporary file (one JSON list per line), so that the memory
+    used does not depend on the size of the container. The objects are read
+    back in the order they were added.
+    '''
+    def __init__(self, memory_limit=10000, spool_dir=None):
+        self.memory_limit = memory_limit
+        self.spool_dir = spool_dir
+        self._memory = deque()
+        self._file = None
+        self._spooled = 0
+
+    def __len__(self):
+        return len(self._memory) + self._spooled
+
+    def put(self, work):
+        if self._file is None:
+            if len(self._memory) < self.memory_limit:
+                self._memory.append(work)
+                return
+            self._file = tempfile.TemporaryFile(dir=self.spool_dir)
+        self._file.write(json.dumps(list(work)) + '\n')
+        self._spooled += 1
+
+    def drain(self):
+        while self._memory:
+            yield self._memory.popleft()
+        if self._file is None:
+            return
+        self._file.seek(0)
+        try:
+            for line in self._file:
+                self._spooled -= 1
+                yield MigrateObjectWork(*json.loads(line))
+        finally:
+            self.close()
+
+    def close(self):
+        self._memory.clear()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self._spooled = 0
+
+
+class MigratedObjects(object):
+    '''Bounded index of the objects uploaded by the migrator.
+
+    Objects that were removed from the source can be removed from Swift
+    without checking them for the migrator header (HEAD), as long as the
+    index has their upload timestamp and the local listing still shows it
+    (i.e. the object was not overwritten since). The least recently uploaded
+    objects are dropped when there are more than max_size of them.
+    '''
+    def __init__(self, max_size=100000):
+        self.max_size = max_size
+        self._objects = OrderedDict()
+
+    def __len__(self):
+        return len(self._objects)
+
+    def add(self, account, container, key, timestamp):
+        if not self.max_size:
+            return
+        path = (account, container, key)
+        self._objects.pop(path, None)
+        self._objects[path] = Timestamp(timestamp)
+        while len(self._objects) > self.max_size:
+            self._objects.popitem(last=False)
+
+    def pop(self, account, container, key):
+        return self._objects.pop((account, container, key), None)
+
+
+ObjectEvent = namedtuple('ObjectEvent', 'key removed size last_modified')
+
+
+class EventLog(object):
+    '''Reads S3 event notifications from a file or a directory of files.
+
+    Every line holds either a notification message (with a list of
+    "Records") or a single record. The files are read incrementally: read()
+    returns the object events appended since the previous call, as the
+    latest event for every key by bucket. Lines that are not terminated yet
+    are read on the following call.
+    '''
+    def __init__(self, path, logger):
+        self.path = path
+        self.logger = logger
+        self._offsets = {}
+
+    def _list_files(self):
+        if os.path.isdir(self.path):
+            return sorted(os.path.join(self.path, name)
+                          for name in os.listdir(self.path)
+                          if not name.startswith('.'))
+        if os.path.exists(self.path):
+            return [self.path]
+        return []
+
+    def _parse(self, line, events):
+        try:
+            message = json.loads(line)
+            for record in message.get('Records', [message]):
+                name = record.get('eventName', '')
+                if not name.startswith(('ObjectCreated:', 'ObjectRemoved:')):
+                    # e.g. the s3:TestEvent message
+                    continue
+                bucket = record['s3']['bucket']['name']
+                s3_object = record['s3']['object']
+                # The keys are URL-encoded in the notifications
+                key = urllib.unquote_plus(
+                    s3_object['key'].encode('utf-8')).decode('utf-8')
+                bucket_events = events.setdefault(bucket, OrderedDict())
+                bucket_events.pop(key, None)
+                bucket_events[key] = ObjectEvent(
+                    key, name.startswith('ObjectRemoved:'),
+                    s3_object.get('size'), self._parse_time(
+                        record['eventTime']))
+        except (AttributeError, KeyError, TypeError, ValueError):
+            self.logger.warning('Invalid event notification: %s' % line)
+
+    @staticmethod
+    def _parse_time(event_time):
+        '''Normalizes the eventTime of a record to SWIFT_TIME_FMT.
+
+        Some S3-compatible stores leave out the milliseconds. Raises
+        ValueError if the time is in neither format.
+        '''
+        event_time = event_time.rstrip('Z')
+        try:
+            datetime.datetime.strptime(event_time, SWIFT_TIME_FMT)
+        except ValueError:
+            datetime.datetime.strptime(event_time, '%Y-%m-%dT%H:%M:%S')
+            event_time += '.000'
+        return event_time
+
+    def read(self):
+        events = {}
+        offsets = {}
+        for path in self._list_files():
+            offset = self._offsets.get(path, 0)
+            try:
+                with open(path) as fp:
+                    fp.seek(0, os.SEEK_END)
+                    if fp.tell() < offset:
+                        # The file was truncated
+                        offset = 0
+                    fp.seek(offset)
+                    while True:
+                        line = fp.readline()
+                        if not line.endswith('\n'):
+                            break
+                        offset += len(line)
+                        if line.strip():
+                            self._parse(line, events)
+            except IOError as e:
+                if e.errno != errno.ENOENT:
+                    raise
+                continue
+            offsets[path] = offset
+        # Forget the files that were removed
+        self._offsets = offsets
+        return events
+
+
+class WorkerAutoscaler(object):
+    '''Adjusts the number of upload workers that may run at once.
+
+    All of the workers are started, but only "limit" of them process objects
+    at the same time. The limit starts at min_workers and is adjusted after
+    every interval (additive increase, multiplicative decrease): it is halved
+    if too many of the uploads failed, or if the throughput dropped while the
+    latency went up; otherwise, it is incremented if all of the allowed
+    workers were busy.
+    '''
+    MAX_ERROR_RATE = 0.05
+    TOLERANCE = 0.1
+
+    def __init__(self, min_workers, max_workers, interval=10):
+        self.min_workers = max(1, min(min_workers, max_workers))
+        self.max_workers = max_workers
+        # Kept for when max_workers changes (see set_max_workers())
+        self._min_setting = min_workers
+        self._enabled = self.min_workers < self.max_workers
+        self.interval = interval
+        self.limit = self.min_workers
+        self.busy = 0
+        self._slots = eventlet.semaphore.Semaphore(self.limit)
+        # Slots to take away from the workers as they finish
+        self._debt = 0
+        self._last = None
+        self.gauges = {}
+        self._reset_window(time.time())
+
+    @property
+    def enabled(self):
+        return self._enabled
+
+    def set_max_workers(self, max_workers):
+        '''Changes the number of workers that may run at once.
+
+        Used as the migration gets a different share of the workers. Without
+        autoscaling, the limit is always the maximum.
+        '''
+        self.max_workers = max(1, max_workers)
+        if self.enabled:
+            self.min_workers = max(1, min(self._min_setting, self.max_workers))
+            self._set_limit(self.limit)
+        else:
+            self.min_workers = self.max_workers
+            self._set_limit(self.max_workers)
+
+    def _reset_window(self, now):
+        self._window_start = now
+        self._peak = self.busy
+        self._items = 0
+        self._errors = 0
+        self._bytes = 0
+        self._latency = 0
+
+    def acquire(self):
+        self._slots.acquire()
+
+    def start(self):
+        self.busy += 1
+        self._peak = max(self._peak, self.busy)
+
+    def finish(self, elapsed, bytes_copied, error=False):
+        self.busy -= 1
+        self._items += 1
+        self._bytes += bytes_copied
+        self._latency += elapsed
+        if error:
+            self._errors += 1
+
+    def release(self):
+        if self._debt:
+            self._debt -= 1
+        else:
+            self._slots.release()
+
+    def _set_limit(self, limit):
+        limit = max(self.min_workers, min(self.max_workers, limit))
+        while self.limit < limit:
+            self.release()
+            self.limit += 1
+        while self.limit > limit:
+            if not self._slots.acquire(blocking=False):
+                self._debt += 1
+            self.limit -= 1
+
+    def adjust(self, now):
+        elapsed = now - self._window_start
+        if not self._items or elapsed <= 0:
+            self._reset_window(now)
+            return
+        throughput = self._bytes / elapsed
+        latency = self._latency / self._items
+        error_rate = self._errors / float(self._items)
+        saturated = self._peak >= self.limit
+        if error_rate > self.MAX_ERROR_RATE:
+            self._set_limit(self.limit // 2)
+        elif self._last and \
+                throughput < self._last[0] * (1 - self.TOLERANCE) and \
+                latency > self._last[1] * (1 + self.TOLERANCE):
+            self._set_limit(self.limit // 2)
+        elif saturated:
+            self._set_limit(self.limit + 1)
+        self._last = (throughput, latency)
+        self.gauges = {'workers.limit': self.limit,
+                       'workers.throughput': throughput,
+                       'workers.latency': latency,
+                       'workers.error_rate': error_rate}
+        self._reset_window(now)
+
+
 class Migrator(object):
     '''List and move objects from a remote store into the Swift cluster'''
     def __init__(self, config, status, work_chunk, workers, swift_pool, logger,
-                 selector, segment_size, stats_factory):
+                 selector, segment_size, stats_factory, segment_workers=1,
+                 listing_shards=1, listing_prefetch=1, reconcile_workers=1,
+                 migrated_objects=None, min_workers=None,
+                 autoscale_interval=10, container_workers=1,
+                 queue_order='fifo', queue_size=None,
+                 verify_queue_memory=10000, spool_dir=None,
+                 skip_unchanged=False, max_skip_time=3600, events=None,
+                 full_scan_interval=3600, max_conns=None):
         self.config = dict(config)
         if 'container' not in self.config:
             # NOTE: in the future this may no longer be true, as we may allow
@@ -346,20 +879,57 @@ class Migrator(object):
         self.config['custom_prefix'] = ''
         self.status = status
         self.work_chunk = work_chunk
-        self.max_conns = swift_pool.max_size
-        self.verify_queue = eventlet.queue.Queue()
-        self.primary_queue = eventlet.queue.Queue(self.max_conns * 2)
+        # The number of connections to the remote store
+        self.max_conns = max_conns or swift_pool.max_size
+        self.verify_queue_memory = verify_queue_memory
+        self.spool_dir = spool_dir
+        self.skip_unchanged = skip_unchanged
+        self.max_skip_time = max_skip_time
+        # Object events by source bucket. When they are provided, the listing
+        # only serves as a periodic check.
+        self.events = events
+        self.full_scan_interval = full_scan_interval
+        self.verify_queue = WorkSpool(verify_queue_memory, spool_dir)
+        self.queue_order = queue_order
+        self.queue_size = queue_size
+        self.primary_queue = WorkQueue(
+            queue_size or self.max_conns * 2, queue_order)
         self.object_queue = self.primary_queue
         self.container_queue = eventlet.queue.Queue()
         self.ic_pool = swift_pool
         self.errors = eventlet.queue.Queue()
         self.workers = workers
+        self.autoscaler = WorkerAutoscaler(
+            min_workers or workers, workers, autoscale_interval)
         self.logger = logger
         self.selector = selector
         self.provider = None
+        # The source account, if it is in this cluster and the objects can be
+        # copied server-side. Detected on every pass.
+        self.source_account = None
         self.gthread_local = eventlet.corolocal.local()
         self.segment_size = segment_size
+        self.segment_workers = segment_workers
+        self.listing_shards = listing_shards
+        self.listing_prefetch = listing_prefetch
+        # In the "/*" mode, multiple containers may be migrated at once.
+        self.container_workers = container_workers
+        self.container_pool = None
+        if container_workers > 1:
+            self.container_pool = eventlet.GreenPool(container_workers)
+        # Objects removed from the source are queued for a separate pool of
+        # workers, so that the listing does not wait on the DELETE requests.
+        self.reconcile_workers = reconcile_workers
+        self.delete_queue = eventlet.queue.Queue(reconcile_workers * 2)
+        self.delete_pool = None
+        # Deletions that failed since the deletion workers were started
+        self.delete_failures = 0
+        if migrated_objects is None:
+            migrated_objects = MigratedObjects(0)
+        self.migrated_objects = migrated_objects
         self.handled_containers = []
+        # Containers that failed to be migrated by their own Migrator
+        self.failed_containers = []
         self.storage_policy_idx = None
         if self.config.get('storage_policy'):
             policy = POLICIES.get_by_name(self.config['storage_policy'])
@@ -389,7 +959,7 @@ class Migrator(object):
         self.provider = create_provider(
             self.config, self.max_conns, False)
         try:
-            return self._reconcile_containers()
+            handled_containers = self._reconcile_containers()
         except Exception:
             # Any exception raised will terminate the migrator process. As the
             # process should be going around in a loop through the configured
@@ -399,6 +969,14 @@ class Migrator(object):
                               (self.config['account']))
             self.logger.error(''.join(traceback.format_exc()))
             return None
+        finally:
+            if self.container_pool:
+                self.container_pool.waitall()
+        if self.failed_containers:
+            # Treated like a listing error, so that none of the containers
+            # are pruned from the status.
+            return None
+        return handled_containers
 
     def _reconcile_containers(self):
         resp, iterator = iter_listing(
@@ -412,6 +990,7 @@ class Migrator(object):
             return None
 
         self.handled_containers = []
+        self.failed_containers = []
 
         # TODO: this is very similar to the code in _splice_listing() and
         # _find_missing_objects(). We might be able to provide a utility
@@ -431,16 +1010,24 @@ class Migrator(object):
 
             if self.selector.is_local_container(self.config['account'],
                                                 remote_container):
-                # NOTE: we cannot remap container names when migrating the
-                # entire account
-                self.config['aws_bucket'] = remote_container
-                self.config['container'] = remote_container
-                self.provider.aws_bucket = remote_container
-                self.handled_containers.append(dict(self.config))
-                # Update the stats reporter
-                self.stats_reporter = self.stats_factory.instance(
-                    build_statsd_prefix(self.config))
-                self._next_pass()
+                if self.container_pool:
+                    self.handled_containers.append(dict(
+                        self.config, aws_bucket=remote_container,
+                        container=remote_container))
+                    # Blocks if all of the container workers are busy
+                    self.container_pool.spawn_n(
+                        self._migrate_container, remote_container)
+                else:
+                    # NOTE: we cannot remap container names when migrating
+                    # the entire account
+                    self.config['aws_bucket'] = remote_container
+                    self.config['container'] = remote_container
+                    self.provider.aws_bucket = remote_container
+                    self.handled_containers.append(dict(self.config))
+                    # Update the stats reporter
+                    self.stats_reporter = self.stats_factory.instance(
+                        build_statsd_prefix(self.config))
+                    self._next_pass()
             if local_container and local_container['name'] == remote_container:
                 local_container = next(local_iterator)
 
@@ -449,6 +1036,49 @@ class Migrator(object):
             local_container = next(local_iterator)
         return self.handled_containers
 
+    def _migrate_container(self, container):
+        '''Migrate one of the containers of the account.
+
+        Used when migrating several containers at once: every container gets
+        its own Migrator (and therefore its own queues, stats and status
+        entry). The workers and the remote connections are split between the
+        containers and they share the internal client pool.
+        '''
+        config = dict(self.config, aws_bucket=container, container=container)
+        workers = max(1, self.workers // self.container_workers)
+        min_workers = max(
+            1, self.autoscaler.min_workers // self.container_workers)
+        migrator = None
+        try:
+            migrator = Migrator(
+                config, self.status, self.work_chunk, workers, self.ic_pool,
+                self.logger, self.selector, self.segment_size,
+                self.stats_factory, segment_workers=self.segment_workers,
+                listing_shards=self.listing_shards,
+                listing_prefetch=self.listing_prefetch,
+                reconcile_workers=self.reconcile_workers,
+                migrated_objects=self.migrated_objects,
+                min_workers=min_workers,
+                autoscale_interval=self.autoscaler.interval,
+                queue_order=self.queue_order, queue_size=self.queue_size,
+                verify_queue_memory=self.verify_queue_memory,
+                spool_dir=self.spool_dir, skip_unchanged=self.skip_unchanged,
+                max_skip_time=self.max_skip_time, events=self.events,
+                full_scan_interval=self.full_scan_interval,
+                max_conns=max(1, self.max_conns // self.container_workers))
+            migrator.next_pass()
+            # Includes any versioned containers handled along the way
+            self.handled_containers.extend(migrator.handled_containers)
+        except Exception:
+            # Any exception would otherwise be lost in the container pool.
+            self.failed_containers.append(container)
+            self.logger.error('Failed to migrate "%s/%s"' % (
+                self.config['account'], container))
+            self.logger.error(''.join(traceback.format_exc()))
+        finally:
+            if migrator:
+                migrator.close()
+
     def _process_account_metadata(self):
         if self.config.get('protocol') != 'swift':
             return
@@ -473,6 +1103,32 @@ class Migrator(object):
                         'Updated account metadata for %s: %s' %
                         (self.config['account'], header_changes.keys()))
 
+    def _get_same_cluster_account(self):
+        '''Returns the source account if it is in this cluster.
+
+        Only applies to the Swift migrations of a remote_account that enable
+        server_side_copy. The account is considered the same one if the
+        internal client finds it with the same creation and PUT timestamps.
+        '''
+        if self.config.get('protocol') != 'swift' or \
+                not self.config.get('server_side_copy') or \
+                not self.config.get('remote_account'):
+            return None
+        resp = self.provider.head_account()
+        if resp.status // 100 != 2:
+            return None
+        account = self.config['remote_account']
+        with self.ic_pool.item() as ic:
+            try:
+                local_headers = ic.get_account_metadata(account)
+            except UnexpectedResponse:
+                return None
+        for header in ('x-timestamp', 'x-put-timestamp'):
+            if header not in resp.headers or \
+                    resp.headers[header] != local_headers.get(header):
+                return None
+        return account
+
     def _process_dlos(self):
         while not self.container_queue.empty():
             # Additional containers that we have discovered we have to handle.
@@ -499,67 +1155,272 @@ class Migrator(object):
         # of an object appearing before its corresponding segments do.
         for aws_bucket, container, dlo, timestamp in self._manifests:
             self.object_queue.put(
-                MigrateObjectWork(aws_bucket, container, dlo, timestamp))
+                MigrateObjectWork(aws_bucket, container, dlo, timestamp, None))
 
     def _next_pass(self):
         self.object_queue = self.primary_queue
         self.stats = MigratorPassStats()
         self._process_account_metadata()
+        self.source_account = self._get_same_cluster_account()
+        state = self.status.get_migration(self.config)
+        fingerprint = self._get_fingerprint()
+        unchanged = self._is_unchanged(state, fingerprint)
+        events = None
+        if self.events:
+            events = self.events.get(self.config['aws_bucket'])
+        if unchanged and not events:
+            self.logger.debug(
+                'Skipping unchanged container "%s"' % self.config['container'])
+            self.status.save_migration(
+                self.config, state.get('marker', ''), 0, 0, 0,
+                shards=state.get('shards'))
+            return
         worker_pool = eventlet.GreenPool(self.workers)
         for _ in xrange(self.workers):
             worker_pool.spawn_n(self._upload_worker)
+        autoscale_thread = None
+        if self.autoscaler.enabled:
+            autoscale_thread = eventlet.greenthread.spawn(
+                self._autoscale_workers)
         is_reset = False
+        failed = False
         self._manifests = set()
-        marker = self.status.get_migration(self.config).get('marker', '')
+        marker = state.get('marker', '')
+        shards = None
         try:
-            marker = self._process_container(marker=marker)
-            if self.stats.scanned == 0:
-                is_reset = True
-                if marker:
-                    marker = self._process_container(marker='')
+            if events:
+                self._process_events(events)
+            if unchanged:
+                shards = state.get('shards')
+            elif self.listing_shards > 1:
+                shards, is_reset = self._get_listing_shards(state)
+                self._process_container(shards=shards)
+                marker = shards[0]['marker']
+            else:
+                marker = self._process_container(marker=marker)
+                if self.stats.scanned == 0 and self._is_scan_due(state):
+                    is_reset = True
+                    if marker:
+                        marker = self._process_container(marker='')
         except ContainerNotFound as e:
+            failed = True
             self.logger.error(unicode(e))
         except Exception:
             # We must catch any errors to make sure we stop our workers.
             # This might be better with a context manager.
+            failed = True
             self.logger.error('Failed to migrate "%s"' %
                               self.config['aws_bucket'])
             self.logger.error(''.join(traceback.format_exc()))
         self.object_queue.join()
+        # The object events may queue deletions, as well
+        self._stop_delete_workers()
         self._process_dlos()
         self.object_queue.join()
 
         # Process verify objects
-        while not self.verify_queue.empty():
-            self.object_queue.put(self.verify_queue.get())
+        for work in self.verify_queue.drain():
+            self.object_queue.put(work)
         self.object_queue.join()
         self._process_dlos()
         self.object_queue.join()
 
         self._stop_workers(self.object_queue)
+        if autoscale_thread:
+            autoscale_thread.kill()
+        failed = failed or not self.errors.empty()
         self.check_errors()
 
         # TODO: record the number of errors, as well
+        status_args = {}
+        if shards is not None:
+            status_args['shards'] = shards
+        extra_status = {}
+        if fingerprint is not None:
+            extra_status.update(self._get_scan_state(
+                state, fingerprint, is_reset, failed))
+        if self.events is not None and is_reset:
+            extra_status['scan_started'] = time.time()
+        if extra_status:
+            status_args['extra_status'] = extra_status
         self.status.save_migration(
             self.config, marker, self.stats.copied, self.stats.scanned,
-            self.stats.bytes_copied, is_reset)
+            self.stats.bytes_copied, is_reset, **status_args)
+
+    def _is_scan_due(self, state):
+        '''Whether a new scan of the containers may start.
+
+        With the event notifications, the containers are only listed every
+        full_scan_interval seconds, to catch any missed events.
+        '''
+        if self.events is None:
+            return True
+        return time.time() - state.get('scan_started', 0) >=\
+            self.full_scan_interval
+
+    def _process_events(self, events):
+        '''Queues the objects that the event notifications reported.
+
+        The objects are checked by the upload workers (see _process_event()).
+        Removed objects are only reconciled by the primary node.
+        '''
+        aws_bucket = self.config['aws_bucket']
+        container = self.config['container']
+        prefix = self.config.get('prefix', '')
+        for event in events.values():
+            if not event.key.startswith(prefix):
+                continue
+            primary = self.selector.is_primary(
+                self.config['account'], container, event.key)
+            if event.removed and not primary:
+                continue
+            if not event.removed and not self._old_enough(
+                    {'last_modified': event.last_modified}):
+                continue
+            self.object_queue.put(ObjectEventWork(
+                aws_bucket, container, event.key, event, primary))
+
+    def _process_event(self, work):
+        '''Handles an object event in an upload worker.
+
+        Created objects are migrated unless they are already in Swift (and are
+        queued for verification on the other nodes); removed objects are
+        reconciled if they are gone from the source.
+        '''
+        event = work.event
+        if event.removed:
+            resp = self.provider.head_object(work.key, bucket=work.aws_bucket)
+            if resp.status == 404:
+                self._queue_deleted_object(work.container, {'name': work.key})
+            return
+        if self._is_migrated(work.aws_bucket, work.container, work.key):
+            return
+        if not work.primary:
+            self.object_queue_put(
+                work.aws_bucket, work.container,
+                {'name': work.key, 'bytes': event.size,
+                 'last_modified': event.last_modified}, 0, False)
+            return
+        self.stats_reporter.increment('event_objects', 1)
+        self._migrate_object(work.aws_bucket, work.container, work.key)
+
+    def _is_migrated(self, aws_bucket, container, key):
+        with self.ic_pool.item() as ic:
+            try:
+                meta = ic.get_object_metadata(
+                    self.config['account'], container, key)
+            except UnexpectedResponse as e:
+                if e.resp.status_int == HTTP_NOT_FOUND:
+                    return False
+                raise
+        resp = self.provider.head_object(key, bucket=aws_bucket)
+        if resp.status != 200:
+            return False
+        src_meta = resp.headers
+        if self.config.get('protocol', 's3') != 'swift':
+            src_meta = convert_to_swift_headers(src_meta)
+        return cmp_meta(meta, src_meta) == EQUAL
+
+    def _get_fingerprint(self):
+        '''Returns the counters of the source and destination containers.
+
+        The containers did not change if their object counts, bytes used and
+        the source PUT timestamp did not. Only Swift sources report these
+        in a HEAD request; None is returned for any other source. Objects
+        that are overwritten with the same size do not change the counters,
+        which is why the containers are scanned every max_skip_time anyway.
+        '''
+        if not self.skip_unchanged or self.config.get('protocol') != 'swift':
+            return None
+        resp = self.provider.head_bucket(self.config['aws_bucket'])
+        if resp.status != 200:
+            return None
+        with self.ic_pool.item() as ic:
+            try:
+                local_headers = ic.get_container_metadata(
+                    self.config['account'], self.config['container'])
+            except UnexpectedResponse:
+                return None
+        try:
+            return [resp.headers[header] for header in (
+                'x-container-object-count', 'x-container-bytes-used',
+                'x-put-timestamp')] + \
+                [local_headers[header] for header in (
+                    'x-container-object-count', 'x-container-bytes-used')]
+        except KeyError:
+            return None
+
+    def _is_unchanged(self, state, fingerprint):
+        if fingerprint is None:
+            return False
+        if state.get('verified_fingerprint') != fingerprint:
+            return False
+        # Periodically scan the containers regardless
+        return time.time() - state['verified_time'] < self.max_skip_time
+
+    @staticmethod
+    def _get_scan_state(state, fingerprint, is_reset, failed):
+        '''Returns the change detection state to store after a pass.
+
+        A scan that completed without errors and throughout which the
+        fingerprint did not change verifies that the containers are in sync
+        for that fingerprint.
+        '''
+        if not is_reset:
+            return {'scan_failed': failed or state.get('scan_failed', False)}
+        scan_state = {'scan_fingerprint': fingerprint, 'scan_failed': failed}
+        if state.get('scan_fingerprint') == fingerprint and \
+                not state.get('scan_failed', True):
+            scan_state['verified_fingerprint'] = fingerprint
+            scan_state['verified_time'] = time.time()
+        return scan_state
 
     def check_errors(self):
         while not self.errors.empty():
-            container, key, err = self.errors.get()
+            # The errors may name the action that failed (e.g. "remove")
+            error = self.errors.get()
+            container, key, err = error[:3]
+            action = error[3] if len(error) > 3 else 'migrate'
             if type(err) == str:
-                self.logger.error('Failed to migrate "%s/%s": %s' % (
-                    container, key, err))
+                self.logger.error('Failed to %s "%s/%s": %s' % (
+                    action, container, key, err))
             else:
-                self.logger.error('Failed to migrate "%s"/"%s": %s' % (
-                    container, key, err[1]))
+                self.logger.error('Failed to %s "%s"/"%s": %s' % (
+                    action, container, key, err[1]))
                 self.logger.error(''.join(traceback.format_exception(*err)))
 
-    def _stop_workers(self, q):
-        for _ in range(self.workers):
+    def _autoscale_workers(self):
+        while True:
+            eventlet.sleep(self.autoscaler.interval)
+            self.autoscaler.adjust(time.time())
+            for metric, value in self.autoscaler.gauges.items():
+                self.stats_reporter.gauge(metric, value)
+
+    def _stop_workers(self, q, workers=None):
+        for _ in range(workers or self.workers):
             q.put(None)
         q.join()
 
+    def _start_delete_workers(self):
+        if self.delete_pool is not None:
+            return
+        self.delete_pool = eventlet.GreenPool(self.reconcile_workers)
+        self.delete_failures = 0
+        for _ in xrange(self.reconcile_workers):
+            self.delete_pool.spawn_n(self._delete_worker)
+
+    def _stop_delete_workers(self):
+        '''Waits for the queued deletions.
+
+        Returns the number of objects that could not be removed (their errors
+        are reported by check_errors()).
+        '''
+        if self.delete_pool is None:
+            return 0
+        self._stop_workers(self.delete_queue, self.reconcile_workers)
+        self.delete_pool = None
+        return self.delete_failures
+
     def _head_internal_account(self, internal_client):
         # This explicitly does not use get_account_metadata because it
         # needs to be able to read the temp url key (swift_owner: True).
@@ -658,9 +1519,20 @@ class Migrator(object):
         '''
         return iter_internal_listing(
             self.ic_pool.item, self.config['account'], container, marker,
-            prefix)
+            prefix, self.listing_prefetch)
+
+    def _reconcile_deleted_objects(self, container, key, last_modified=None):
+        uploaded = self.migrated_objects.pop(
+            self.config['account'], container, key)
+        if uploaded and uploaded.isoformat == last_modified:
+            # The migrator uploaded the object and it has not changed since,
+            # so there is no need to check for the migration header.
+            with self.ic_pool.item() as ic:
+                self._delete_migrated_object(
+                    ic, container, key, {'x-timestamp': Timestamp(
+                        uploaded.timestamp, uploaded.offset + 1).internal})
+            return
 
-    def _reconcile_deleted_objects(self, container, key):
         # NOTE: to handle the case of objects being deleted from the source
         # cluster after they've been migrated, we have to HEAD the object to
         # check for the migration header.
@@ -686,28 +1558,59 @@ class Migrator(object):
                     xts = create_x_timestamp_from_hdrs(hdrs)
                     if xts:
                         headers['x-timestamp'] = Timestamp(xts, 1)
-                try:
-                    ic.delete_object(self.config['account'], container, key,
-                                     headers=headers)
-                    self.logger.info(
-                        'Detected removed object %s. Removing from %s/%s' % (
-                            key, self.config['account'], container))
-                except UnexpectedResponse as e:
-                    if e.resp.status_int == HTTP_CONFLICT:
-                        self.logger.info(
-                            'Conflict removing object %s from %s/%s' % (
-                                key, self.config['account'], container))
-                        return
-                    raise
+                self._delete_migrated_object(ic, container, key, headers)
+
+    def _delete_migrated_object(self, ic, container, key, headers):
+        try:
+            ic.delete_object(self.config['account'], container, key,
+                             headers=headers)
+            self.stats_reporter.increment('deleted_objects', 1)
+            self.logger.info(
+                'Detected removed object %s. Removing from %s/%s' % (
+                    key, self.config['account'], container))
+        except UnexpectedResponse as e:
+            if e.resp.status_int == HTTP_CONFLICT:
+                self.logger.info(
+                    'Conflict removing object %s from %s/%s' % (
+                        key, self.config['account'], container))
+                return
+            raise
+
+    def _queue_deleted_object(self, container, local):
+        self._start_delete_workers()
+        # Blocks if the deletion workers fall behind
+        self.delete_queue.put((container, local))
+
+    def _delete_worker(self):
+        while True:
+            work = self.delete_queue.get()
+            try:
+                if not work:
+                    break
+                container, local = work
+                self._reconcile_deleted_objects(
+                    container, local['name'], local.get('last_modified'))
+            except Exception:
+                self.stats_reporter.increment('delete_errors', 1)
+                self.delete_failures += 1
+                self.errors.put(
+                    (container, local['name'], sys.exc_info(), 'remove'))
+            finally:
+                self.delete_queue.task_done()
 
     def _maybe_delete_internal_container(self, container):
         '''Delete a specified internal container.
 
         Unfortunately, we cannot simply DELETE every object in the container,
-        but have to issue a HEAD request to make sure the migrator header is
-        not set. This makes clearing containers expensive and we hope that this
-        is not a common operation.
+        but have to make sure the migrator header is set. Unless the object
+        is in the index of migrated objects, that requires a HEAD request. This
+        makes clearing containers expensive and we hope that this is not a
+        common operation.
         '''
+        if not self.selector.is_process_container(
+                self.config['account'], container):
+            # Another migrator process removes the container
+            return
 
         try:
             with self.ic_pool.item() as ic:
@@ -735,10 +1638,21 @@ class Migrator(object):
             return
 
         listing = self._iterate_internal_listing(container)
-        for obj in listing:
-            if not obj:
-                break
-            self._reconcile_deleted_objects(container, obj['name'])
+        failures = 0
+        try:
+            for obj in listing:
+                if not obj:
+                    break
+                self._queue_deleted_object(container, obj)
+        finally:
+            failures = self._stop_delete_workers()
+        self.check_errors()
+        if failures:
+            # The container must be removed (or marked) only once it is empty
+            self.logger.error(
+                'Not removing container %s/%s: failed to remove %d objects' %
+                (self.config['account'], container, failures))
+            return
 
         state_meta = {get_sys_migrator_header('container'):
                       MigrationContainerStates.SRC_DELETED}
@@ -759,26 +1673,27 @@ class Migrator(object):
 
     def _iter_source_container(
             self, container, marker, prefix, list_all):
-        next_marker = marker
+        def _iter_pages(next_marker):
+            while True:
+                resp = self.provider.list_objects(
+                    next_marker, self.work_chunk, prefix, bucket=container)
+                if resp.status == 404:
+                    raise ContainerNotFound(
+                        self.config['aws_identity'], container)
+                if resp.status != 200:
+                    raise MigrationError(
+                        'Failed to list source bucket/container "%s"' %
+                        self.config['aws_bucket'])
+                yield resp.body
+                if not list_all or not resp.body:
+                    break
+                next_marker = resp.body[-1]['name']
 
-        while True:
-            resp = self.provider.list_objects(
-                next_marker, self.work_chunk, prefix, bucket=container)
-            if resp.status == 404:
-                raise ContainerNotFound(
-                    self.config['aws_identity'], container)
-            if resp.status != 200:
-                raise MigrationError(
-                    'Failed to list source bucket/container "%s"' %
-                    self.config['aws_bucket'])
-            if not resp.body and marker and marker == next_marker:
-                yield None
-            for entry in resp.body:
-                yield entry
-            if not list_all or not resp.body:
-                break
-            next_marker = resp.body[-1]['name']
-        yield None
+        # The following pages are listed while the current one is compared
+        # against the local listing.
+        return itertools.chain(
+            iter_prefetched_pages(_iter_pages(marker), self.listing_prefetch),
+            [None])
 
     def _check_large_objects(self, aws_bucket, container, key, client):
         local_meta = client.get_object_metadata(
@@ -824,7 +1739,7 @@ class Migrator(object):
 
     def _process_container(
             self, container=None, aws_bucket=None, marker=None, prefix=None,
-            list_all=False):
+            list_all=False, shards=None):
         if aws_bucket is None:
             aws_bucket = self.config['aws_bucket']
         if container is None:
@@ -905,6 +1820,9 @@ class Migrator(object):
                 if not ic.container_exists(self.config['account'], container):
                     self._create_container(container, ic, aws_bucket)
 
+        if shards is not None:
+            return self._find_missing_objects_sharded(
+                container, aws_bucket, prefix, shards)
         return self._find_missing_objects(container, aws_bucket, marker,
                                           prefix, list_all)
 
@@ -922,15 +1840,116 @@ class Migrator(object):
             self, aws_bucket, container, remote, timestamp, use_primary):
         if not self._old_enough(remote):
             return
+        size = remote.get('bytes')
         work = MigrateObjectWork(
-            aws_bucket, container, remote['name'], timestamp)
+            aws_bucket, container, remote['name'], timestamp,
+            None if size is None else int(size))
         if use_primary:
             self.primary_queue.put(work)
         else:
             self.verify_queue.put(work)
 
+    def _get_listing_shards(self, state):
+        '''Returns the listing shards to process and whether this starts a new
+        scan of the container.
+
+        Every shard covers the keys in (start, end]. The end of the last shard
+        is None, meaning it is unbounded. Each shard carries its own marker, so
+        that an interrupted scan can be resumed. Once every shard has been
+        scanned to its end, the layout is recomputed and a new scan begins.
+        '''
+        shards = state.get('shards')
+        if shards and (not all(shard.get('done') for shard in shards) or
+                       not self._is_scan_due(state)):
+            return shards, False
+
+        if 'finished' in state and state.get('scanned_count', 0) <\
+                self.work_chunk * self.listing_shards:
+            # The container is too small to benefit from sharding
+            boundaries = []
+        else:
+            boundaries = self._sample_shard_boundaries(
+                self.config['aws_bucket'], self.config.get('prefix', ''))
+        starts = [''] + boundaries
+        ends = boundaries + [None]
+        return [{'start': start, 'end': end, 'marker': start}
+                for start, end in zip(starts, ends)], True
+
+    def _sample_shard_boundaries(self, aws_bucket, prefix):
+        '''Sample the source listing to split the key space into shards.
+
+        Probes for the first key under every alphanumeric extension of the
+        prefix (descending further while at most one extension has any keys)
+        and picks evenly spaced keys among the results as the shard
+        boundaries. The shards always cover the whole key space -- keys that
+        do not start with a probed character simply fall into a neighboring
+        shard.
+        '''
+        def _probe(probe_prefix):
+            resp = self.provider.list_objects(
+                '', 1, probe_prefix, bucket=aws_bucket)
+            if resp.status == 200 and resp.body:
+                return resp.body[0]['name']
+            return None
+
+        # The probes of every level are sent concurrently, limited by the
+        # number of connections to the source.
+        probe_pool = eventlet.GreenPool(
+            min(len(SHARD_PROBE_CHARS), self.max_conns))
+        first_keys = []
+        last_key = None
+        for _ in range(SHARD_PROBE_DEPTH):
+            first_keys = filter(None, probe_pool.imap(
+                _probe, [prefix + char for char in SHARD_PROBE_CHARS]))
+            if len(first_keys) > 1:
+                break
+            if first_keys:
+                last_key = first_keys[0]
+            if last_key is None or len(last_key) <= len(prefix):
+                break
+            # Descend along the last key we found, as its next character may
+            # not be one we probe for (e.g. a "/" delimiter).
+            prefix = last_key[:len(prefix) + 1]
+        if len(first_keys) < 2:
+            return []
+        step = float(len(first_keys)) / self.listing_shards
+        return sorted(set(first_keys[int(i * step)]
+                          for i in range(1, self.listing_shards)))
+
+    def _find_missing_objects_sharded(
+            self, container, aws_bucket, prefix, shards):
+        failed_shards = []
+
+        def _process_shard(shard):
+            try:
+                marker = self._find_missing_objects(
+                    container, aws_bucket, shard['marker'], prefix, False,
+                    shard['end'])
+            except Exception:
+                self.logger.error('Failed to migrate "%s" (after "%s")' % (
+                    aws_bucket, shard['marker']))
+                self.logger.error(''.join(traceback.format_exc()))
+                failed_shards.append(shard)
+                return
+            if marker == shard['marker']:
+                # Nothing left to list in this shard
+                shard['done'] = True
+            else:
+                shard['marker'] = marker
+
+        shard_pool = eventlet.GreenPool(len(shards))
+        for shard in shards:
+            if not shard.get('done'):
+                shard_pool.spawn_n(_process_shard, shard)
+        shard_pool.waitall()
+        if failed_shards:
+            # The other shards keep their progress, but the scan must not be
+            # considered complete.
+            raise MigrationError('Failed to list %d of the shards of "%s"' % (
+                len(failed_shards), aws_bucket))
+
     def _find_missing_objects(
-            self, container, aws_bucket, marker, prefix, list_all):
+            self, container, aws_bucket, marker, prefix, list_all, end=None):
 
         try:
             source_iter = self._iter_source_container(
@@ -938,10 +1957,16 @@ class Migrator(object):
         except StopIteration:
             source_iter = iter([])
 
+        def _next_remote():
+            entry = next(source_iter)
+            if entry and end is not None and entry['name'] > end:
+                return None
+            return entry
+
         scanned = 0
         local_iter = self._iterate_internal_listing(container, marker, prefix)
         local = next(local_iter)
-        remote = next(source_iter)
+        remote = _next_remote()
         if remote:
             marker = remote['name']
         while remote:
@@ -964,11 +1989,11 @@ class Migrator(object):
                     list_all or self.selector.is_primary(
                         self.config['account'], container, remote['name']))
                 scanned += 1
-                remote = next(source_iter)
+                remote = _next_remote()
                 if remote:
                     marker = remote['name']
             elif local['name'] < remote['name']:
-                self._reconcile_deleted_objects(container, local['name'])
+                self._queue_deleted_object(container, local)
                 local = next(local_iter)
             else:
                 try:
@@ -987,7 +2012,7 @@ class Migrator(object):
                             self.selector.is_primary(
                                 self.config['account'], container,
                                 remote['name']))
-                remote = next(source_iter)
+                remote = _next_remote()
                 local = next(local_iter)
                 scanned += 1
                 if remote:
@@ -996,13 +2021,67 @@ class Migrator(object):
         self.stats.update(scanned=scanned)
         self.stats_reporter.increment('scanned', scanned)
 
-        while local and (not marker or local['name'] < marker or scanned == 0):
+        while local and (not marker or local['name'] < marker or scanned == 0)\
+                and (end is None or local['name'] <= end):
             # We may have objects left behind that need to be removed
-            self._reconcile_deleted_objects(container, local['name'])
+            self._queue_deleted_object(container, local)
             local = next(local_iter)
         return marker
 
+    def _copy_object(self, aws_bucket, container, key, list_ts=0):
+        '''Copies an object of a source account in this cluster.
+
+        The data does not pass through the migrator. Returns False if the
+        object cannot be copied server-side: large objects, whose segments
+        would have to be copied as well, are migrated as usual.
+        '''
+        resp = self.provider.head_object(
+            key, bucket=aws_bucket, query_string='multipart-manifest=get')
+        if resp.status != 200:
+            return False
+        if MANIFEST_HEADER in resp.headers or \
+                'x-static-large-object' in resp.headers:
+            return False
+        # The providers capitalize Content-Length (see SyncSwift)
+        size = int(resp.headers['Content-Length'])
+        if size > swift.common.constraints.MAX_FILE_SIZE:
+            return False
+        headers = _create_put_headers(resp.headers.items(), list_ts)
+        # The COPY request has no body
+        headers.pop('Content-Length', None)
+        headers['Destination'] = urllib.quote(
+            ('%s/%s' % (container, key)).encode('utf-8'))
+        headers['Destination-Account'] = urllib.quote(
+            self.config['account'].encode('utf-8'))
+        with self.ic_pool.item() as ic:
+            path = ic.make_path(self.source_account, aws_bucket, key)
+            try:
+                try:
+                    ic.make_request('COPY', path, dict(headers), (2,))
+                except UnexpectedResponse as e:
+                    if e.resp.status_int != 404 or ic.container_exists(
+                            self.config['account'], container):
+                        raise
+                    self._create_container(container, ic, aws_bucket)
+                    ic.make_request('COPY', path, dict(headers), (2,))
+            except UnexpectedResponse as e:
+                if e.resp.status_int != 405:
+                    raise
+                # The internal client pipeline does not include the copy
+                # middleware.
+                self.logger.warning(
+                    'Server-side copy is not supported; migrating "%s" '
+                    'through the migrator' % self.config['aws_bucket'])
+                self.source_account = None
+                return False
+            self.logger.debug('Copied "%s/%s" server-side' % (container, key))
+        self._record_upload(container, key, headers, size)
+        return True
+
     def _migrate_object(self, aws_bucket, container, key, list_ts=0):
+        if self.source_account and self._copy_object(
+                aws_bucket, container, key, list_ts):
+            return
         args = {'bucket': aws_bucket}
         if self.config.get('protocol', 's3') == 'swift':
             args['query_string'] = 'multipart-manifest=get'
@@ -1058,44 +2137,111 @@ class Migrator(object):
                 ic.delete_object(self.config['account'], seg_container, key,
                                  {})
 
+    def _upload_segments(self, segment_container, count, put_segment):
+        '''Upload the segments of a large object concurrently.
+
+        Calls put_segment(index) for every segment index in [0, count) using
+        up to segment_workers greenthreads. If any of the segments fails to
+        upload, the segments that have been uploaded are removed and the first
+        error is re-raised.
+
+        :returns: list of the SLO manifest entries, ordered by index.
+        '''
+        segments = [None] * count
+        errors = []
+        copied = []
+        work_queue = eventlet.queue.Queue(self.segment_workers * 2)
+
+        def _segment_worker():
+            # The copy counters are green thread local and are folded into
+            # the calling upload worker's counters once we are done.
+            self.gthread_local.uploaded_objects = 0
+            self.gthread_local.bytes_copied = 0
+            while True:
+                index = work_queue.get()
+                try:
+                    if index is None:
+                        copied.append((self.gthread_local.uploaded_objects,
+                                       self.gthread_local.bytes_copied))
+                        return
+                    # Once any segment fails, the object cannot be assembled
+                    # and we skip the remaining work.
+                    if not errors:
+                        segments[index] = put_segment(index)
+                except Exception:
+                    errors.append(sys.exc_info())
+                finally:
+                    work_queue.task_done()
+
+        worker_pool = eventlet.GreenPool(self.segment_workers)
+        for _ in xrange(self.segment_workers):
+            worker_pool.spawn_n(_segment_worker)
+        for index in xrange(count):
+            work_queue.put(index)
+        for _ in xrange(self.segment_workers):
+            work_queue.put(None)
+        work_queue.join()
+        for uploaded_objects, bytes_copied in copied:
+            self.gthread_local.uploaded_objects += uploaded_objects
+            self.gthread_local.bytes_copied += bytes_copied
+
+        if errors:
+            self._delete_parts(segment_container, filter(None, segments))
+            exc_type, exc_value, exc_tb = errors[0]
+            raise exc_type, exc_value, exc_tb
+        return segments
+
+    def _get_mpu_part(self, aws_bucket, key, remote_etag, part_number):
+        args = {'bucket': aws_bucket, 'PartNumber': part_number,
+                'IfMatch': remote_etag}
+        part_resp = self.provider.get_object(key, **args)
+        if not part_resp.success:
+            part_resp.body.close()
+            part_resp.reraise()
+        return part_resp
+
     def _migrate_mpu(self, aws_bucket, container, key, resp, put_headers):
         # The multipart upload object is downloaded using GET on the individual
         # parts, so we close the initial response stream.
         resp.body.close()
 
-        # TODO (MSD): Parallelize the downloads (another queue??)
         remote_etag = put_headers['etag']
         # The etag for S3 multipart objects is computed differently and can't
         # be used for swift
         nparts = nparts_from_headers(put_headers)
         del(put_headers['etag'])
-        segments = []
         segment_container = "%s_segments" % (container,)
         content_length = int(resp.headers['Content-Length'])
-        segment_prefix = None
-        for part in range(nparts):
-            segment_key = "%08d" % (part + 1,)
-            args = {'bucket': aws_bucket, 'PartNumber': part + 1,
-                    'IfMatch': remote_etag}
-            part_resp = self.provider.get_object(key, **args)
-            if not part_resp.success:
-                part_resp.body.close()
-                self._delete_parts(segment_container, segments)
-                part_resp.reraise()
+        # The size of the first part is part of the segment names, so we have
+        # to GET it before the remaining parts can be scheduled.
+        first_part_resp = self._get_mpu_part(aws_bucket, key, remote_etag, 1)
+        segment_prefix = "%s/%s/%s/%s/" % (
+            key, put_headers['x-timestamp'], content_length,
+            int(first_part_resp.headers['Content-Length']))
+
+        def _put_part(index):
+            if index == 0:
+                part_resp = first_part_resp
+            else:
+                part_resp = self._get_mpu_part(
+                    aws_bucket, key, remote_etag, index + 1)
             segment_headers = _create_put_headers(part_resp.headers.items())
             sz_bytes = int(segment_headers['Content-Length'])
-            if segment_prefix is None:
-                segment_prefix = "%s/%s/%s/%s/" % (
-                    key, put_headers['x-timestamp'], content_length, sz_bytes)
             del(segment_headers['etag'])
             # The segments do not exist in S3 -- applying the migrator header
             # would cause them to be removed on the next iteration.
             if get_sys_migrator_header('object') in segment_headers:
                 del(segment_headers[get_sys_migrator_header('object')])
-            new_seg = self._put_segment(
-                segment_container, segment_prefix + segment_key,
+            return self._put_segment(
+                segment_container, segment_prefix + "%08d" % (index + 1,),
                 part_resp.body, sz_bytes, segment_headers, aws_bucket)
-            segments.append(new_seg)
+
+        try:
+            segments = self._upload_segments(
+                segment_container, nparts, _put_part)
+        finally:
+            # Only matters if the first part was never uploaded
+            first_part_resp.body.close()
         expected_etag = get_slo_etag(segments)
         if remote_etag != expected_etag:
             self._delete_parts(segment_container, segments)
@@ -1113,44 +2259,100 @@ class Migrator(object):
         work = UploadObjectWork(container, key, manifest, headers, aws_bucket)
         self._upload_object(work)
 
+    def _get_object_range(self, aws_bucket, key, etag, start, size):
+        range_value = 'bytes=%d-%d' % (start, start + size - 1)
+        if self.config.get('protocol', 's3') == 'swift':
+            args = {'headers': {'Range': range_value, 'If-Match': etag},
+                    'resp_chunk_size': 65536}
+        else:
+            args = {'Range': range_value, 'IfMatch': etag}
+        resp = self.provider.get_object(key, bucket=aws_bucket, **args)
+        if resp.status != 206:
+            resp.body.close()
+            if not resp.success:
+                resp.reraise()
+            raise MigrationError('Failed to GET "%s/%s" range %s: %d' % (
+                aws_bucket, key, range_value, resp.status))
+        return resp
+
+    def _get_segment_headers(self, put_headers, size):
+        segment_headers = dict(put_headers.items())
+        segment_headers['Content-Length'] = str(size)
+        if 'x-timestamp' in segment_headers:
+            del(segment_headers['x-timestamp'])
+        # The segments do not exist externally -- applying the migrator
+        # header would cause them to be removed on the next iteration.
+        if get_sys_migrator_header('object') in segment_headers:
+            del(segment_headers[get_sys_migrator_header('object')])
+        return segment_headers
+
     def _migrate_as_slo(self, aws_bucket, container, key, resp, put_headers):
-        data = resp.body
         content_length = int(resp.headers['Content-Length'])
         remote_etag = put_headers['etag']
         del(put_headers['etag'])
-        segments = []
-        segment_start = 0
         segment_size = self.segment_size
         segment_container = "%s_segments" % (container,)
         segment_prefix = "%s/%s/%s/%s/" % (
             key, put_headers['x-timestamp'], content_length, segment_size)
+        if self.segment_workers > 1:
+            segments = self._migrate_ranges_as_segments(
+                aws_bucket, key, resp, remote_etag, put_headers,
+                content_length, segment_container, segment_prefix)
+        else:
+            segments = self._migrate_stream_as_segments(
+                aws_bucket, resp, put_headers, content_length,
+                segment_container, segment_prefix)
+        self._upload_manifest_from_segments(
+            container, key, aws_bucket, segments, remote_etag, put_headers)
+
+    def _migrate_ranges_as_segments(
+            self, aws_bucket, key, resp, remote_etag, put_headers,
+            content_length, segment_container, segment_prefix):
+        # Every segment is fetched with its own ranged GET, which allows the
+        # segments to be transferred concurrently.
+        resp.body.close()
+        segment_count = (content_length + self.segment_size - 1) //\
+            self.segment_size
+
+        def _put_range(index):
+            segment_start = index * self.segment_size
+            size = min(self.segment_size, content_length - segment_start)
+            range_resp = self._get_object_range(
+                aws_bucket, key, remote_etag, segment_start, size)
+            return self._put_segment(
+                segment_container, segment_prefix + "%08d" % (index + 1,),
+                range_resp.body, size,
+                self._get_segment_headers(put_headers, size), aws_bucket)
+
+        return self._upload_segments(
+            segment_container, segment_count, _put_range)
+
+    def _migrate_stream_as_segments(
+            self, aws_bucket, resp, put_headers, content_length,
+            segment_container, segment_prefix):
+        data = resp.body
+        segments = []
+        segment_start = 0
+        segment_size = self.segment_size
         buf = []
         while segment_start < content_length:
-            segment_headers = dict(put_headers.items())
             segment_key = "%08d" % (len(segments) + 1,)
             if segment_start + segment_size > content_length:
                 segment_size = content_length - segment_start
-            segment_headers['Content-Length'] = str(segment_size)
-            if 'x-timestamp' in segment_headers:
-                del(segment_headers['x-timestamp'])
-            # The segments do not exist externally -- applying the migrator
-            # header would cause them to be removed on the next iteration.
-            if get_sys_migrator_header('object') in segment_headers:
-                del(segment_headers[get_sys_migrator_header('object')])
-
             wrapped_data = SeekableFileLikeIter(
                 itertools.chain(buf, data), length=segment_size)
             new_seg = self._put_segment(
                 segment_container, segment_prefix + segment_key,
-                wrapped_data, segment_size, segment_headers, aws_bucket)
+                wrapped_data, segment_size,
+                self._get_segment_headers(put_headers, segment_size),
+                aws_bucket)
             if wrapped_data.buf:
                 buf = wrapped_data.buf
             else:
                 buf = []
             segments.append(new_seg)
             segment_start += segment_size
-        self._upload_manifest_from_segments(
-            container, key, aws_bucket, segments, remote_etag, put_headers)
+        return segments
 
     def _put_segment(self, container, key, content, size, headers, bucket):
             work = UploadObjectWork(
@@ -1206,7 +2408,8 @@ class Migrator(object):
                     self.logger.warning('Object metadata changed for "%s/%s"' %
                                         (container, segment_key))
                     continue
-            work = MigrateObjectWork(container, container, segment_key, 0)
+            work = MigrateObjectWork(
+                container, container, segment_key, 0, None)
             try:
                 self.object_queue.put(work, block=False)
             except eventlet.queue.Full:
@@ -1241,82 +2444,188 @@ class Migrator(object):
                     'PUT', path, dict(headers), (2,), file_like_content)
             self.logger.debug('Copied "%s/%s"' % (container, key))
         if result.status_int == 201:
-            self.gthread_local.uploaded_objects += 1
-            self.gthread_local.bytes_copied += size
-            self.stats_reporter.increment('copied_objects', 1)
+            self._record_upload(container, key, headers, size)
         return result
 
+    def _record_upload(self, container, key, headers, size):
+        # Only the objects that carry the migrator header may later be removed
+        # without a HEAD; segments (e.g. of migrated MPUs) must never be.
+        if get_sys_migrator_header('object') in headers:
+            self.migrated_objects.add(
+                self.config['account'], container, key,
+                headers['x-timestamp'])
+        self.gthread_local.uploaded_objects += 1
+        self.gthread_local.bytes_copied += size
+        self.stats_reporter.increment('copied_objects', 1)
+
     def _upload_worker(self):
         self.gthread_local.uploaded_objects = 0
         self.gthread_local.bytes_copied = 0
         current_queue = self.primary_queue
         while True:
+            # Only the number of workers allowed by the autoscaler may process
+            # objects at once.
+            self.autoscaler.acquire()
             work = current_queue.get()
+            if not work:
+                self.autoscaler.release()
+                current_queue.task_done()
+                break
+            self.autoscaler.start()
+            start = time.time()
+            bytes_copied = self.gthread_local.bytes_copied
+            failed = False
             try:
-                if not work:
-                    break
                 aws_bucket = work.aws_bucket
                 container = work.container
                 key = work.key
                 if isinstance(work, MigrateObjectWork):
                     self._migrate_object(aws_bucket, container, key, work.ts)
+                elif isinstance(work, ObjectEventWork):
+                    self._process_event(work)
                 else:
                     self._upload_object(work)
             except Exception:
                 # Avoid killing the worker, as it should only quit explicitly
                 # when we initiate it. Otherwise, we might deadlock if all
                 # workers quit, but the queue has not been drained.
+                failed = True
                 self.errors.put((aws_bucket, key, sys.exc_info()))
             finally:
+                self.autoscaler.finish(
+                    time.time() - start,
+                    self.gthread_local.bytes_copied - bytes_copied, failed)
+                self.autoscaler.release()
                 current_queue.task_done()
         self.stats.update(
             copied=self.gthread_local.uploaded_objects,
             bytes_copied=self.gthread_local.bytes_copied)
 
     def close(self):
+        self.verify_queue.close()
         if not self.provider:
             return
         self.provider.close()
         self.provider = None
 
 
+def _migration_weight(migration):
+    return float(migration.get('weight', 1))
+
+
+def _migration_workers(migration, workers, total_weight):
+    '''Number of upload workers for a migration.
+
+    The migration gets a share of the workers that is proportional to its
+    weight (out of the total weight of the migrations that are running),
+    capped by its max_workers setting.
+    '''
+    share = int(workers * _migration_weight(migration) / total_weight)
+    share = min(share, workers, migration.get('max_workers', workers))
+    return max(1, share)
+
+
+class WorkerShares(object):
+    '''Splits the upload workers between the migrations that run at once.
+
+    The shares are recomputed whenever a migration starts or finishes, so
+    that the workers freed by the migrations that are done go to the ones
+    that are still running. A migration that runs alone gets every worker
+    (up to its max_workers).
+    '''
+    def __init__(self, workers):
+        self.workers = workers
+        self._running = []
+
+    def add(self, migration, autoscaler):
+        self._running.append((migration, autoscaler))
+        self._rebalance()
+
+    def remove(self, autoscaler):
+        self._running = [entry for entry in self._running
+                         if entry[1] is not autoscaler]
+        self._rebalance()
+
+    def _rebalance(self):
+        total_weight = sum(_migration_weight(migration)
+                           for migration, _ in self._running)
+        for migration, autoscaler in self._running:
+            autoscaler.set_max_workers(
+                _migration_workers(migration, self.workers, total_weight))
+
+
 def process_migrations(migrations, migration_status, internal_pool, logger,
                        items_chunk, workers, selector, segment_size,
-                       stats_factory):
+                       stats_factory, migration_workers=1, event_log=None,
+                       **migrator_options):
     handled_containers = []
-    for index, migration in enumerate(migrations):
+    # The events that arrived since the previous cycle
+    events = event_log.read() if event_log else None
+    local_migrations = [
+        migration for migration in migrations
         if migration['aws_bucket'] == '/*' or selector.is_local_container(
-                migration['account'], migration['aws_bucket']):
-            if migration.get('remote_account'):
-                src_account = migration.get('remote_account')
-            else:
-                src_account = migration['aws_identity']
-            logger.info('Processing "%s"' % (
-                ':'.join([migration.get('aws_endpoint', ''),
-                          src_account, migration['aws_bucket']])))
-            migrator = Migrator(migration, migration_status,
-                                items_chunk, workers,
-                                internal_pool, logger,
-                                selector, segment_size, stats_factory)
+            migration['account'], migration['aws_bucket'])]
+    shares = WorkerShares(workers)
+
+    def _process_migration(migration):
+        if migration.get('remote_account'):
+            src_account = migration.get('remote_account')
+        else:
+            src_account = migration['aws_identity']
+        logger.info('Processing "%s"' % (
+            ':'.join([migration.get('aws_endpoint', ''),
+                      src_account, migration['aws_bucket']])))
+        # Enough workers are started for the migration to run alone; its
+        # share limits how many of them run at once.
+        migrator = Migrator(migration, migration_status,
+                            items_chunk,
+                            _migration_workers(migration, workers,
+                                               _migration_weight(migration)),
+                            internal_pool, logger,
+                            selector, segment_size, stats_factory,
+                            events=events, **migrator_options)
+        shares.add(migration, migrator.autoscaler)
+        try:
             pass_containers = migrator.next_pass()
-            if pass_containers is None:
-                # Happens if there is an error listing containers.
-                # Inserting the migration we attempted to process will ensure
-                # we don't prune it (or the related containers).
-                handled_containers.append(migration)
-            else:
-                handled_containers += pass_containers
+        finally:
+            shares.remove(migrator.autoscaler)
             migrator.close()
+        if pass_containers is None:
+            # Happens if there is an error listing containers.
+            # Inserting the migration we attempted to process will ensure
+            # we don't prune it (or the related containers).
+            handled_containers.append(migration)
+        else:
+            handled_containers.extend(pass_containers)
+
+    # Independent migrations are processed concurrently, so that the large
+    # ones do not hold up the rest.
+    pool = eventlet.GreenPool(migration_workers)
+    passes = [pool.spawn(_process_migration, migration)
+              for migration in local_migrations]
+    errors = []
+    for migration, migration_pass in zip(local_migrations, passes):
+        try:
+            migration_pass.wait()
+        except Exception:
+            # The other migrations must finish (and the status be pruned)
+            # before the error is re-raised. As with listing errors, the
+            # failed migration is kept in the status.
+            handled_containers.append(migration)
+            errors.append(sys.exc_info())
     migration_status.prune(handled_containers)
+    if errors:
+        raise errors[0][0], errors[0][1], errors[0][2]
 
 
 def run(migrations, migration_status, internal_pool, logger, items_chunk,
-        workers, selector, poll_interval, segment_size, stats_factory, once):
+        workers, selector, poll_interval, segment_size, stats_factory, once,
+        **migrator_options):
     while True:
         cycle_start = time.time()
         process_migrations(migrations, migration_status, internal_pool, logger,
                            items_chunk, workers, selector,
-                           segment_size, stats_factory)
+                           segment_size, stats_factory, **migrator_options)
         elapsed = time.time() - cycle_start
         naptime = max(0, poll_interval - elapsed)
         msg = 'Finished cycle in %0.2fs' % elapsed
@@ -1329,6 +2638,58 @@ def run(migrations, migration_status, internal_pool, logger, items_chunk,
         time.sleep(naptime)
 
 
+def run_processes(processes, target, logger, once):
+    '''Fork a migrator process for each index and wait for them.
+
+    Unless running once, a process that exits is started again. Stopping the
+    supervisor stops all of the migrator processes.
+    '''
+    children = {}
+
+    def _start(index):
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            status = 0
+            try:
+                target(index)
+            except Exception:
+                logger.error('Migrator process %d failed' % index)
+                logger.error(''.join(traceback.format_exc()))
+                status = 1
+            finally:
+                os._exit(status)
+        logger.info('Started migrator process %d (pid %d)' % (index, pid))
+        children[pid] = index
+
+    def _stop(signum, _frame):
+        for pid in children:
+            try:
+                os.kill(pid, signum)
+            except OSError:
+                pass
+        sys.exit(0)
+
+    for index in xrange(processes):
+        _start(index)
+    signal.signal(signal.SIGTERM, _stop)
+    signal.signal(signal.SIGINT, _stop)
+
+    while children:
+        pid, status = os.wait()
+        index = children.pop(pid, None)
+        if index is None:
+            continue
+        if once:
+            continue
+        logger.error('Migrator process %d (pid %d) exited with status %d' % (
+            index, pid, status))
+        # Avoid restarting a failing process in a tight loop
+        time.sleep(1)
+        _start(index)
+
+
 def create_ic_pool(config, swift_dir, workers):
     return eventlet.pools.Pool(
         create=lambda: create_internal_client(config, swift_dir),
@@ -1359,30 +2720,81 @@ def main():
     logger = logging.getLogger(LOGGER_NAME)
 
     workers = migrator_conf.get('workers', 10)
+    migrator_options = {
+        'segment_workers': migrator_conf.get('segment_workers', 1),
+        'listing_shards': migrator_conf.get('listing_shards', 1),
+        'listing_prefetch': migrator_conf.get('listing_prefetch', 1),
+        'reconcile_workers': migrator_conf.get('reconcile_workers', 10),
+        'min_workers': migrator_conf.get('min_workers', workers),
+        'autoscale_interval': migrator_conf.get('autoscale_interval', 10),
+        'container_workers': migrator_conf.get('container_workers', 1),
+        'migration_workers': migrator_conf.get('migration_workers', 1),
+        'queue_order': migrator_conf.get('queue_order', 'fifo'),
+        'queue_size': migrator_conf.get('queue_size'),
+        'verify_queue_memory': migrator_conf.get(
+            'verify_queue_memory', 10000),
+        'spool_dir': migrator_conf.get('spool_dir'),
+        'skip_unchanged': migrator_conf.get('skip_unchanged', False),
+        'max_skip_time': migrator_conf.get('max_skip_time', 3600),
+        'full_scan_interval': migrator_conf.get('full_scan_interval', 3600),
+        'event_log': EventLog(migrator_conf['event_log'], logger)
+        if migrator_conf.get('event_log') else None,
+        # Shared by the migrations across passes
+        'migrated_objects': MigratedObjects(
+            migrator_conf.get('migrated_objects_index_size', 100000)),
+    }
     swift_dir = conf.get('swift_dir', '/etc/swift')
-    internal_pool = create_ic_pool(conf, swift_dir, workers)
     segment_size = migrator_conf.get('segment_size', 100000000)
-
     ring_name = migrator_conf.get('ring_name', 'container')
-    container_ring = Ring(swift_dir, ring_name=ring_name)
-    myips = whataremyips('0.0.0.0')
-    selector = Selector(myips, container_ring)
-
     items_chunk = migrator_conf['items_chunk']
     poll_interval = float(migrator_conf.get('poll_interval', 5))
-
     migrations = conf.get('migrations', [])
-    migration_status = Status(migrator_conf['status_file'])
-
-    # While the statsd host and port are shared with sync/lifecycle, the prefix
-    # might be different.
-    stats_factory = StatsReporterFactory(conf.get('statsd_host', None),
-                                         conf.get('statsd_port', 8125),
-                                         migrator_conf.get('statsd_prefix'))
-
-    run(migrations, migration_status, internal_pool, logger, items_chunk,
-        workers, selector, poll_interval, segment_size, stats_factory,
-        args.once)
+    processes = int(migrator_conf.get('processes', 1))
+
+    def _run_process(process):
+        # Every worker may be transferring segment_workers segments at once
+        # and every listing shard uses a client as well (and another one to
+        # prefetch the listing). Migrations and containers that are migrated
+        # at once share the workers, but each one lists and removes objects
+        # on its own.
+        listing_clients = migrator_options['listing_shards']
+        if migrator_options['listing_prefetch'] > 0:
+            listing_clients *= 2
+        internal_pool = create_ic_pool(
+            conf, swift_dir,
+            workers * migrator_options['segment_workers'] +
+            migrator_options['migration_workers'] *
+            migrator_options['container_workers'] * (
+                listing_clients + migrator_options['reconcile_workers']) - 1)
+
+        container_ring = Ring(swift_dir, ring_name=ring_name)
+        myips = whataremyips('0.0.0.0')
+        selector = Selector(myips, container_ring, process, processes)
+
+        # Every process keeps the status of its own containers, starting
+        # from the status of a single process, if there is one
+        status_file = migrator_conf['status_file']
+        seed_file = None
+        if processes > 1:
+            seed_file = status_file
+            status_file = '%s.%d' % (status_file, process)
+        migration_status = Status(status_file, seed_file)
+
+        # While the statsd host and port are shared with sync/lifecycle, the
+        # prefix might be different. The counters of all of the processes
+        # are aggregated by statsd.
+        stats_factory = StatsReporterFactory(
+            conf.get('statsd_host', None), conf.get('statsd_port', 8125),
+            migrator_conf.get('statsd_prefix'))
+
+        run(migrations, migration_status, internal_pool, logger, items_chunk,
+            workers, selector, poll_interval, segment_size, stats_factory,
+            args.once, **migrator_options)
+
+    if processes > 1:
+        run_processes(processes, _run_process, logger, args.once)
+    else:
+        _run_process(0)
 
 
 if __name__ == '__main__':
@@ -12,6 +12,11 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import json
+import time
+
+from collections import OrderedDict
+
 from .sync_s3 import SyncS3
 from .sync_swift import SyncSwift
 
@@ -27,3 +32,68 @@ def create_provider(sync_settings, max_conns, per_account=False, logger=None,
                          extra_headers=extra_headers)
     else:
         raise NotImplementedError()
+
+
+class ProviderCache(object):
+    """Bounded cache of providers, to reuse their client connections.
+
+    Providers are keyed by their settings (which include the endpoint,
+    identity and bucket), so that connections (and, for Swift, the auth token)
+    are reused across containers and crawler passes. Providers that have not
+    been requested for idle_timeout seconds, or are the least recently
+    requested when there are more than max_size of them, are dropped.
+
+    Callers that would rather not wait on a busy provider can request a
+    number of free connections (needed_conns). If the cached provider does not
+    have that many, a new provider is returned without being cached.
+    """
+    def __init__(self, max_size=1000, idle_timeout=600):
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        # Ordered from the least to the most recently requested
+        self._providers = OrderedDict()
+
+    def __len__(self):
+        return len(self._providers)
+
+    def get_provider(self, sync_settings, max_conns, per_account=False,
+                     logger=None, extra_headers=None, needed_conns=None):
+        key = json.dumps(
+            [sync_settings, max_conns, per_account, extra_headers],
+            sort_keys=True)
+        now = time.time()
+        self._evict_idle(now)
+        if key in self._providers:
+            provider, max_conns, _ = self._providers.pop(key)
+        else:
+            provider = create_provider(
+                sync_settings, max_conns, per_account, logger, extra_headers)
+        self._providers[key] = (provider, max_conns, now)
+        while len(self._providers) > self.max_size:
+            _, entry = self._providers.popitem(last=False)
+            self._close(*entry)
+        if needed_conns and provider.client_pool.free_count() < needed_conns:
+            return create_provider(
+                sync_settings, needed_conns, per_account, logger,
+                extra_headers)
+        return provider
+
+    def clear(self):
+        while self._providers:
+            _, entry = self._providers.popitem(last=False)
+            self._close(*entry)
+
+    def _evict_idle(self, now):
+        while self._providers:
+            key, entry = next(self._providers.iteritems())
+            if now - entry[2] < self.idle_timeout:
+                break
+            del self._providers[key]
+            self._close(*entry)
+
+    @staticmethod
+    def _close(provider, max_conns, last_used):
+        # A provider may still be in use by the last handler that requested
+        # it. In that case, it is left to be garbage collected once released.
+        if provider.client_pool.free_count() == max_conns:
+            provider.close()
@@ -71,8 +71,10 @@ Container ``POST`` requests are shunted only to remote swift clusters. Object
 ``DELETE`` requests are shunted for remote swift clusters only.
 
 """
+import eventlet
 import json
 
+from collections import OrderedDict
 from os.path import getmtime
 from swift.common import constraints, swob, utils
 from swift.common.http import HTTP_NOT_FOUND, HTTP_GONE
@@ -80,13 +82,14 @@ from swift.common.wsgi import make_subrequest
 from swift.proxy.controllers.base import get_account_info, get_container_info
 from time import time
 
-from .provider_factory import create_provider
+from .provider_factory import ProviderCache
 from .utils import (DEFAULT_SEGMENT_SIZE, check_slo, convert_to_local_headers,
                     filter_hop_by_hop_headers,
-                    format_container_listing_response, format_listing_response,
                     get_listing_content_type, get_container_headers,
-                    get_sys_migrator_header, get_list_params, iter_listing,
-                    MigrationContainerStates, splice_listing,
+                    get_sys_migrator_header, get_list_params,
+                    iter_container_listing_response, iter_json_list,
+                    iter_listing, iter_listing_response, iter_splice_listing,
+                    MigrationContainerStates,
                     SHUNT_BYPASS_HEADER, SwiftLargeObjectPutWrapper,
                     SwiftMPUPutWrapper, SwiftPutWrapper, SwiftSloPutWrapper,
                     RemoteHTTPError, response_is_complete)
@@ -166,6 +169,67 @@ def maybe_munge_profile_for_all_containers(sync_profile, container_name):
     return sync_profile, False
 
 
+class LookupCache(object):
+    """Short-lived cache of the remote responses to shunted object requests.
+
+    Entries are keyed by the request path and hold the status and headers of
+    the remote response (there is no body for a HEAD or a missing object).
+    Entries expire after ttl seconds, and the least recently used entries are
+    dropped when there are more than max_size of them. A ttl of 0 disables
+    the cache.
+    """
+    CONDITIONAL_HEADERS = ('if-match', 'if-none-match', 'if-modified-since',
+                           'if-unmodified-since')
+
+    def __init__(self, max_size=10000, ttl=5):
+        self.max_size = max_size
+        self.ttl = ttl
+        # Ordered from the least to the most recently used
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, req):
+        """Returns the cached (status, headers) for the request, if any.
+
+        A cached 404 applies to any request for the path. Other responses are
+        only served for HEAD requests, as a GET needs the body and conditional
+        requests may expect a different response.
+        """
+        entry = self._entries.pop(req.path, None)
+        if entry is None:
+            return None
+        expires, status, headers = entry
+        if expires <= time():
+            return None
+        self._entries[req.path] = entry
+        if status.startswith('404 ') or self._can_serve(req):
+            return status, headers
+        return None
+
+    def put(self, req, status, headers):
+        if not self.ttl:
+            return
+        if not status.startswith('404 '):
+            if not status.startswith('200 ') or not self._can_serve(req):
+                return
+        self._entries.pop(req.path, None)
+        self._entries[req.path] = (time() + self.ttl, status, list(headers))
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, req):
+        self._entries.pop(req.path, None)
+
+    def clear(self):
+        self._entries.clear()
+
+    def _can_serve(self, req):
+        return req.method == 'HEAD' and not req.query_string and not any(
+            h in req.headers for h in self.CONDITIONAL_HEADERS)
+
+
 class S3SyncShunt(object):
     def __init__(self, app, conf_file, conf):
         self.logger = utils.get_logger(
@@ -179,6 +243,17 @@ class S3SyncShunt(object):
         self.reload_time = 15
         self._rtime = 0
         self._mtime = 0
+        # Providers are reused across requests to avoid establishing new
+        # connections (and for Swift, authenticating) for every request.
+        self.provider_max_conns = int(conf.get('provider_max_conns', 10))
+        self.provider_cache = ProviderCache(
+            int(conf.get('provider_cache_size', 1000)),
+            int(conf.get('provider_idle_timeout', 600)))
+        # Remote lookups are cached briefly, so that repeated requests for
+        # missing objects do not all end up on the remote cluster.
+        self.lookup_cache = LookupCache(
+            int(conf.get('lookup_cache_size', 10000)),
+            float(conf.get('lookup_cache_ttl', 5)))
         self._reload(True)
 
     def _reload(self, force=False):
@@ -196,6 +271,9 @@ class S3SyncShunt(object):
             conf = {'containers': []}
 
         self.sync_profiles = {}
+        # The profiles may have changed (e.g. new credentials)
+        self.provider_cache.clear()
+        self.lookup_cache.clear()
         for cont in conf.get('containers', []):
             # ONLY use shunt if merge_namespaces is set to true for sync
             if not cont.get('merge_namespaces', False):
@@ -280,20 +358,25 @@ class S3SyncShunt(object):
 
         return self.app(env, start_response)
 
+    def _get_provider(self, sync_profile, per_account=False, max_conns=1):
+        # Rather than wait on a busy provider, we fall back to a new one
+        return self.provider_cache.get_provider(
+            sync_profile, self.provider_max_conns, per_account=per_account,
+            needed_conns=max_conns)
+
     def iter_remote_objects(
             self, sync_profile, per_account, marker, limit, prefix, delimiter):
-        provider = create_provider(sync_profile, max_conns=1,
-                                   per_account=per_account)
+        provider = self._get_provider(sync_profile, per_account)
         return iter_listing(
             provider.list_objects, self.logger, marker, limit, prefix,
-            delimiter)
+            delimiter, max_entries=limit)
 
     def iter_remote_account(
             self, sync_profile, marker, limit, prefix, delimiter):
         '''Iterate through the remote listing of containers.'''
-        provider = create_provider(sync_profile, max_conns=1)
+        provider = self._get_provider(sync_profile)
         return iter_listing(provider.list_buckets, self.logger, marker, limit,
-                            prefix, delimiter)
+                            prefix, delimiter, max_entries=limit)
 
     def handle_account(self, req, start_response, sync_profile, account):
         limit, marker, prefix, delimiter, _ = get_list_params(
@@ -303,36 +386,35 @@ class S3SyncShunt(object):
         # We always make the request with the json format and convert to the
         # client-expected response.
         req.params = dict(req.params, format='json')
+        remote_args = (sync_profile, marker, limit, prefix, delimiter)
+        # List the remote account while the local listing is requested
+        remote_listing = self._spawn_remote_listing(
+            req, self.iter_remote_account, *remote_args)
         status, headers, app_iter = req.call_application(self.app)
         if not status.startswith('200 '):
             # Only splice 200 (since it's JSON, we know there won't be a 204).
             # The account must exist in both clusters.
+            self._discard_remote_listing(remote_listing)
             start_response(status, headers)
             return app_iter
 
-        _, remote_iter = self.iter_remote_account(
-            sync_profile, marker, limit, prefix, delimiter)
-        spliced = splice_listing(
-            json.load(utils.FileLikeIter(app_iter)), remote_iter, limit)
-        response = format_container_listing_response(
-            spliced, resp_type, account)
-        dict_headers = dict(headers)
-        dict_headers['Content-Length'] = len(response)
-        dict_headers['Content-Type'] = resp_type
-        start_response(status, dict_headers.items())
-        return response
+        _, remote_iter = self._get_remote_listing(
+            remote_listing, self.iter_remote_account, *remote_args)
+        spliced = iter_splice_listing(
+            iter_json_list(app_iter), remote_iter, limit)
+        start_response(status, self._listing_headers(headers, resp_type))
+        return iter_container_listing_response(spliced, resp_type, account)
 
     def handle_object_put(
             self, req, start_response, sync_profile, per_account):
-
+        self.lookup_cache.invalidate(req)
         status, headers, app_iter = req.call_application(self.app)
 
         if not status.startswith('404 '):
             start_response(status, headers)
             return app_iter
 
-        provider = create_provider(sync_profile, max_conns=1,
-                                   per_account=per_account)
+        provider = self._get_provider(sync_profile, per_account)
         headers = {}
         if sync_profile.get('protocol') == 'swift':
             try:
@@ -369,17 +451,23 @@ class S3SyncShunt(object):
         # We always make the request with the json format and convert to the
         # client-expected response.
         req.params = dict(req.params, format='json')
+        remote_args = (sync_profile, per_account, marker, limit, prefix,
+                       delimiter)
+        # List the remote container while the local listing is requested
+        remote_listing = self._spawn_remote_listing(
+            req, self.iter_remote_objects, *remote_args)
         status, headers, app_iter = req.call_application(self.app)
 
         if not status.startswith('200 ') and not\
                 (status.startswith('404 ') and sync_profile.get('migration')):
             # Only splice 200 or 404 on migrations (since it's JSON, we know
             # there won't be a 204)
+            self._discard_remote_listing(remote_listing)
             start_response(status, headers)
             return app_iter
 
-        remote_resp, remote_iter = self.iter_remote_objects(
-            sync_profile, per_account, marker, limit, prefix, delimiter)
+        remote_resp, remote_iter = self._get_remote_listing(
+            remote_listing, self.iter_remote_objects, *remote_args)
 
         if status.startswith('404 '):
             # This must be a migration, where the container has not yet been
@@ -402,17 +490,52 @@ class S3SyncShunt(object):
             # TODO: If to_wsgi does the utf8 header encoding, we wouldn't have
             # to worry about it here.
             status = remote_resp.to_wsgi()[0]
-            spliced = splice_listing([], remote_iter, limit)
+            spliced = iter_splice_listing([], remote_iter, limit)
         else:
-            spliced = splice_listing(
-                json.load(utils.FileLikeIter(app_iter)), remote_iter, limit)
-
-        response = format_listing_response(spliced, resp_type, cont)
-        dict_headers = dict(headers)
-        dict_headers['Content-Length'] = len(response)
+            spliced = iter_splice_listing(
+                iter_json_list(app_iter), remote_iter, limit)
+
+        start_response(status, self._listing_headers(headers, resp_type))
+        return iter_listing_response(spliced, resp_type, cont)
+
+    @staticmethod
+    def _spawn_remote_listing(req, list_func, *args):
+        '''Starts the remote listing, if the request is authorized.
+
+        The proxy server only authorizes the request once the local listing
+        is requested, so we check the authorization up front. If the request
+        cannot be authorized yet (e.g. it relies on ACLs, or the auth
+        middleware comes after the shunt in the pipeline), returns None and
+        the remote store is only listed after the local response.
+        '''
+        authorize = req.environ.get('swift.authorize')
+        if authorize is None:
+            return None
+        # The callback may modify the request, so we check a copy
+        if authorize(swob.Request(dict(req.environ))) is not None:
+            return None
+        return eventlet.greenthread.spawn(list_func, *args)
+
+    @staticmethod
+    def _get_remote_listing(remote_listing, list_func, *args):
+        if remote_listing is None:
+            return list_func(*args)
+        return remote_listing.wait()
+
+    @staticmethod
+    def _discard_remote_listing(remote_listing):
+        # The local response is returned as is, so the remote listing is
+        # no longer needed.
+        if remote_listing is not None:
+            remote_listing.kill()
+
+    @staticmethod
+    def _listing_headers(headers, resp_type):
+        # The spliced listing is streamed, so its length is not known
+        dict_headers = {k: v for k, v in dict(headers).items()
+                        if k.lower() != 'content-length'}
         dict_headers['Content-Type'] = resp_type
-        start_response(status, dict_headers.items())
-        return response
+        return dict_headers.items()
 
     def handle_container_head(self, req, start_response, sync_profile, cont,
                               per_account):
@@ -426,8 +549,7 @@ class S3SyncShunt(object):
         trans_id_headers = [(h, v) for h, v in headers if h.lower() in (
             'x-trans-id', 'x-openstack-request-id')]
 
-        provider = create_provider(sync_profile, max_conns=1,
-                                   per_account=per_account)
+        provider = self._get_provider(sync_profile, per_account)
 
         resp = provider.head_bucket(sync_profile['aws_bucket'])
         if resp.status != 200:
@@ -462,6 +584,11 @@ class S3SyncShunt(object):
             # Only shunt 404s
             start_response(status, headers)
             return app_iter
+        cached = self.lookup_cache.get(req)
+        if cached and cached[0].startswith('404 '):
+            # The object is missing on both sides
+            start_response(status, headers)
+            return app_iter
         self.logger.debug('404 for %s; shunting to %r'
                           % (req.path, redact_secrets(sync_profile)))
 
@@ -471,10 +598,14 @@ class S3SyncShunt(object):
 
         utils.close_if_possible(app_iter)
 
+        if cached:
+            status, headers = cached
+            start_response(status, headers + trans_id_headers)
+            return []
+
         # NOTE: we may need to make auxiliary requests and hence need two
         # connections.
-        provider = create_provider(sync_profile, max_conns=2,
-                                   per_account=per_account)
+        provider = self._get_provider(sync_profile, per_account, max_conns=2)
         if req.method == 'GET' and sync_profile.get('restore_object', False) \
                 and 'range' not in req.headers:
 
@@ -548,6 +679,7 @@ class S3SyncShunt(object):
         self.logger.debug('Remote resp: %s' % status)
 
         headers = filter_hop_by_hop_headers(headers)
+        self.lookup_cache.put(req, status, headers)
         headers.extend(trans_id_headers)
 
         start_response(status, headers)
@@ -555,6 +687,7 @@ class S3SyncShunt(object):
 
     def handle_delete(
             self, req, start_response, sync_profile, obj, per_account):
+        self.lookup_cache.invalidate(req)
         status, headers, app_iter = req.call_application(self.app)
 
         if sync_profile.get('protocol') != 'swift':
@@ -562,8 +695,7 @@ class S3SyncShunt(object):
             return app_iter
 
         if sync_profile.get('migration'):
-            provider = create_provider(sync_profile, max_conns=1,
-                                       per_account=per_account)
+            provider = self._get_provider(sync_profile, per_account)
             remote_resp = provider.shunt_delete(req, obj)
 
         if status.startswith('404'):
@@ -591,6 +723,7 @@ class S3SyncShunt(object):
         if not obj:
             req.headers[get_sys_migrator_header('container')] =\
                 MigrationContainerStates.MODIFIED
+        self.lookup_cache.invalidate(req)
         status, headers, app_iter = req.call_application(self.app)
 
         # if object has already been migrated, do not shunt post
@@ -603,8 +736,7 @@ class S3SyncShunt(object):
             start_response(status, headers)
             return app_iter
 
-        provider = create_provider(sync_profile, max_conns=1,
-                                   per_account=per_account)
+        provider = self._get_provider(sync_profile, per_account)
         status, headers, app_iter = provider.shunt_post(req, obj)
         start_response(status, headers)
         return app_iter
@@ -55,6 +55,11 @@ class StatsReporter(object):
             stat_name = '.'.join([self.metric_prefix, metric])
             self.statsd_client.timing(stat_name, timing)
 
+    def gauge(self, metric, value):
+        if self.statsd_client:
+            stat_name = '.'.join([self.metric_prefix, metric])
+            self.statsd_client.gauge(stat_name, value)
+
 
 class StatsReporterFactory(object):
     def __init__(self, statsd_host, statsd_port, statsd_prefix,
@@ -22,6 +22,7 @@ import md5
 import os
 import os.path
 import re
+import tempfile
 import time
 import traceback
 
@@ -29,7 +30,7 @@ from container_crawler.exceptions import RetryError
 from swift.common.utils import decode_timestamps
 
 from .base_sync import BaseSync, LOGGER_NAME
-from .provider_factory import create_provider
+from .provider_factory import ProviderCache, create_provider
 from .stats import StatsReporterFactory, build_statsd_prefix
 
 
@@ -38,6 +39,86 @@ def hash_dict(data):
     return md5.md5(str(sorted(data.items()))).hexdigest()
 
 
+class SyncStatusCache(object):
+    """Cache of the per-container sync status files.
+
+    Status files are parsed once and kept in memory. Updates are written out
+    at most every flush_interval seconds (or on every update if the interval
+    is 0). Once started, a green thread also writes them out after the
+    interval if no further updates come in. Each file is replaced
+    atomically, so a crash can only lose the most recent progress (causing
+    some rows to be processed again), rather than corrupt the status.
+    """
+    def __init__(self, flush_interval=0):
+        self.flush_interval = flush_interval
+        self.logger = logging.getLogger(LOGGER_NAME)
+        self._statuses = {}
+        self._dirty = set()
+        self._last_flush = time.time()
+        self._flusher = None
+
+    def start(self):
+        if self.flush_interval and self._flusher is None:
+            self._flusher = eventlet.spawn(self._flush_periodically)
+
+    def stop(self):
+        if self._flusher is not None:
+            self._flusher.kill()
+            self._flusher = None
+        self.flush()
+
+    def _flush_periodically(self):
+        while True:
+            delay = self._last_flush + self.flush_interval - time.time()
+            if delay > 0:
+                eventlet.sleep(delay)
+                continue
+            try:
+                self.flush()
+            except Exception:
+                self.logger.error('Failed to write the sync status: %s' %
+                                  traceback.format_exc())
+                # Retry after another interval
+                self._last_flush = time.time()
+
+    def get(self, status_file):
+        if status_file not in self._statuses:
+            self._statuses[status_file] = self._load(status_file)
+        return self._statuses[status_file]
+
+    def _load(self, status_file):
+        if not os.path.exists(status_file):
+            return {}
+        with open(status_file) as f:
+            try:
+                return json.load(f)
+            except ValueError:
+                self.logger.warning(
+                    'Ignoring corrupted status file %s' % status_file)
+                return {}
+
+    def update(self, status_file, db_id, entry):
+        self.get(status_file)[db_id] = entry
+        self._dirty.add(status_file)
+        if time.time() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def _write(self, status_file):
+        status_dir = os.path.dirname(status_file)
+        if not os.path.exists(status_dir):
+            os.mkdir(status_dir)
+        with tempfile.NamedTemporaryFile(
+                dir=status_dir, delete=False) as tmp_fh:
+            json.dump(self._statuses[status_file], tmp_fh)
+        os.rename(tmp_fh.name, status_file)
+
+    def flush(self):
+        self._last_flush = time.time()
+        for status_file in list(self._dirty):
+            self._write(status_file)
+            self._dirty.discard(status_file)
+
+
 class SyncContainer(container_crawler.base_sync.BaseSync):
     # There is an implicit link between the names of the json fields and the
     # object fields -- they have to be the same.
@@ -50,10 +131,14 @@ class SyncContainer(container_crawler.base_sync.BaseSync):
     METADATA_HASH_KEY = 'metadata_hash'
 
     def __init__(self, status_dir, sync_settings, stats_factory,
-                 max_conns=10, per_account=False):
+                 max_conns=10, per_account=False, status_cache=None,
+                 provider_cache=None):
         super(SyncContainer, self).__init__(
             status_dir, sync_settings, per_account)
         self.logger = logging.getLogger(LOGGER_NAME)
+        if status_cache is None:
+            status_cache = SyncStatusCache()
+        self.status_cache = status_cache
         self.aws_bucket = sync_settings['aws_bucket']
         self.copy_after = int(sync_settings.get('copy_after', 0))
         self.retain_local = sync_settings.get('retain_local', True)
@@ -70,79 +155,60 @@ class SyncContainer(container_crawler.base_sync.BaseSync):
             sync_settings.get('exclude_pattern', '^$'))
 
         self._settings = sync_settings
-        self.provider = create_provider(sync_settings, max_conns,
-                                        per_account=self._per_account)
+        if provider_cache is None:
+            self.provider = create_provider(sync_settings, max_conns,
+                                            per_account=self._per_account)
+        else:
+            self.provider = provider_cache.get_provider(
+                sync_settings, max_conns, per_account=self._per_account)
 
         self.stats_reporter = stats_factory.instance(build_statsd_prefix(
             self._settings))
 
     def _get_status_row(self, row_field, db_id):
-        if not os.path.exists(self._status_file):
-            return 0
-        with open(self._status_file) as f:
-            try:
-                status = json.load(f)
-                # First iteration did not include the bucket and DB ID
-                if row_field == self.PROCESSED_ROW_KEY and row_field in status:
-                    return status[row_field]
-                if db_id in status:
-                    entry = status[db_id]
-                    if entry['aws_bucket'] != self.aws_bucket:
-                        return 0
-                    # Prior to 0.1.18, policy was not included in the status
-                    if 'policy' in status[db_id]:
-                        for field in self.POLICY_FIELDS:
-                            value = getattr(self, field)
-                            if status[db_id]['policy'][field] != value:
-                                return 0
-                    try:
-                        return entry[row_field]
-                    except KeyError:
-                        # Happens for the new last_verified_row field.
-                        if row_field == self.VERIFIED_ROW_KEY:
-                            return entry.get(self.PROCESSED_ROW_KEY, 0)
-                        return 0
+        status = self.status_cache.get(self._status_file)
+        # First iteration did not include the bucket and DB ID
+        if row_field == self.PROCESSED_ROW_KEY and row_field in status:
+            return status[row_field]
+        if db_id in status:
+            entry = status[db_id]
+            if entry['aws_bucket'] != self.aws_bucket:
                 return 0
-            except ValueError:
+            # Prior to 0.1.18, policy was not included in the status
+            if 'policy' in status[db_id]:
+                for field in self.POLICY_FIELDS:
+                    value = getattr(self, field)
+                    if status[db_id]['policy'][field] != value:
+                        return 0
+            try:
+                return entry[row_field]
+            except KeyError:
+                # Happens for the new last_verified_row field.
+                if row_field == self.VERIFIED_ROW_KEY:
+                    return entry.get(self.PROCESSED_ROW_KEY, 0)
                 return 0
+        return 0
 
     def _save_status_row(self, row, row_field, db_id):
         policy = {}
         for field in self.POLICY_FIELDS:
             policy[field] = getattr(self, field)
 
-        if not os.path.exists(self._status_account_dir):
-            os.mkdir(self._status_account_dir)
-        if not os.path.exists(self._status_file):
-            with open(self._status_file, 'w') as f:
-                new_entry = {self.PROCESSED_ROW_KEY: 0,
-                             self.VERIFIED_ROW_KEY: 0,
-                             'aws_bucket': self.aws_bucket,
-                             'policy': policy}
-                new_entry[row_field] = row
-                json.dump({db_id: new_entry}, f)
-                return
-
-        with open(self._status_file, 'r+') as f:
-            status = json.load(f)
-            old_entry = status.get(db_id, {})
-            new_entry = {'aws_bucket': self.aws_bucket,
-                         'policy': policy}
-            # The first version did not include the DB ID and aws_bucket in the
-            # status entries
-            if self.PROCESSED_ROW_KEY in status:
-                new_entry[self.PROCESSED_ROW_KEY] =\
-                    status[self.PROCESSED_ROW_KEY]
-            new_entry[self.PROCESSED_ROW_KEY] = old_entry.get(
-                self.PROCESSED_ROW_KEY, 0)
-            new_entry[self.VERIFIED_ROW_KEY] = old_entry.get(
-                self.VERIFIED_ROW_KEY, new_entry[self.PROCESSED_ROW_KEY])
-            new_entry[row_field] = row
-            status[db_id] = new_entry
-
-            f.seek(0)
-            json.dump(status, f)
-            f.truncate()
+        status = self.status_cache.get(self._status_file)
+        old_entry = status.get(db_id, {})
+        new_entry = {'aws_bucket': self.aws_bucket,
+                     'policy': policy}
+        # The first version did not include the DB ID and aws_bucket in the
+        # status entries
+        if self.PROCESSED_ROW_KEY in status:
+            new_entry[self.PROCESSED_ROW_KEY] =\
+                status[self.PROCESSED_ROW_KEY]
+        new_entry[self.PROCESSED_ROW_KEY] = old_entry.get(
+            self.PROCESSED_ROW_KEY, 0)
+        new_entry[self.VERIFIED_ROW_KEY] = old_entry.get(
+            self.VERIFIED_ROW_KEY, new_entry[self.PROCESSED_ROW_KEY])
+        new_entry[row_field] = row
+        self.status_cache.update(self._status_file, db_id, new_entry)
 
     def get_last_processed_row(self, db_id):
         return self._get_status_row(self.PROCESSED_ROW_KEY, db_id)
@@ -223,18 +289,31 @@ class SyncContainerFactory(object):
             raise RuntimeError('Configuration option "status_dir" is missing')
         self.config = config
         self._handler_class = handler_class
+        self.status_cache = SyncStatusCache(
+            int(config.get('status_flush_interval', 60)))
+        self.provider_cache = ProviderCache(
+            int(config.get('provider_cache_size', 1000)),
+            int(config.get('provider_idle_timeout', 600)))
+        # All of the handlers share the statsd client
+        self.stats_factory = StatsReporterFactory(
+            config.get('statsd_host', None),
+            config.get('statsd_port', 8125),
+            config.get('statsd_prefix'))
 
     def __str__(self):
         return 'SyncContainer'
 
     def instance(self, settings, per_account=False):
-        stats_factory = StatsReporterFactory(
-            self.config.get('statsd_host', None),
-            self.config.get('statsd_port', 8125),
-            self.config.get('statsd_prefix'))
-
         return self._handler_class(
             self.config['status_dir'],
             settings,
             per_account=per_account,
-            stats_factory=stats_factory)
+            stats_factory=self.stats_factory,
+            status_cache=self.status_cache,
+            provider_cache=self.provider_cache)
+
+    def start_status_flusher(self):
+        self.status_cache.start()
+
+    def flush_status(self):
+        self.status_cache.stop()
@@ -669,7 +669,8 @@ class SyncS3(BaseSync):
                                              swift_req_hdrs, internal_client)
                     return self.UploadStatus.POST
             self._upload_slo(manifest, headers, s3_key, internal_client,
-                             upload_stats_cb)
+                             upload_stats_cb,
+                             self._get_existing_parts(swift_key, s3_meta))
 
         with self.client_pool.get_client() as s3_client:
             # We upload the manifest so that we can restore the object in
@@ -746,8 +747,31 @@ class SyncS3(BaseSync):
                 params['ServerSideEncryption'] = 'AES256'
             return s3_client.create_multipart_upload(**params)
 
+    def _get_existing_parts(self, swift_key, s3_meta):
+        '''Maps the segments of the uploaded SLO to its byte ranges in S3.
+
+        The segments of a new version of the SLO that did not change can be
+        copied from the uploaded object, rather than streamed from Swift. The
+        manifest uploaded alongside the object has to match its ETag.
+        '''
+        if not s3_meta or self.in_glacier(s3_meta):
+            return {}
+        manifest = self.get_manifest(swift_key)
+        if not manifest or not self.check_etag(
+                get_slo_etag(manifest), s3_meta['ETag']):
+            return {}
+        parts = {}
+        offset = 0
+        for segment in manifest:
+            size = int(segment['bytes'])
+            if size:
+                parts.setdefault((segment['hash'], size), 'bytes=%d-%d' % (
+                    offset, offset + size - 1))
+            offset += size
+        return parts
+
     def _upload_slo(self, manifest, object_meta, s3_key, internal_client,
-                    upload_stats_cb=None):
+                    upload_stats_cb=None, existing_parts=None):
         multipart_resp = self._create_multipart_upload(object_meta, s3_key)
         upload_id = multipart_resp['UploadId']
 
@@ -758,7 +782,7 @@ class SyncS3(BaseSync):
             workers.append(
                 worker_pool.spawn(self._upload_part_worker, upload_id, s3_key,
                                   work_queue, len(manifest), internal_client,
-                                  upload_stats_cb))
+                                  upload_stats_cb, existing_parts))
         for segment_number, segment in enumerate(manifest, 1):
             work_queue.put((segment_number, segment))
 
@@ -812,7 +836,8 @@ class SyncS3(BaseSync):
                 PartNumber=int(part_number))
 
     def _upload_part_worker(self, upload_id, s3_key, queue, part_count,
-                            internal_client, upload_stats_cb=None):
+                            internal_client, upload_stats_cb=None,
+                            existing_parts=None):
         errors = []
         while True:
             work = queue.get()
@@ -821,8 +846,25 @@ class SyncS3(BaseSync):
                 return errors
 
             try:
+                part_number, segment = work
+                copy_range = existing_parts and existing_parts.get(
+                    (segment['hash'], int(segment['bytes'])))
+                if copy_range:
+                    # The segment did not change since the previous upload
+                    self.logger.debug('Copying part %d from %s: %s' % (
+                        part_number, s3_key, copy_range))
+                    resp = self._upload_part_copy(
+                        s3_key, self.aws_bucket, s3_key, upload_id,
+                        part_number, copy_range)
+                    if not self.check_etag(
+                            segment['hash'], resp['CopyPartResult']['ETag']):
+                        self.logger.error(
+                            'Part %d ETag mismatch (%s): %s %s',
+                            part_number, self.account + segment['name'],
+                            segment['hash'], resp['CopyPartResult']['ETag'])
+                        errors.append(part_number)
+                    continue
                 with self.client_pool.get_client() as s3_client:
-                    part_number, segment = work
                     container, obj = segment['name'].split('/', 2)[1:]
                     self.logger.debug('Uploading part %d from %s: %s bytes' % (
                         part_number, self.account + segment['name'],
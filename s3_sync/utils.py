@@ -15,9 +15,12 @@
 import datetime
 import eventlet
 import hashlib
+import itertools
 import json
+import re
 import string
 import StringIO
+import sys
 import urllib
 
 from email.header import Header, decode_header
@@ -87,6 +90,8 @@ DEFAULT_CHUNK_SIZE = 65536
 DEFAULT_SEGMENT_SIZE = 100 * 1024 * 1024
 REMOTE_ETAG = get_object_transient_sysmeta(
     'multi-cloud-internal-migrator-remote-etag')
+# Whitespace and separators between the entries of a JSON list
+JSON_LIST_SEPARATORS = re.compile(r'[\s,]*')
 
 
 class MigrationContainerStates(object):
@@ -1202,8 +1207,20 @@ def response_is_complete(status_code, headers):
     return end + 1 == length
 
 
-def iter_listing(list_func, logger, marker, limit, prefix, delimiter):
+def iter_listing(list_func, logger, marker, limit, prefix, delimiter,
+                 max_entries=None):
+    '''Iterates over the entries of a (paginated) listing.
+
+    The next page is requested while the current one is being consumed.
+    Callers that need no more than max_entries entries (e.g. to splice a
+    listing with a limit) can set it to avoid prefetching pages past that.
+    '''
+    def _list(marker):
+        return list_func(marker=marker, limit=limit, prefix=prefix,
+                         delimiter=delimiter)
+
     def _results_iterator(_resp):
+        listed = 0
         while True:
             if _resp.status != 200:
                 logger.error(
@@ -1212,6 +1229,12 @@ def iter_listing(list_func, logger, marker, limit, prefix, delimiter):
                 break
             if not _resp.body:
                 break
+            last_item = _resp.body[-1]
+            marker = last_item.get('name', last_item.get('subdir'))
+            listed += len(_resp.body)
+            next_page = None
+            if max_entries is None or listed < max_entries:
+                next_page = eventlet.greenthread.spawn(_list, marker)
             for item in _resp.body:
                 if 'name' in item:
                     marker = item['name']
@@ -1220,22 +1243,27 @@ def iter_listing(list_func, logger, marker, limit, prefix, delimiter):
                 item['content_location'] = [item['content_location']]
 
                 yield item, marker
-            _resp = list_func(
-                marker=marker, limit=limit, prefix=prefix, delimiter=delimiter)
+            if next_page is None:
+                _resp = _list(marker)
+            else:
+                _resp = next_page.wait()
         yield None, None  # just to simplify some book-keeping
 
-    resp = list_func(marker=marker, limit=limit, prefix=prefix,
-                     delimiter=delimiter)
+    resp = _list(marker)
     return resp, _results_iterator(resp)
 
 
 def splice_listing(local_iter, remote_iter, limit):
+    return list(iter_splice_listing(local_iter, remote_iter, limit))
+
+
+def iter_splice_listing(local_iter, remote_iter, limit):
     remote_item, remote_key = next(remote_iter)
     # There used to be an unnecessary short-circuit here if remote_item is
     # false. However, it's easier to handle "local_iter" possibly only yielding
     # items and not tuples of (item, key) if that's only handled in one place.
 
-    spliced_response = []
+    count = 0
     for local_item in local_iter:
         # If local_iter came from iter_listing() then it has local_key in it
         # already, otherwise it will have come from a local Swift cluster
@@ -1253,21 +1281,23 @@ def splice_listing(local_iter, remote_iter, limit):
             # local_iter came from iter_listing() and it's exhausted
             break
 
-        if len(spliced_response) == limit:
+        if count == limit:
             break
 
         if not remote_item:
-            spliced_response.append(local_item)
+            count += 1
+            yield local_item
             continue
 
-        while (remote_item and remote_key < local_key and
-               len(spliced_response) < limit):
-            spliced_response.append(remote_item)
+        while remote_item and remote_key < local_key and count < limit:
+            count += 1
+            yield remote_item
             remote_item, remote_key = next(remote_iter)
 
-        if len(spliced_response) == limit:
+        if count == limit:
             break
 
+        count += 1
         if remote_key == local_key:
             # duplicate!
             # XXX(darrell): this is backward for cloud-connector; the value to
@@ -1276,21 +1306,116 @@ def splice_listing(local_iter, remote_iter, limit):
             # local_item['content_location'] or
             # local_item['content_location'][0] or something??
             remote_item['content_location'].append('swift')
-            spliced_response.append(remote_item)
+            yield remote_item
             remote_item, remote_key = next(remote_iter)
         else:
-            spliced_response.append(local_item)
+            yield local_item
 
     while remote_item:
-        if len(spliced_response) == limit:
+        if count == limit:
             break
-        spliced_response.append(remote_item)
+        count += 1
+        yield remote_item
         remote_item, _junk = next(remote_iter)
-    return spliced_response
+
+
+def iter_json_list(app_iter, chunk_size=DEFAULT_CHUNK_SIZE):
+    '''Incrementally parses a JSON list, such as a Swift listing response.
+
+    :param app_iter: Iterable of strings with the JSON-encoded list.
+    :param chunk_size: How much of the response to read at a time.
+    :returns: Iterator that produces the list entries as they are parsed.
+    :raises ValueError: if the response is not a JSON list.
+    '''
+    decoder = json.JSONDecoder()
+    body = FileLikeIter(app_iter)
+
+    def _read():
+        chunk = body.read(chunk_size)
+        if not chunk:
+            raise ValueError('Unexpected end of the JSON list')
+        return chunk
+
+    try:
+        buf = _read().lstrip()
+        while not buf:
+            buf = _read().lstrip()
+        if not buf.startswith('['):
+            raise ValueError('Expected a JSON list')
+        pos = 1
+        while True:
+            pos = JSON_LIST_SEPARATORS.match(buf, pos).end()
+            if pos == len(buf):
+                buf = _read()
+                pos = 0
+                continue
+            if buf[pos] == ']':
+                return
+            try:
+                entry, pos = decoder.raw_decode(buf, pos)
+            except ValueError:
+                # The entry may be split across chunks
+                buf = buf[pos:] + _read()
+                pos = 0
+                continue
+            yield entry
+    finally:
+        body.close()
+
+
+def iter_prefetched_pages(pages, depth=1):
+    '''Iterates over the entries of the pages of a listing, while the
+    following pages are requested in a green thread.
+
+    At most depth pages are buffered, in addition to the page being consumed
+    and the page being requested. Errors raised when requesting a page are
+    re-raised when the page would have been reached.
+
+    :param pages: Iterator that produces the pages (lists of entries).
+    :param depth: Number of pages to prefetch. Set to 0 to request the pages
+                  on demand.
+    :returns: Iterator that produces the entries of all the pages.
+    '''
+    if depth < 1:
+        return itertools.chain.from_iterable(pages)
+
+    queue = eventlet.queue.Queue(depth)
+    state = {'stopped': False}
+
+    def _fetch_pages():
+        try:
+            for page in pages:
+                queue.put((page, None))
+                if state['stopped']:
+                    return
+        except Exception:
+            queue.put((None, sys.exc_info()))
+            return
+        queue.put((None, None))
+
+    def _iter_entries():
+        try:
+            while True:
+                page, exc_info = queue.get()
+                if exc_info:
+                    raise exc_info[0], exc_info[1], exc_info[2]
+                if page is None:
+                    return
+                for entry in page:
+                    yield entry
+        finally:
+            # Let the fetching thread exit if the listing is abandoned
+            state['stopped'] = True
+            while not queue.empty():
+                queue.get_nowait()
+
+    eventlet.greenthread.spawn_n(_fetch_pages)
+    return _iter_entries()
 
 
 def iter_internal_listing(
-        client, account, container=None, marker='', prefix=None):
+        client, account, container=None, marker='', prefix=None,
+        prefetch=0):
     '''Calls GET on the specified path to list items.
 
     Useful in case we cannot use the InternalClient.iter_{containers,
@@ -1305,43 +1430,59 @@ def iter_internal_listing(
     :param marker: Optional marker parameter -- specifies the object name from
                    which to resume the listing.
     :param prefix: Optional prefix parameter for listing.
+    :param prefetch: Optional number of pages to request ahead of the
+                     consumer (see iter_prefetched_pages()).
     :returns: Iterator that produces listing entries (dictionary).
     '''
-    while True:
-        def _make_internal_request(ic):
-            path = ic.make_path(account, container)
-            query_string = 'format=json&marker=%s' % quote(marker)
-            if prefix:
-                query_string += '&prefix=%s' % quote(prefix)
-            return ic.make_request(
-                'GET', '%s?%s' % (path, query_string), {},
-                (2, HTTP_NOT_FOUND))
-
-        if callable(client):
-            with client() as ic:
-                resp = _make_internal_request(ic)
-        else:
-            resp = _make_internal_request(client)
+    def _iter_pages(marker):
+        while True:
+            def _make_internal_request(ic):
+                path = ic.make_path(account, container)
+                query_string = 'format=json&marker=%s' % quote(marker)
+                if prefix:
+                    query_string += '&prefix=%s' % quote(prefix)
+                return ic.make_request(
+                    'GET', '%s?%s' % (path, query_string), {},
+                    (2, HTTP_NOT_FOUND))
+
+            if callable(client):
+                with client() as ic:
+                    resp = _make_internal_request(ic)
+            else:
+                resp = _make_internal_request(client)
 
-        if resp.status_int != 200:
-            break
-        if not resp.body:
-            break
+            if resp.status_int != 200:
+                break
+            if not resp.body:
+                break
 
-        listing = json.loads(resp.body)
-        if not listing:
-            break
-        for entry in listing:
-            yield entry
-        marker = listing[-1]['name'].encode('utf-8')
-    # Simplifies the bookkeeping
-    yield None
+            listing = json.loads(resp.body)
+            if not listing:
+                break
+            yield listing
+            marker = listing[-1]['name'].encode('utf-8')
+
+    # The trailing None simplifies the bookkeeping
+    return itertools.chain(
+        iter_prefetched_pages(_iter_pages(marker), prefetch), [None])
 
 
 def format_xml_listing(
         list_results, root_node, root_name, entry_node, fields):
-    root = etree.Element(root_node, name=root_name)
+    return ''.join(iter_xml_listing(
+        list_results, root_node, root_name, entry_node, fields))
+
+
+def iter_xml_listing(list_results, root_node, root_name, entry_node, fields):
+    root = etree.tostring(etree.Element(root_node, name=root_name),
+                          encoding='UTF-8')
+    yield '<?xml version="1.0" encoding="UTF-8"?>\n'
+    started = False
     for entry in list_results:
+        if not started:
+            # Drop the closing "/>" of the empty root element
+            yield root[:-2] + '>'
+            started = True
         obj = etree.Element(entry_node)
         for field in fields:
             if field not in entry:
@@ -1354,36 +1495,62 @@ def format_xml_listing(
                 text = str(text)
             elem.text = text
             obj.append(elem)
-        root.append(obj)
-    resp = etree.tostring(root, encoding='UTF-8', xml_declaration=True)
-    return resp.replace("<?xml version='1.0' encoding='UTF-8'?>",
-                        '<?xml version="1.0" encoding="UTF-8"?>', 1)
+        yield etree.tostring(obj, encoding='UTF-8')
+    if started:
+        yield '</%s>' % root_node
+    else:
+        yield root
+
+
+def iter_json_listing(list_results):
+    yield '['
+    for i, entry in enumerate(list_results):
+        if i:
+            yield ', '
+        yield json.dumps(entry)
+    yield ']'
+
+
+def iter_plain_listing(list_results):
+    for i, entry in enumerate(list_results):
+        name = entry['name'] if 'name' in entry else entry['subdir']
+        if i:
+            name = u'\n' + name
+        yield name.encode('utf-8')
 
 
 def format_container_listing_response(list_results, list_format, account):
+    return ''.join(iter_container_listing_response(
+        list_results, list_format, account))
+
+
+def iter_container_listing_response(list_results, list_format, account):
     if list_format == 'application/json':
-        return json.dumps(list_results)
+        return iter_json_listing(list_results)
     if list_format.endswith('/xml'):
         fields = ['name', 'count', 'bytes', 'last_modified', 'subdir']
-        return format_xml_listing(
+        return iter_xml_listing(
             list_results, 'account', account, 'container', fields)
     # Default to plain format
-    return u'\n'.join(entry['name'] if 'name' in entry else entry['subdir']
-                      for entry in list_results).encode('utf-8')
+    return iter_plain_listing(list_results)
 
 
 def format_listing_response(list_results, list_format, container):
+    return ''.join(iter_listing_response(
+        list_results, list_format, container))
+
+
+def iter_listing_response(list_results, list_format, container):
     if list_format == 'application/json':
-        return json.dumps(list_results)
+        return iter_json_listing(list_results)
     if list_format.endswith('/xml'):
         fields = ['name', 'content_type', 'hash', 'bytes', 'last_modified',
                   'subdir']
-        return format_xml_listing(
+        return iter_xml_listing(
             list_results, 'container', container, 'object', fields)
 
     # Default to plain format
-    return u'\n'.join(entry['name'] if 'name' in entry else entry['subdir']
-                      for entry in list_results).encode('utf-8')
+    return iter_plain_listing(list_results)
 
 
 def get_list_params(req, list_limit):
@@ -15,7 +15,6 @@ limitations under the License.
 """
 
 from datetime import datetime
-from itertools import cycle
 import json
 import mock
 import os
@@ -109,15 +108,25 @@ class TestCloudConnectorApp(TestCloudConnectorBase):
             'secret_key': u'\u062akey val',
         }
 
-        patcher = mock.patch('s3_sync.cloud_connector.app.create_provider')
+        patcher = mock.patch('s3_sync.provider_factory.create_provider')
         self.mock_create_provider = patcher.start()
         self.addCleanup(patcher.stop)
 
         self.mock_ltm_provider = mock.Mock()
         self.mock_rtm_provider = mock.Mock()
-        # We happen to know the local-to-me provider is created first.
-        self.mock_create_provider.side_effect = cycle([
-            self.mock_ltm_provider, self.mock_rtm_provider])
+        for provider in (self.mock_ltm_provider, self.mock_rtm_provider):
+            # A named mock is not attached to the provider, so that the
+            # provider cache's calls do not show up in its mock_calls
+            provider.client_pool = mock.Mock(name='client_pool')
+            provider.client_pool.free_count.return_value = 10
+
+        # Only the remote-to-me provider bypasses the shunt.
+        def _create_provider(profile, max_conns, per_account, logger,
+                             extra_headers):
+            if extra_headers:
+                return self.mock_rtm_provider
+            return self.mock_ltm_provider
+        self.mock_create_provider.side_effect = _create_provider
 
         # Get ourselves an Application instance to play with
         patcher = mock.patch('s3_sync.cloud_connector.util.get_env_options')
@@ -279,11 +288,10 @@ class TestCloudConnectorApp(TestCloudConnectorBase):
         exp_profile['container'] = 'jojo'
         self.assertEqual(exp_profile, controller.local_to_me_profile)
         self.assertEqual([
-            mock.call(controller.local_to_me_profile, max_conns=1,
-                      per_account=True, logger=self.app.logger),
-            mock.call(controller.remote_to_me_profile, max_conns=1,
-                      per_account=False, logger=self.app.logger,
-                      extra_headers={'x-cloud-sync-shunt-bypass': 'true'}),
+            mock.call(controller.local_to_me_profile, 10, True,
+                      self.app.logger, None),
+            mock.call(controller.remote_to_me_profile, 10, False,
+                      self.app.logger, {'x-cloud-sync-shunt-bypass': 'true'}),
         ], self.mock_create_provider.mock_calls)
         self.assertEqual([
             mock.call.debug(
@@ -297,6 +305,33 @@ class TestCloudConnectorApp(TestCloudConnectorBase):
                  if 'secret' not in k}),
         ], self.mock_logger.mock_calls)
 
+    def test_controller_provider_reuse(self):
+        controller, _ = self.controller_for(u'AUTH_b\u062a', 'jojo', 'oo',
+                                            'GET')
+        other_controller, _ = self.controller_for(u'AUTH_b\u062a', 'jojo',
+                                                  'other', 'GET')
+        self.assertEqual(2, self.mock_create_provider.call_count)
+        self.assertIs(self.mock_ltm_provider,
+                      other_controller.local_to_me_provider)
+        self.assertIs(self.mock_rtm_provider,
+                      other_controller.remote_to_me_provider)
+
+        # busy providers are not waited on
+        self.mock_ltm_provider.client_pool.free_count.return_value = 0
+        self.mock_create_provider.reset_mock()
+        self.controller_for(u'AUTH_b\u062a', 'jojo', 'oo', 'GET')
+        self.assertEqual([
+            mock.call(controller.local_to_me_profile, 1, True,
+                      self.app.logger, None),
+        ], self.mock_create_provider.mock_calls)
+
+        # a new sync config drops the cached providers
+        self.mock_ltm_provider.client_pool.free_count.return_value = 10
+        self.mock_create_provider.reset_mock()
+        self.app.load_sync_config(json.dumps(self.sync_conf))
+        self.controller_for(u'AUTH_b\u062a', 'jojo', 'oo', 'GET')
+        self.assertEqual(2, self.mock_create_provider.call_count)
+
     def test_container_head_in_local(self):
         controller, req = self.controller_for(u'AUTH_b\u062a', 'jojo',
                                               verb='HEAD')
@@ -390,6 +425,9 @@ class TestCloudConnectorApp(TestCloudConnectorBase):
         self.mock_ltm_provider.list_objects.side_effect = [
             ProviderResponse(False, 400, {}, ''),
         ]
+        self.mock_rtm_provider.list_objects.side_effect = [
+            ProviderResponse(True, 200, {}, []),
+        ]
         got = controller.GET(req)
 
         self.assertEqual(400, got.status_int)
@@ -398,6 +436,7 @@ class TestCloudConnectorApp(TestCloudConnectorBase):
             mock.call.list_objects(
                 marker='a b', limit=10, prefix='abc', delimiter='def'),
         ], self.mock_ltm_provider.mock_calls)
+        # The remote listing is cancelled
         self.assertEqual([], self.mock_rtm_provider.mock_calls)
 
     def test_container_get_local_404_remote_non_404_error(self):
@@ -15,6 +15,7 @@ limitations under the License.
 """
 import datetime
 import errno
+import eventlet
 import hashlib
 import itertools
 import json
@@ -26,9 +27,11 @@ import shutil
 import time
 import unittest
 
+from collections import OrderedDict
 from contextlib import contextmanager
 from StringIO import StringIO
 from swift.common.internal_client import UnexpectedResponse
+from swift.common.ring import Ring, RingBuilder
 from swift.common.utils import Timestamp
 from tempfile import NamedTemporaryFile, mkdtemp
 
@@ -344,13 +347,33 @@ class TestMigratorUtils(unittest.TestCase):
             write_status['marker'] = test_params['marker']
             migration['status'] = write_status
 
-            # gets the 1st argument in the call argument list
-            with open(os.path.join(self.test_dir, 'location')) as fh:
-                written_conf = json.load(fh)
+            # the entry is appended to the journal
+            with open(status.journal_location) as fh:
+                written_conf = map(json.loads, fh.readlines())
             for entry in written_conf:
                 self.assertTrue('aws_secret' not in entry)
             del migration['aws_secret']
             self.assertEqual(written_conf, [migration])
+            os.unlink(status.journal_location)
+
+    def test_status_save_shards(self):
+        self.setup_test_tree()
+        status = s3_sync.migrator.Status(
+            os.path.join(self.test_dir, 'location'))
+        status.status_list = []
+        migration = {'account': 'AUTH_test', 'aws_bucket': 'bucket',
+                     'aws_identity': 'id', 'aws_secret': 'secret'}
+        shards = [{'start': '', 'end': 'm', 'marker': 'c'},
+                  {'start': 'm', 'end': None, 'marker': 'm', 'done': True}]
+
+        status.save_migration(migration, 'c', 1, 2, 3, False, shards=shards)
+        self.assertEqual(shards, status.get_migration(migration)['shards'])
+        with open(status.journal_location) as fh:
+            self.assertEqual(
+                shards, json.loads(fh.readline())['status']['shards'])
+
+        status.save_migration(migration, 'c', 1, 2, 3, False)
+        self.assertNotIn('shards', status.get_migration(migration))
 
     def test_status_save_create(self):
         self.setup_test_tree()
@@ -368,8 +391,8 @@ class TestMigratorUtils(unittest.TestCase):
                 'marker', 100, 100, 1024, False)
         self.assertTrue(
             os.path.exists(os.path.dirname(status.status_location)))
-        with open(status.status_location) as fh:
-            written_conf = json.load(fh)
+        with open(status.journal_location) as fh:
+            written_conf = map(json.loads, fh.readlines())
         self.assertEqual(written_conf, [
             {'aws_identity': 'aws id',
              'status': {'marker': 'marker', 'moved_count': 100,
@@ -377,9 +400,9 @@ class TestMigratorUtils(unittest.TestCase):
                         'bytes_count': 1024}}])
 
     @mock.patch('s3_sync.migrator.os.mkdir')
-    @mock.patch('s3_sync.migrator.tempfile.NamedTemporaryFile')
-    def test_status_save_create_raises(self, mock_temp, mock_mkdir):
-        mock_temp.side_effect = OSError(errno.ENOENT, 'not found')
+    @mock.patch('__builtin__.open')
+    def test_status_save_create_raises(self, mock_open, mock_mkdir):
+        mock_open.side_effect = IOError(errno.ENOENT, 'not found')
         mock_mkdir.side_effect = IOError(errno.EPERM, 'denied')
 
         status = s3_sync.migrator.Status('/fake/location')
@@ -391,12 +414,12 @@ class TestMigratorUtils(unittest.TestCase):
         mock_mkdir.assert_called_once_with('/fake', 0755)
         self.assertEqual(errno.EPERM, cm.exception.errno)
 
-    @mock.patch('s3_sync.migrator.tempfile.NamedTemporaryFile')
-    def test_status_save_raises(self, mock_temp):
-        mock_temp.side_effect = OSError(errno.EPERM, 'denied')
+    @mock.patch('__builtin__.open')
+    def test_status_save_raises(self, mock_open):
+        mock_open.side_effect = IOError(errno.EPERM, 'denied')
         status = s3_sync.migrator.Status('/fake/location')
         status.status_list = []
-        with self.assertRaises(OSError) as err:
+        with self.assertRaises(IOError) as err:
             status.save_migration(
                 {'aws_identity': 'aws id', 'aws_secret': 'secret'},
                 'marker', 100, 100, 42, False)
@@ -616,10 +639,13 @@ class TestMigratorUtils(unittest.TestCase):
         self.setup_status_file_path()
         status = s3_sync.migrator.Status(self.status_file_path)
         status.load_status_list()
+        self.addCleanup(os.unlink, status.journal_location)
         status.save_migration(config, 'end', 0, 1000, 42, stats_reset=True)
         status.save_migration(config, 'end', 0, 1000, 42, stats_reset=True)
-        with open(self.status_file_path) as rf:
-            self.assertEqual(1, len(json.load(rf)))
+        self.assertEqual(1, len(status.status_list))
+        new_status = s3_sync.migrator.Status(self.status_file_path)
+        new_status.load_status_list()
+        self.assertEqual(status.status_list, new_status.status_list)
 
     @mock.patch('s3_sync.migrator.json.load')
     def test_load_corrupt_json(self, mock_json_load):
@@ -651,6 +677,74 @@ class TestMigratorUtils(unittest.TestCase):
         status.load_status_list()
         self.assertEqual(status_list, status.status_list)
 
+    def test_load_status_journal(self):
+        self.setup_test_tree()
+        status_location = os.path.join(self.test_dir, 'status')
+        entries = [
+            {'aws_identity': 'swift1', 'aws_bucket': 'container%d' % i,
+             'status': {'marker': 'foo', 'moved_count': i}}
+            for i in range(3)]
+        with open(status_location, 'w') as status_file:
+            json.dump(entries[:2], status_file)
+        updated_entry = dict(entries[1], status={
+            'marker': 'bar', 'moved_count': 10})
+        with open(status_location + '.journal', 'w') as journal:
+            journal.write(json.dumps(entries[2]) + '\n')
+            journal.write('{"aws_identity": \n')
+            journal.write(json.dumps(updated_entry) + '\n')
+            # an incomplete trailing write
+            journal.write('{"aws_identity": "swift1", "aws_bu')
+
+        status = s3_sync.migrator.Status(status_location)
+        with mock.patch.object(status, 'logger') as mock_logger:
+            status.load_status_list()
+        self.assertEqual([entries[0], updated_entry, entries[2]],
+                         status.status_list)
+        mock_logger.warning.assert_called_once_with(
+            'Skipping corrupted status journal entry: %r' %
+            '{"aws_identity": \n')
+        self.assertEqual(
+            {'marker': 'bar', 'moved_count': 10},
+            status.get_migration({'aws_identity': 'swift1',
+                                  'aws_bucket': 'container1'}))
+
+        status.prune([{'aws_identity': 'swift1',
+                       'aws_bucket': 'container%d' % i} for i in (1, 2)])
+        self.assertFalse(os.path.exists(status.journal_location))
+        with open(status_location) as status_file:
+            self.assertEqual([updated_entry, entries[2]],
+                             json.load(status_file))
+
+    def test_load_status_seed(self):
+        self.setup_test_tree()
+        seed_location = os.path.join(self.test_dir, 'status')
+        status_location = seed_location + '.0'
+        entries = [
+            {'aws_identity': 'swift1', 'aws_bucket': 'container%d' % i,
+             'status': {'marker': 'foo', 'moved_count': i}}
+            for i in range(3)]
+        with open(seed_location, 'w') as status_file:
+            json.dump(entries[:2], status_file)
+        with open(seed_location + '.journal', 'w') as journal:
+            journal.write(json.dumps(entries[2]) + '\n')
+
+        # the status of a single process is used until the process has its
+        # own status file
+        status = s3_sync.migrator.Status(status_location, seed_location)
+        status.load_status_list()
+        self.assertEqual(entries, status.status_list)
+        updated_entry = dict(entries[0], status={'marker': 'bar'})
+        with open(status.journal_location, 'w') as journal:
+            journal.write(json.dumps(updated_entry) + '\n')
+        status.load_status_list()
+        self.assertEqual([updated_entry] + entries[1:], status.status_list)
+
+        # once the status is saved, the seed is no longer used
+        status.prune([entries[0]])
+        status = s3_sync.migrator.Status(status_location, seed_location)
+        status.load_status_list()
+        self.assertEqual([updated_entry], status.status_list)
+
     def test_cmp_meta(self):
         test_cases = [
             ({'last-modified': create_timestamp(1.5e9),
@@ -732,7 +826,7 @@ class TestMigrator(unittest.TestCase):
             True, 200, [], [])
         create_provider_mock.return_value = provider_mock
         self.migrator.status = s3_sync.migrator.Status('file-path')
-        self.migrator.status.save_status_list = mock.Mock()
+        self.migrator.status.save_status_entry = mock.Mock()
         self.migrator.status.status_list = [
             {'aws_bucket': 'bucket',
              'account': 'AUTH_test',
@@ -751,6 +845,114 @@ class TestMigrator(unittest.TestCase):
         self.assertEqual(1000, status_entry['status']['last_moved_count'])
         self.assertEqual(1000, status_entry['status']['last_scanned_count'])
 
+    def _make_fake_listing(self, provider, keys):
+        def list_objects(marker, limit, prefix, bucket=None):
+            entries = [
+                {'name': key, 'hash': 'etag%s' % key,
+                 'last_modified': create_list_timestamp(1.4e9)}
+                for key in sorted(keys)
+                if key > marker and key.startswith(prefix or '')]
+            return ProviderResponse(True, 200, {}, entries[:limit])
+
+        provider.list_objects.side_effect = list_objects
+
+    def test_sample_shard_boundaries(self):
+        self.migrator.provider = mock.Mock()
+        self.migrator.listing_shards = 4
+        keys = ['%x-object' % i for i in range(16)]
+        self._make_fake_listing(self.migrator.provider, keys)
+        self.assertEqual(
+            ['4-object', '8-object', 'c-object'],
+            self.migrator._sample_shard_boundaries('bucket', ''))
+
+        # descends into a prefix common to all keys
+        keys = ['logs/%s' % char for char in 'abcdef']
+        self._make_fake_listing(self.migrator.provider, keys)
+        self.migrator.listing_shards = 3
+        self.assertEqual(
+            ['logs/c', 'logs/e'],
+            self.migrator._sample_shard_boundaries('bucket', ''))
+
+        # too few keys to shard
+        self._make_fake_listing(self.migrator.provider, ['foo'])
+        self.assertEqual(
+            [], self.migrator._sample_shard_boundaries('bucket', ''))
+
+    def test_sharded_listing_failure(self):
+        shards = [{'start': '', 'end': 'b1', 'marker': ''},
+                  {'start': 'b1', 'end': None, 'marker': 'b1'}]
+
+        def _find_missing_objects(container, aws_bucket, marker, prefix,
+                                  list_all, end):
+            if end is None:
+                raise RuntimeError('oops')
+            return 'a2'
+
+        with mock.patch.object(self.migrator, '_find_missing_objects',
+                               side_effect=_find_missing_objects):
+            with self.assertRaises(s3_sync.migrator.MigrationError) as cm:
+                self.migrator._find_missing_objects_sharded(
+                    'bucket', 'bucket', '', shards)
+        self.assertIn('Failed to list 1 of the shards', str(cm.exception))
+        # the other shard keeps its progress
+        self.assertEqual('a2', shards[0]['marker'])
+        self.assertEqual('b1', shards[1]['marker'])
+        self.assertNotIn('done', shards[1])
+
+    @mock.patch('s3_sync.migrator.create_provider')
+    def test_sharded_listing(self, create_provider_mock):
+        provider = create_provider_mock.return_value
+        self.migrator.listing_shards = 2
+        self.migrator.work_chunk = 2
+        self.migrator.selector.is_primary = lambda *args: True
+        keys = ['a1', 'a2', 'a3', 'b1', 'b2', 'b3']
+        self._make_fake_listing(provider, keys)
+        self.migrator.status.get_migration.return_value = {}
+
+        def fake_internal_iterator(*args, **kwargs):
+            yield None
+
+        self.migrator._iterate_internal_listing = fake_internal_iterator
+        migrated = []
+        self.migrator._migrate_object = \
+            lambda bucket, container, key, ts: migrated.append(key)
+
+        self.migrator.next_pass()
+
+        # Each shard processed a work chunk of keys from its own marker. The
+        # boundary key belongs to the first shard.
+        self.assertEqual(['a1', 'a2', 'b2', 'b3'], sorted(migrated))
+        shards = [{'start': '', 'end': 'b1', 'marker': 'a2'},
+                  {'start': 'b1', 'end': None, 'marker': 'b3'}]
+        self.migrator.status.save_migration.assert_called_once_with(
+            self.migrator.config, 'a2', 0, 4, 0, True, shards=shards)
+
+        # Resume from the saved shard markers
+        del migrated[:]
+        self.migrator.status.reset_mock()
+        self.migrator.status.get_migration.return_value = {
+            'marker': 'a2', 'shards': shards, 'finished': 1,
+            'scanned_count': 4}
+        self.migrator.next_pass()
+        self.assertEqual(['a3', 'b1'], sorted(migrated))
+        shards = [{'start': '', 'end': 'b1', 'marker': 'b1'},
+                  {'start': 'b1', 'end': None, 'marker': 'b3',
+                   'done': True}]
+        self.migrator.status.save_migration.assert_called_once_with(
+            self.migrator.config, 'b1', 0, 2, 0, False, shards=shards)
+
+        # Once every shard is done, a new scan starts
+        del migrated[:]
+        shards[0]['done'] = True
+        self.migrator.status.reset_mock()
+        self.migrator.status.get_migration.return_value = {
+            'marker': 'b1', 'shards': shards, 'finished': 1,
+            'scanned_count': 100}
+        self.migrator.next_pass()
+        self.assertEqual(['a1', 'a2', 'b2', 'b3'], sorted(migrated))
+        self.assertTrue(
+            self.migrator.status.save_migration.call_args[0][5])
+
     @mock.patch('s3_sync.migrator.create_provider')
     def test_all_buckets_next_pass_fails(self, create_provider_mock):
         self.migrator.config['aws_bucket'] = '/*'
@@ -835,6 +1037,109 @@ class TestMigrator(unittest.TestCase):
              mock.call(marker=buckets[0]['name'], limit=10000, prefix=None,
                        delimiter=None)])
 
+    @mock.patch('s3_sync.migrator.create_provider')
+    def test_migrate_containers_concurrently(self, create_provider_mock):
+        provider_mock = mock.Mock()
+        buckets = [{'name': 'bucket%d' % i, 'content_location': 'other'}
+                   for i in range(3)]
+        provider_mock.list_buckets.side_effect = [
+            ProviderResponse(True, 200, [], buckets),
+            ProviderResponse(True, 200, [], [])]
+        provider_mock.list_objects.return_value = ProviderResponse(
+            True, 200, {}, [{'name': 'obj', 'hash': 'deadbeef',
+                             'last_modified': create_list_timestamp(1.5e9),
+                             'bytes': '1337'}])
+        provider_mock.get_object.return_value = ProviderResponse(
+            True, 200, {'last-modified': create_timestamp(1.5e9),
+                        'etag': 'deadbeef',
+                        'Content-Length': '1337'},
+            StringIO(''))
+        create_provider_mock.return_value = provider_mock
+        self.migrator.config = {
+            'account': 'AUTH_dev',
+            'aws_bucket': '/*',
+        }
+        self.migrator.container_workers = 2
+        self.migrator.container_pool = eventlet.GreenPool(2)
+        swift_201_resp = mock.Mock()
+        swift_201_resp.status_int = 201
+        swift_201_resp.success = True
+        self.swift_client.make_request.return_value = swift_201_resp
+        temp_dir = mkdtemp()
+        self.addCleanup(lambda: shutil.rmtree(temp_dir))
+        status_file = os.path.join(temp_dir, 'migrator.status')
+        self.migrator.status = s3_sync.migrator.Status(status_file)
+        with mock.patch('time.time', return_value=100.0):
+            handled_containers = self.migrator.next_pass()
+
+        self.assertEqual(
+            [{'aws_bucket': bucket['name'],
+              'account': 'AUTH_dev',
+              'container': bucket['name'],
+              'all_buckets': True} for bucket in buckets],
+            handled_containers)
+        # The account-level migrator is left untouched
+        self.assertEqual('/*', self.migrator.config['aws_bucket'])
+        self.assertEqual(
+            ['Copied "bucket%d/obj"' % i for i in range(3)],
+            sorted(self.stream.getvalue().splitlines()))
+        # every container gets its own provider and stats prefix
+        self.assertEqual(4, create_provider_mock.call_count)
+        self.assertEqual(
+            ['bucket0', 'bucket1', 'bucket2'],
+            sorted(call[0][0]['aws_bucket']
+                   for call in create_provider_mock.call_args_list[1:]))
+        # the remote connections are split between the containers
+        self.assertEqual(
+            [11, 5, 5, 5],
+            [call[0][1] for call in create_provider_mock.call_args_list])
+        self.assertEqual(
+            ['S3.AUTH_dev.bucket%d.bucket%d' % (i, i) for i in range(3)],
+            sorted(call[0][0] for call in
+                   self.stats_factory.instance.call_args_list[1:]))
+
+        status = s3_sync.migrator.Status(status_file)
+        status.load_status_list()
+        self.assertEqual(
+            [('bucket%d' % i, 'obj', 1) for i in range(3)],
+            sorted((entry['container'], entry['status']['marker'],
+                    entry['status']['moved_count'])
+                   for entry in status.status_list))
+
+    @mock.patch('s3_sync.migrator.create_provider')
+    def test_migrate_containers_concurrently_failure(
+            self, create_provider_mock):
+        buckets = [{'name': 'bucket%d' % i, 'content_location': 'other'}
+                   for i in range(3)]
+        create_provider_mock.return_value.list_buckets.side_effect = [
+            ProviderResponse(True, 200, [], buckets),
+            ProviderResponse(True, 200, [], [])]
+        self.migrator.config = {
+            'account': 'AUTH_dev',
+            'aws_bucket': '/*',
+        }
+        self.migrator.container_workers = 2
+        self.migrator.container_pool = eventlet.GreenPool(2)
+        self.migrator._iterate_internal_listing = mock.Mock(
+            return_value=iter([None]))
+        versioned_container = {'account': 'AUTH_dev',
+                               'aws_bucket': 'versions',
+                               'container': 'versions'}
+
+        def _next_pass(migrator):
+            if migrator.config['aws_bucket'] == 'bucket0':
+                migrator.handled_containers.append(versioned_container)
+            if migrator.config['aws_bucket'] == 'bucket1':
+                raise RuntimeError('failed')
+
+        with mock.patch.object(s3_sync.migrator.Migrator, '_next_pass',
+                               autospec=True, side_effect=_next_pass):
+            self.assertIsNone(self.migrator.next_pass())
+        self.assertEqual(['bucket1'], self.migrator.failed_containers)
+        self.assertIn(versioned_container, self.migrator.handled_containers)
+        self.assertIn('Failed to migrate "AUTH_dev/bucket1"',
+                      self.get_log_lines())
+
     @mock.patch('s3_sync.migrator.create_provider')
     def test_list_buckets_error(self, create_provider_mock):
         create_provider_mock.return_value.list_buckets.return_value = \
@@ -1391,6 +1696,84 @@ class TestMigrator(unittest.TestCase):
                 '%08d' % (i + 1)))
             self.assertEqual(expected_name, manifest[i]['name'])
 
+    @mock.patch('s3_sync.migrator.create_provider')
+    def test_migrate_big_object_ranged(self, create_provider_mock):
+        provider = create_provider_mock.return_value
+        self.migrator.status.get_migration.return_value = {}
+        self.migrator.segment_workers = 4
+        self.migrator.segment_size = 1000
+
+        key = 'bar'
+        size = 3500
+        remote_headers = {
+            'x-object-meta-custom': 'custom',
+            'last-modified': create_timestamp(1.4e9),
+            'etag': 'ba3',
+            'Content-Length': str(size)}
+        list_time = create_list_timestamp(1.4e9)
+        self.swift_client.container_exists.return_value = True
+        full_body = FakeStream(size)
+        ranged_bodies = {}
+
+        def get_object(name, **args):
+            if 'Range' not in args:
+                return ProviderResponse(True, 200, remote_headers, full_body)
+            self.assertEqual('ba3', args['IfMatch'])
+            start, end = map(int, args['Range'][len('bytes='):].split('-'))
+            headers = dict(remote_headers)
+            headers['Content-Length'] = str(end - start + 1)
+            ranged_bodies[start] = FakeStream(end - start + 1)
+            return ProviderResponse(
+                True, 206, headers, ranged_bodies[start])
+
+        provider.list_objects.return_value = ProviderResponse(
+            True, 200, {},
+            [{'name': key, 'last_modified': list_time,
+              'hash': 'ba3', 'bytes': size}])
+        provider.get_object.side_effect = get_object
+
+        def fake_internal_iterator(*args, **kwargs):
+            yield None
+
+        self.migrator._iterate_internal_listing = fake_internal_iterator
+        self.swift_client.make_request.return_value = mock.Mock(
+            status_int=201, headers={'etag': 'deadbeef'})
+        self.swift_client.make_path.side_effect =\
+            lambda *args: '/'.join(args)
+
+        with mock.patch('swift.common.constraints.MAX_FILE_SIZE', 2000):
+            self.migrator.next_pass()
+
+        self.assertTrue(full_body.closed)
+        self.assertEqual([0, 1000, 2000, 3000], sorted(ranged_bodies.keys()))
+        self.assertEqual(
+            sorted([mock.call(key, bucket='bucket', IfMatch='ba3',
+                              Range='bytes=%d-%d' % (start, end))
+                    for start, end in [(0, 999), (1000, 1999),
+                                       (2000, 2999), (3000, 3499)]]),
+            sorted(provider.get_object.mock_calls[1:]))
+        segment_prefix = '/'.join((
+            key, '1400000000.00000', str(size), '1000'))
+        manifest_call = self.swift_client.make_request.mock_calls[-1]
+        self.assertEqual(
+            '%s/%s/%s' % (self.migrator.config['account'],
+                          self.migrator.config['container'], key),
+            manifest_call[1][1])
+        self.assertEqual(
+            [{'name': '/%s_segments/%s/%08d' % (
+                self.migrator.config['container'], segment_prefix, i + 1),
+              'bytes': segment_size,
+              'hash': 'deadbeef'}
+             for i, segment_size in enumerate([1000, 1000, 1000, 500])],
+            json.loads(''.join(manifest_call[1][4])))
+        segment_calls = self.swift_client.make_request.mock_calls[:-1]
+        self.assertEqual(4, len(segment_calls))
+        for call in segment_calls:
+            self.assertEqual(
+                {'x-object-meta-custom': 'custom',
+                 'Content-Length': call[1][2]['Content-Length']},
+                call[1][2])
+
     @mock.patch('s3_sync.migrator.create_provider')
     def test_migrate_all_containers_next_pass(self, create_provider_mock):
         provider_mock = mock.Mock()
@@ -1438,8 +1821,9 @@ class TestMigrator(unittest.TestCase):
         self.assertEqual(['Copied "bucket1/obj"',
                           'Copied "bucket2/obj"'],
                          self.stream.getvalue().splitlines())
-        with open(status_file) as f:
-            status = json.load(f)
+        status = s3_sync.migrator.Status(status_file)
+        status.load_status_list()
+        status = status.status_list
         self.assertEqual(status, [{
             'status': {
                 'marker': 'obj',
@@ -1472,8 +1856,9 @@ class TestMigrator(unittest.TestCase):
         }
         with mock.patch('time.time', return_value=100.0):
             self.migrator.next_pass()
-        with open(status_file) as f:
-            status = json.load(f)
+        status = s3_sync.migrator.Status(status_file)
+        status.load_status_list()
+        status = status.status_list
         self.assertEqual(status, [{
             'status': {
                 'marker': 'obj',
@@ -2290,6 +2675,145 @@ class TestMigrator(unittest.TestCase):
             segment_name, {})
         self.assertTrue(full_mpu.closed)
 
+    @mock.patch('s3_sync.migrator.create_provider')
+    def test_migrate_mpu_concurrent_parts(self, create_provider_mock):
+        provider = create_provider_mock.return_value
+        self.migrator.status.get_migration.return_value = {}
+        self.migrator.segment_workers = 3
+
+        key = 'bar'
+        part_size = 1000
+        nparts = 5
+        segment_prefix = '/'.join((
+            key, '1400000000.00000', str(part_size * nparts), str(part_size)))
+        segment_paths = [
+            '%s/%s_segments/%s/%08d' % (
+                self.migrator.config['account'],
+                self.migrator.config['container'], segment_prefix, i + 1)
+            for i in range(nparts)]
+        segment_etags = [hashlib.md5(path).hexdigest()
+                         for path in segment_paths]
+        remote_etag = s3_sync.migrator.get_slo_etag(
+            [{'hash': etag} for etag in segment_etags])
+        remote_headers = {
+            'last-modified': create_timestamp(1.4e9),
+            'etag': remote_etag,
+            'Content-Length': str(part_size * nparts)}
+        list_time = create_list_timestamp(1.4e9)
+        self.swift_client.container_exists.return_value = True
+
+        full_mpu = FakeStream(part_size * nparts)
+        parts = [FakeStream(part_size) for _ in range(nparts)]
+
+        def get_object(name, **args):
+            if 'PartNumber' in args:
+                self.assertEqual(remote_etag, args['IfMatch'])
+                headers = dict(remote_headers)
+                headers['Content-Length'] = str(part_size)
+                return ProviderResponse(
+                    True, 200, headers, parts[args['PartNumber'] - 1])
+            return ProviderResponse(True, 200, remote_headers, full_mpu)
+
+        provider.list_objects.return_value = ProviderResponse(
+            True, 200, {},
+            [{'name': key, 'last_modified': list_time,
+              'hash': remote_etag, 'bytes': part_size * nparts}])
+        provider.get_object.side_effect = get_object
+
+        def fake_internal_iterator(*args, **kwargs):
+            yield None
+
+        def make_request(method, path, headers, codes, body):
+            if path in segment_paths:
+                etag = segment_etags[segment_paths.index(path)]
+            else:
+                etag = 'manifest-etag'
+            return mock.Mock(status_int=201, headers={'etag': etag})
+
+        self.migrator._iterate_internal_listing = fake_internal_iterator
+        self.swift_client.make_request.side_effect = make_request
+        self.swift_client.make_path.side_effect =\
+            lambda *args: '/'.join(args)
+
+        self.migrator.next_pass()
+
+        self.assertEqual([], [line for line in self.get_log_lines()
+                              if not line.startswith('Copied')])
+        put_paths = [call[1][1] for call in
+                     self.swift_client.make_request.mock_calls]
+        self.assertEqual(sorted(segment_paths), sorted(put_paths[:-1]))
+        manifest_call = self.swift_client.make_request.mock_calls[-1]
+        self.assertEqual(
+            '%s/%s/%s' % (self.migrator.config['account'],
+                          self.migrator.config['container'], key),
+            manifest_call[1][1])
+        self.assertEqual(
+            [{'name': '/%s_segments/%s/%08d' % (
+                self.migrator.config['container'], segment_prefix, i + 1),
+              'bytes': part_size,
+              'hash': segment_etags[i]} for i in range(nparts)],
+            json.loads(''.join(manifest_call[1][4])))
+        self.assertEqual(
+            'True', manifest_call[1][2]['X-Static-Large-Object'])
+        self.assertEqual([], self.swift_client.delete_object.mock_calls)
+        self.assertTrue(full_mpu.closed)
+
+    @mock.patch('s3_sync.migrator.create_provider')
+    def test_mpu_concurrent_part_get_error(self, create_provider_mock):
+        provider = create_provider_mock.return_value
+        self.migrator.status.get_migration.return_value = {}
+        self.migrator.segment_workers = 2
+
+        key = 'bar'
+        remote_headers = {
+            'last-modified': create_timestamp(1.4e9),
+            'etag': 'foo-4',
+            'Content-Length': '4000'}
+        list_time = create_list_timestamp(1.4e9)
+        self.swift_client.container_exists.return_value = True
+
+        def get_object(name, **args):
+            if 'PartNumber' in args:
+                if args['PartNumber'] == 3:
+                    return mock.Mock(
+                        success=False,
+                        status=500,
+                        reraise=mock.Mock(side_effect=RuntimeError('failed')))
+                headers = dict(remote_headers)
+                headers['Content-Length'] = '1000'
+                return ProviderResponse(True, 200, headers, FakeStream(1000))
+            return ProviderResponse(
+                True, 200, remote_headers, FakeStream(4000))
+
+        provider.list_objects.return_value = ProviderResponse(
+            True, 200, {},
+            [{'name': key, 'last_modified': list_time,
+              'hash': 'foo-4', 'bytes': 4000}])
+        provider.get_object.side_effect = get_object
+
+        def fake_internal_iterator(*args, **kwargs):
+            yield None
+
+        self.migrator._iterate_internal_listing = fake_internal_iterator
+        self.swift_client.make_request.return_value = mock.Mock(
+            status_int=201, headers={'etag': 'deadbeef'})
+        self.swift_client.make_path.side_effect =\
+            lambda *args: '/'.join(args)
+
+        self.migrator.next_pass()
+
+        self.assertEqual(
+            'Failed to migrate "bucket"/"bar": failed',
+            [line for line in self.get_log_lines()
+             if not line.startswith('Copied')][0])
+        put_segments = [call[1][1].split('/', 2)[2] for call in
+                        self.swift_client.make_request.mock_calls]
+        self.assertNotIn(key, put_segments)
+        self.assertEqual(
+            sorted(put_segments),
+            sorted(call[1][2] for call in
+                   self.swift_client.delete_object.mock_calls))
+
     @mock.patch('s3_sync.migrator.create_provider')
     def test_etag_mismatch(self, create_provider_mock):
         self.migrator.config['protocol'] = 'swift'
@@ -2445,11 +2969,750 @@ class TestMigrator(unittest.TestCase):
                 mock.call(self.migrator.config['account'], 'foo', 'bar',
                           headers=hdrs))
 
+    def test_reconcile_migrated_objects(self):
+        account = self.migrator.config['account']
+        self.migrator.migrated_objects = s3_sync.migrator.MigratedObjects(10)
+        self.migrator.migrated_objects.add(
+            account, 'foo', 'bar', '1500000000.00000')
+        self.swift_client.delete_object.return_value = \
+            ProviderResponse(True, 204, {}, [])
+
+        self.migrator._reconcile_deleted_objects(
+            'foo', 'bar', '2017-07-14T02:40:00.000000')
+        self.swift_client.get_object_metadata.assert_not_called()
+        self.swift_client.delete_object.assert_called_once_with(
+            account, 'foo', 'bar',
+            headers={'x-timestamp': '1500000000.00000_0000000000000001'})
+        self.assertEqual(0, len(self.migrator.migrated_objects))
+
+        # an object that was overwritten since has to be checked
+        self.swift_client.delete_object.reset_mock()
+        self.swift_client.get_object_metadata.return_value = {}
+        self.migrator.migrated_objects.add(
+            account, 'foo', 'bar', '1500000000.00000')
+        self.migrator._reconcile_deleted_objects(
+            'foo', 'bar', '2017-07-14T02:40:01.000000')
+        self.swift_client.get_object_metadata.assert_called_once_with(
+            account, 'foo', 'bar')
+        self.swift_client.delete_object.assert_not_called()
+
+    def test_fingerprint(self):
+        self.migrator.config['container'] = 'bucket'
+        self.migrator.provider = mock.Mock()
+        self.migrator.provider.head_bucket.return_value = ProviderResponse(
+            True, 204, {'x-container-object-count': '10',
+                        'x-container-bytes-used': '100',
+                        'x-put-timestamp': '1500000000.00000'}, '')
+        self.swift_client.get_container_metadata.return_value = {
+            'x-container-object-count': '9',
+            'x-container-bytes-used': '90'}
+        # disabled by default
+        self.assertIsNone(self.migrator._get_fingerprint())
+
+        self.migrator.skip_unchanged = True
+        self.assertIsNone(self.migrator._get_fingerprint())
+        self.migrator.config['protocol'] = 'swift'
+        self.assertIsNone(self.migrator._get_fingerprint())
+        self.migrator.provider.head_bucket.return_value.status = 200
+        self.assertEqual(['10', '100', '1500000000.00000', '9', '90'],
+                         self.migrator._get_fingerprint())
+        self.swift_client.get_container_metadata.assert_called_once_with(
+            'AUTH_test', 'bucket')
+        self.swift_client.get_container_metadata.return_value = {}
+        self.assertIsNone(self.migrator._get_fingerprint())
+
+    @mock.patch('s3_sync.migrator.time')
+    def test_skip_unchanged(self, mock_time):
+        mock_time.time.return_value = 1500000000
+        self.migrator.config['container'] = 'bucket'
+        self.migrator.max_skip_time = 3600
+        state = {'marker': 'foo', 'verified_fingerprint': ['1', '2'],
+                 'verified_time': 1500000000 - 60}
+        self.migrator.status.get_migration.return_value = state
+
+        with mock.patch.object(self.migrator, '_get_fingerprint',
+                               return_value=['1', '2']), \
+                mock.patch.object(self.migrator,
+                                  '_process_account_metadata'), \
+                mock.patch.object(self.migrator,
+                                  '_process_container') as mock_process:
+            self.migrator._next_pass()
+            mock_process.assert_not_called()
+            self.migrator.status.save_migration.assert_called_once_with(
+                self.migrator.config, 'foo', 0, 0, 0, shards=None)
+
+            # the containers are scanned once the verification expires
+            self.migrator.status.save_migration.reset_mock()
+            mock_time.time.return_value = 1500000000 + 3600
+            mock_process.return_value = 'bar'
+            self.migrator._next_pass()
+            self.assertEqual([mock.call(marker='foo'), mock.call(marker='')],
+                             mock_process.mock_calls)
+            self.migrator.status.save_migration.assert_called_once_with(
+                self.migrator.config, 'bar', 0, 0, 0, True,
+                extra_status={'scan_fingerprint': ['1', '2'],
+                              'scan_failed': False})
+
+    @mock.patch('s3_sync.migrator.time')
+    def test_scan_state(self, mock_time):
+        mock_time.time.return_value = 1500000000
+        get_scan_state = s3_sync.migrator.Migrator._get_scan_state
+        # a new scan starts
+        self.assertEqual(
+            {'scan_fingerprint': ['1'], 'scan_failed': False},
+            get_scan_state({}, ['1'], True, False))
+        # errors during the scan prevent the verification
+        self.assertEqual(
+            {'scan_failed': True},
+            get_scan_state({'scan_failed': False}, ['1'], False, True))
+        self.assertEqual(
+            {'scan_failed': True},
+            get_scan_state({'scan_failed': True}, ['1'], False, False))
+        self.assertEqual(
+            {'scan_fingerprint': ['1'], 'scan_failed': False},
+            get_scan_state({'scan_fingerprint': ['1'], 'scan_failed': True},
+                           ['1'], True, False))
+        # the containers changed during the scan
+        self.assertEqual(
+            {'scan_fingerprint': ['2'], 'scan_failed': False},
+            get_scan_state({'scan_fingerprint': ['1'], 'scan_failed': False},
+                           ['2'], True, False))
+        self.assertEqual(
+            {'scan_fingerprint': ['1'], 'scan_failed': False,
+             'verified_fingerprint': ['1'], 'verified_time': 1500000000},
+            get_scan_state({'scan_fingerprint': ['1'], 'scan_failed': False},
+                           ['1'], True, False))
+
+    def test_process_events(self):
+        ObjectEvent = s3_sync.migrator.ObjectEvent
+        self.migrator.config['container'] = 'bucket'
+        self.migrator.selector.is_primary = \
+            lambda account, container, key: not key.startswith('other')
+        self.migrator.provider = mock.Mock()
+        events = OrderedDict()
+        for key, removed in [('new', False), ('copied', False),
+                             ('gone', True), ('recreated', True),
+                             ('failed', False), ('other', False),
+                             ('other-gone', True)]:
+            events[key] = ObjectEvent(
+                key, removed, 10, '2019-01-01T00:00:00.000')
+        src_headers = {'etag': 'deadbeef',
+                       'last-modified': 'Tue, 01 Jan 2019 00:00:00 GMT'}
+
+        def _get_object_metadata(account, container, key):
+            if key == 'copied':
+                return src_headers
+            if key == 'failed':
+                raise UnexpectedResponse('', mock.Mock(status_int=500))
+            raise UnexpectedResponse('', mock.Mock(status_int=404))
+
+        def _head_object(key, bucket):
+            if key == 'gone':
+                return ProviderResponse(False, 404, {}, '')
+            return ProviderResponse(True, 200, src_headers, '')
+
+        self.swift_client.get_object_metadata.side_effect = \
+            _get_object_metadata
+        self.migrator.provider.head_object.side_effect = _head_object
+        self.migrator.config['protocol'] = 'swift'
+        self.migrator._process_events(events)
+        # the events are checked by the workers; only the primary node
+        # reconciles the removed objects
+        self.assertEqual(
+            ['new', 'copied', 'gone', 'recreated', 'failed', 'other'],
+            [entry[-1].key for entry in self.migrator.primary_queue.queue])
+
+        self.migrator.primary_queue.put(None)
+        self.migrator.stats = mock.Mock()
+        with mock.patch.object(self.migrator,
+                               '_queue_deleted_object') as mock_delete, \
+                mock.patch.object(self.migrator,
+                                  '_migrate_object') as mock_migrate:
+            self.migrator._upload_worker()
+        mock_delete.assert_called_once_with('bucket', {'name': 'gone'})
+        mock_migrate.assert_called_once_with('bucket', 'bucket', 'new')
+        # the other nodes verify the objects they are not primary for
+        self.assertEqual(
+            [s3_sync.migrator.MigrateObjectWork(
+                'bucket', 'bucket', 'other', 0, 10)],
+            list(self.migrator.verify_queue.drain()))
+        # errors fail the pass, like any object errors
+        container, key, _ = self.migrator.errors.get()
+        self.assertEqual(('bucket', 'failed'), (container, key))
+        self.assertTrue(self.migrator.errors.empty())
+
+    @mock.patch('s3_sync.migrator.time')
+    def test_full_scan_interval(self, mock_time):
+        mock_time.time.return_value = 1500000000
+        self.migrator.config['container'] = 'bucket'
+        self.migrator.events = {}
+        self.migrator.full_scan_interval = 3600
+        state = {'marker': 'foo', 'scan_started': 1500000000 - 60}
+        self.migrator.status.get_migration.return_value = state
+
+        with mock.patch.object(self.migrator,
+                               '_process_account_metadata'), \
+                mock.patch.object(self.migrator,
+                                  '_process_container') as mock_process:
+            mock_process.return_value = 'foo'
+            # the scan completed, but the next one is not due yet
+            self.migrator._next_pass()
+            mock_process.assert_called_once_with(marker='foo')
+            self.migrator.status.save_migration.assert_called_once_with(
+                self.migrator.config, 'foo', 0, 0, 0, False)
+
+            mock_process.reset_mock()
+            self.migrator.status.save_migration.reset_mock()
+            mock_time.time.return_value = 1500000000 + 3600
+            self.migrator._next_pass()
+            self.assertEqual([mock.call(marker='foo'), mock.call(marker='')],
+                             mock_process.mock_calls)
+            self.migrator.status.save_migration.assert_called_once_with(
+                self.migrator.config, 'foo', 0, 0, 0, True,
+                extra_status={'scan_started': 1500000000 + 3600})
+
+    def test_same_cluster_account(self):
+        self.migrator.provider = mock.Mock()
+        self.migrator.provider.head_account.return_value = ProviderResponse(
+            True, 204, {'x-timestamp': '1500000000.00000',
+                        'x-put-timestamp': '1500000000.00000'}, '')
+        self.swift_client.get_account_metadata.return_value = {
+            'x-timestamp': '1500000000.00000',
+            'x-put-timestamp': '1500000000.00000'}
+        self.migrator.config.update({'protocol': 'swift',
+                                     'remote_account': 'AUTH_source'})
+        self.assertIsNone(self.migrator._get_same_cluster_account())
+
+        self.migrator.config['server_side_copy'] = True
+        self.assertEqual('AUTH_source',
+                         self.migrator._get_same_cluster_account())
+        self.swift_client.get_account_metadata.assert_called_once_with(
+            'AUTH_source')
+
+        self.swift_client.get_account_metadata.return_value = {
+            'x-timestamp': '1500000001.00000',
+            'x-put-timestamp': '1500000000.00000'}
+        self.assertIsNone(self.migrator._get_same_cluster_account())
+        self.swift_client.get_account_metadata.side_effect = \
+            UnexpectedResponse('', mock.Mock(status_int=404))
+        self.assertIsNone(self.migrator._get_same_cluster_account())
+
+    def test_copy_object(self):
+        self.migrator.config['protocol'] = 'swift'
+        self.migrator.source_account = 'AUTH_source'
+        self.migrator.provider = mock.Mock()
+        self.migrator.gthread_local.uploaded_objects = 0
+        self.migrator.gthread_local.bytes_copied = 0
+        headers = {'Content-Length': '10', 'etag': 'deadbeef',
+                   'last-modified': 'Fri, 14 Jul 2017 02:40:00 GMT',
+                   'x-object-meta-foo': 'bar'}
+        self.migrator.provider.head_object.return_value = ProviderResponse(
+            True, 200, headers, '')
+        self.swift_client.make_path.return_value = '/v1/AUTH_source/foo/k%C3'
+
+        self.migrator._migrate_object('foo', 'bar', u'k\xe9y')
+        self.migrator.provider.head_object.assert_called_once_with(
+            u'k\xe9y', bucket='foo', query_string='multipart-manifest=get')
+        self.migrator.provider.get_object.assert_not_called()
+        self.swift_client.make_path.assert_called_once_with(
+            'AUTH_source', 'foo', u'k\xe9y')
+        self.swift_client.make_request.assert_called_once_with(
+            'COPY', '/v1/AUTH_source/foo/k%C3', {
+                'etag': 'deadbeef',
+                'x-object-meta-foo': 'bar',
+                'x-timestamp': '1500000000.00000',
+                s3_sync.utils.get_sys_migrator_header('object'):
+                    '1500000000.00000',
+                'Destination': 'bar/k%C3%A9y',
+                'Destination-Account': 'AUTH_test'}, (2,))
+        # the COPY request has no body
+        copy_headers = self.swift_client.make_request.call_args[0][2]
+        self.assertNotIn('content-length',
+                         [header.lower() for header in copy_headers])
+        self.assertEqual(1, self.migrator.gthread_local.uploaded_objects)
+        self.assertEqual(10, self.migrator.gthread_local.bytes_copied)
+
+        # large objects are not copied server-side
+        self.swift_client.make_request.reset_mock()
+        headers['x-static-large-object'] = 'True'
+        self.assertFalse(self.migrator._copy_object('foo', 'bar', 'key'))
+        self.swift_client.make_request.assert_not_called()
+        del headers['x-static-large-object']
+
+        # neither are any objects, if the copy middleware is missing
+        self.swift_client.make_request.side_effect = UnexpectedResponse(
+            '', mock.Mock(status_int=405))
+        self.assertFalse(self.migrator._copy_object('foo', 'bar', 'key'))
+        self.assertIsNone(self.migrator.source_account)
+        self.assertIn('Server-side copy is not supported',
+                      self.get_log_lines()[-1])
+
+    def test_delete_workers(self):
+        internal_header = s3_sync.utils.get_sys_migrator_header('object')
+        self.swift_client.get_object_metadata.return_value = {
+            'x-timestamp': '1500000000.00000',
+            internal_header: '1500000000.00000'}
+        swift_500_resp = mock.Mock(status_int=500)
+
+        def _delete_object(account, container, key, headers):
+            if key == 'fail':
+                raise UnexpectedResponse('', swift_500_resp)
+
+        self.swift_client.delete_object.side_effect = _delete_object
+        self.migrator.reconcile_workers = 2
+        for key in ('bar', 'baz', 'fail'):
+            self.migrator._queue_deleted_object('foo', {'name': key})
+        self.assertIsNotNone(self.migrator.delete_pool)
+        self.assertEqual(1, self.migrator._stop_delete_workers())
+        self.assertIsNone(self.migrator.delete_pool)
+
+        self.assertEqual(3, self.swift_client.delete_object.call_count)
+        self.assertEqual(
+            [mock.call('deleted_objects', 1)] * 2 +
+            [mock.call('delete_errors', 1)],
+            self.migrator.stats_reporter.increment.mock_calls)
+        # the failures are reported like any other object errors
+        container, key, _, action = self.migrator.errors.get()
+        self.assertEqual(('foo', 'fail', 'remove'), (container, key, action))
+        self.assertTrue(self.migrator.errors.empty())
+        self.migrator.errors.put((container, key, 'error', action))
+        self.migrator.check_errors()
+        self.assertEqual('Failed to remove "foo/fail": error',
+                         self.get_log_lines()[-1])
+        self.assertEqual(0, self.migrator._stop_delete_workers())
+
+    def test_delete_internal_container_failed_deletions(self):
+        states = s3_sync.utils.MigrationContainerStates
+        internal_header = s3_sync.utils.get_sys_migrator_header('object')
+        container_header = s3_sync.utils.get_sys_migrator_header('container')
+        self.swift_client.get_container_metadata.return_value = {
+            container_header: states.MIGRATING}
+        self.swift_client.get_object_metadata.return_value = {
+            'x-timestamp': '1500000000.00000',
+            internal_header: '1500000000.00000'}
+        self.swift_client.delete_object.side_effect = UnexpectedResponse(
+            '', mock.Mock(status_int=500))
+        self.migrator._iterate_internal_listing = mock.Mock(
+            return_value=iter([{'name': 'obj'}, None]))
+
+        self.migrator._maybe_delete_internal_container('foo')
+        self.swift_client.delete_object.assert_called_once_with(
+            'AUTH_test', 'foo', 'obj', headers=mock.ANY)
+        # the container is neither removed, nor marked as removed
+        self.swift_client.delete_container.assert_not_called()
+        self.swift_client.set_container_metadata.assert_not_called()
+        self.assertTrue(self.migrator.errors.empty())
+        self.assertIn('Failed to remove "foo"/"obj"', self.get_log_lines()[0])
+        self.assertEqual(
+            'Not removing container AUTH_test/foo: failed to remove 1 objects',
+            self.get_log_lines()[-1])
+
+    @mock.patch('s3_sync.migrator.create_provider')
+    def test_reconcile_segments_container(self, create_provider_mock):
+        states = s3_sync.utils.MigrationContainerStates
+        container_header = s3_sync.utils.get_sys_migrator_header('container')
+        timestamp = '1500000000.00000'
+        self.migrator.migrated_objects = s3_sync.migrator.MigratedObjects(10)
+        self.migrator.gthread_local.uploaded_objects = 0
+        self.migrator.gthread_local.bytes_copied = 0
+        self.swift_client.make_request.return_value = mock.Mock(
+            status_int=201)
+        # the MPU segments are uploaded without the migrator header
+        self.migrator._upload_object(s3_sync.migrator.UploadObjectWork(
+            'bucket_segments', 'seg1', StringIO(''),
+            {'x-timestamp': timestamp, 'Content-Length': '0'}, 'bucket'))
+        self.assertEqual(0, len(self.migrator.migrated_objects))
+
+        create_provider_mock.return_value.list_buckets.side_effect = [
+            ProviderResponse(True, 200, [], [
+                {'name': 'bucket', 'content_location': 'other'}]),
+            ProviderResponse(True, 200, [], [])]
+
+        def _iterate_internal_listing(container=None):
+            if container is None:
+                return iter([{'name': 'bucket'}, {'name': 'bucket_segments'},
+                             None])
+            return iter([{'name': 'seg1',
+                          'last_modified': Timestamp(timestamp).isoformat},
+                         None])
+
+        self.migrator._iterate_internal_listing = _iterate_internal_listing
+        self.migrator._next_pass = mock.Mock()
+        self.swift_client.get_container_metadata.return_value = {
+            container_header: states.MIGRATING}
+        self.swift_client.get_object_metadata.return_value = {
+            'x-timestamp': timestamp}
+        self.migrator.config = {'account': 'AUTH_test', 'aws_bucket': '/*'}
+        self.migrator.next_pass()
+
+        # the segment is checked for the migrator header and kept
+        self.swift_client.get_object_metadata.assert_called_once_with(
+            'AUTH_test', 'bucket_segments', 'seg1')
+        self.swift_client.delete_object.assert_not_called()
+
+    def test_migrated_objects_index(self):
+        index = s3_sync.migrator.MigratedObjects(2)
+        index.add('a', 'c', 'o1', '1500000000.00000')
+        index.add('a', 'c', 'o2', '1500000001.00000')
+        index.add('a', 'c', 'o1', '1500000002.00000')
+        index.add('a', 'c', 'o3', '1500000003.00000')
+        self.assertEqual(2, len(index))
+        self.assertIsNone(index.pop('a', 'c', 'o2'))
+        self.assertEqual(Timestamp('1500000002.00000'),
+                         index.pop('a', 'c', 'o1'))
+
+        index = s3_sync.migrator.MigratedObjects(0)
+        index.add('a', 'c', 'o1', '1500000000.00000')
+        self.assertEqual(0, len(index))
+
     def test_stats_reporting_prefix(self):
         self.stats_factory.instance.assert_called_once_with(
             'S3.AUTH_test.bucket.bucket')
 
 
+class TestWorkQueue(unittest.TestCase):
+    def _drain(self, queue):
+        items = []
+        while not queue.empty():
+            work = queue.get()
+            items.append(work.key if work else work)
+            queue.task_done()
+        return items
+
+    def _fill(self, queue):
+        Work = s3_sync.migrator.MigrateObjectWork
+        queue.put(None)
+        queue.put(Work('b', 'c', 'b', 3.0, 10))
+        queue.put(Work('b', 'c', 'a', 1.0, 1000))
+        queue.put(s3_sync.migrator.UploadObjectWork(
+            'c', 'manifest', '', {}, 'b'))
+        queue.put(Work('b', 'c', 'c', 2.0, 100))
+        queue.put(Work('b', 'c', 'segment', 0, None))
+
+    def test_orders(self):
+        tests = [
+            ('fifo', [None, 'b', 'a', 'manifest', 'c', 'segment']),
+            ('small_first', ['manifest', 'segment', 'b', 'c', 'a', None]),
+            ('large_first', ['manifest', 'segment', 'a', 'c', 'b', None]),
+            ('oldest_first', ['manifest', 'segment', 'a', 'c', 'b', None]),
+            ('newest_first', ['manifest', 'segment', 'b', 'c', 'a', None]),
+            ('key', ['manifest', 'segment', 'a', 'b', 'c', None]),
+        ]
+        for order, expected in tests:
+            queue = s3_sync.migrator.WorkQueue(order=order)
+            self._fill(queue)
+            self.assertEqual(expected, self._drain(queue))
+            queue.join()
+
+    def test_invalid_order(self):
+        with self.assertRaises(ValueError):
+            s3_sync.migrator.WorkQueue(order='random')
+
+    def test_bounded(self):
+        queue = s3_sync.migrator.WorkQueue(1, order='small_first')
+        queue.put(s3_sync.migrator.MigrateObjectWork('b', 'c', 'a', 0, 1))
+        with self.assertRaises(eventlet.queue.Full):
+            queue.put(s3_sync.migrator.MigrateObjectWork('b', 'c', 'b', 0, 1),
+                      block=False)
+
+
+class TestWorkSpool(unittest.TestCase):
+    def setUp(self):
+        self.spool_dir = mkdtemp()
+        self.addCleanup(lambda: shutil.rmtree(self.spool_dir))
+
+    def test_spools_to_disk(self):
+        spool = s3_sync.migrator.WorkSpool(2, self.spool_dir)
+        work = [s3_sync.migrator.MigrateObjectWork(
+            'bucket', 'container', u'k\u00e9y%d' % i, 1.5e9 + i, i)
+            for i in range(5)]
+        for entry in work:
+            spool.put(entry)
+        self.assertIsNotNone(spool._file)
+        self.assertEqual(5, len(spool))
+        self.assertEqual(2, len(spool._memory))
+        self.assertEqual(work, list(spool.drain()))
+        self.assertEqual(0, len(spool))
+        self.assertIsNone(spool._file)
+        self.assertEqual([], list(spool.drain()))
+
+    def test_in_memory(self):
+        spool = s3_sync.migrator.WorkSpool(10, self.spool_dir)
+        work = s3_sync.migrator.MigrateObjectWork('b', 'c', 'k', 0, None)
+        spool.put(work)
+        self.assertEqual([work], list(spool.drain()))
+        self.assertEqual([], os.listdir(self.spool_dir))
+
+    def test_close(self):
+        spool = s3_sync.migrator.WorkSpool(0, self.spool_dir)
+        spool.put(s3_sync.migrator.MigrateObjectWork('b', 'c', 'k', 0, None))
+        spool_file = spool._file
+        spool.close()
+        self.assertTrue(spool_file.closed)
+        self.assertEqual(0, len(spool))
+
+
+class TestEventLog(unittest.TestCase):
+    def setUp(self):
+        self.event_dir = mkdtemp()
+        self.addCleanup(lambda: shutil.rmtree(self.event_dir))
+        self.logger = mock.Mock()
+
+    @staticmethod
+    def _record(bucket, key, event='ObjectCreated:Put', size=10):
+        return {'eventName': event,
+                'eventTime': '2019-01-01T00:00:00.000Z',
+                's3': {'bucket': {'name': bucket},
+                       'object': {'key': key, 'size': size}}}
+
+    def test_read(self):
+        path = os.path.join(self.event_dir, 'events')
+        with open(path, 'w') as fp:
+            fp.write(json.dumps({'Records': [
+                self._record('bucket', 'foo'),
+                self._record('bucket', 'caf%C3%A9+bar'),
+                self._record('other', 'foo', 'ObjectRemoved:Delete')]}))
+            fp.write('\n')
+            fp.write(json.dumps({'Event': 's3:TestEvent'}) + '\n')
+            fp.write('not json\n')
+            fp.write(json.dumps(self._record(
+                'bucket', 'foo', 'ObjectRemoved:Delete')) + '\n')
+            # incomplete line
+            fp.write(json.dumps(self._record('bucket', 'baz')))
+
+        event_log = s3_sync.migrator.EventLog(self.event_dir, self.logger)
+        events = event_log.read()
+        self.assertEqual(['bucket', 'other'], sorted(events.keys()))
+        ObjectEvent = s3_sync.migrator.ObjectEvent
+        self.assertEqual(
+            [ObjectEvent(u'caf\xe9 bar', False, 10, '2019-01-01T00:00:00.000'),
+             ObjectEvent(u'foo', True, 10, '2019-01-01T00:00:00.000')],
+            events['bucket'].values())
+        self.assertEqual(
+            [ObjectEvent(u'foo', True, 10, '2019-01-01T00:00:00.000')],
+            events['other'].values())
+        self.logger.warning.assert_called_once_with(
+            'Invalid event notification: not json\n')
+
+        with open(path, 'a') as fp:
+            fp.write('\n')
+        self.assertEqual(
+            {'bucket': {u'baz': ObjectEvent(
+                u'baz', False, 10, '2019-01-01T00:00:00.000')}},
+            event_log.read())
+        self.assertEqual({}, event_log.read())
+
+        # files that are truncated are read from the start
+        with open(path, 'w') as fp:
+            fp.write(json.dumps(self._record('bucket', 'foo')) + '\n')
+        self.assertEqual(['foo'], event_log.read()['bucket'].keys())
+
+    def test_event_time(self):
+        path = os.path.join(self.event_dir, 'events')
+        records = [self._record('bucket', key) for key in ('foo', 'bar')]
+        # some S3-compatible stores leave out the milliseconds
+        records[1]['eventTime'] = '2019-01-01T00:00:01Z'
+        invalid = self._record('bucket', 'baz')
+        invalid['eventTime'] = 'yesterday'
+        with open(path, 'w') as fp:
+            for record in records + [invalid]:
+                fp.write(json.dumps(record) + '\n')
+
+        event_log = s3_sync.migrator.EventLog(self.event_dir, self.logger)
+        events = event_log.read()
+        self.assertEqual(
+            ['2019-01-01T00:00:00.000', '2019-01-01T00:00:01.000'],
+            [event.last_modified for event in events['bucket'].values()])
+        self.logger.warning.assert_called_once_with(
+            'Invalid event notification: %s\n' % json.dumps(invalid))
+
+    def test_missing_file(self):
+        event_log = s3_sync.migrator.EventLog(
+            os.path.join(self.event_dir, 'missing'), self.logger)
+        self.assertEqual({}, event_log.read())
+
+
+class TestSelector(unittest.TestCase):
+    def setUp(self):
+        for patcher in (
+                mock.patch('swift.common.ring.ring.validate_configuration'),
+                mock.patch.multiple('swift.common.utils',
+                                    HASH_PATH_PREFIX='prefix',
+                                    HASH_PATH_SUFFIX='suffix')):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        ring_dir = mkdtemp()
+        self.addCleanup(lambda: shutil.rmtree(ring_dir))
+        builder = RingBuilder(6, 3, 1)
+        for i in range(4):
+            builder.add_dev({'id': i, 'region': 1, 'zone': i,
+                             'ip': '10.0.0.%d' % i, 'port': 6001,
+                             'device': 'sda', 'weight': 1})
+        builder.rebalance()
+        ring_path = os.path.join(ring_dir, 'container.ring.gz')
+        builder.get_ring().save(ring_path)
+        self.ring = Ring(ring_path)
+
+    def test_same_as_ring(self):
+        account = u'AUTH_\u062a'
+        for ip in ('10.0.0.0', '10.0.0.3'):
+            selector = s3_sync.migrator.Selector([ip], self.ring)
+            for i in range(20):
+                container = u'container\u062a%d' % i
+                nodes = self.ring.get_nodes(
+                    account.encode('utf-8'), container.encode('utf-8'))[1]
+                self.assertEqual(
+                    ip in [node['ip'] for node in nodes],
+                    selector.is_local_container(account, container))
+                for j in range(20):
+                    obj = u'obj\u062a%d' % j
+                    nodes = self.ring.get_nodes(
+                        account.encode('utf-8'), container.encode('utf-8'),
+                        obj.encode('utf-8'))[1]
+                    self.assertEqual(
+                        ip == nodes[0]['ip'],
+                        selector.is_primary(account, container, obj))
+
+    def test_caches_lookups(self):
+        selector = s3_sync.migrator.Selector(['10.0.0.0'], self.ring)
+        with mock.patch.object(self.ring, 'get_nodes',
+                               wraps=self.ring.get_nodes) as mock_get_nodes:
+            self.assertEqual(
+                selector.is_local_container(u'AUTH_a', u'c'),
+                selector.is_local_container(u'AUTH_a', u'c'))
+            self.assertEqual(1, mock_get_nodes.call_count)
+            for i in range(1000):
+                selector.is_primary(u'AUTH_a', u'c', u'o%d' % i)
+            self.assertEqual(1, mock_get_nodes.call_count)
+        self.assertLessEqual(len(selector._primary_parts),
+                             self.ring.partition_count)
+
+        # a new version of the ring drops the cached lookups
+        self.ring._devs = list(self.ring._devs)
+        selector.is_local_container(u'AUTH_a', u'c')
+        self.assertEqual({}, selector._primary_parts)
+
+    def test_process_partitions(self):
+        myips = ['10.0.0.%d' % i for i in range(4)]
+        selectors = [s3_sync.migrator.Selector(myips, self.ring, i, 3)
+                     for i in range(3)]
+        for i in range(10):
+            container = u'c%d' % i
+            part = self.ring.get_part('AUTH_a', container)
+            owners = [index for index, selector in enumerate(selectors)
+                      if selector.is_local_container(u'AUTH_a', container)]
+            self.assertEqual([part % 3], owners)
+            owners = [index for index, selector in enumerate(selectors)
+                      if selector.is_process_container(u'AUTH_a', container)]
+            self.assertEqual([part % 3], owners)
+
+    def test_single_process(self):
+        selector = s3_sync.migrator.Selector(['10.0.0.0'], self.ring)
+        self.assertTrue(selector.is_process_container(u'AUTH_a', u'c1'))
+        selector = s3_sync.migrator.Selector(['10.1.0.0'], self.ring)
+        self.assertFalse(selector.is_local_container(u'AUTH_a', u'c1'))
+
+
+class TestWorkerAutoscaler(unittest.TestCase):
+    def _run(self, autoscaler, items, elapsed=1.0, nbytes=100, errors=0):
+        for i in range(items):
+            autoscaler.acquire()
+            autoscaler.start()
+        for i in range(items):
+            autoscaler.finish(elapsed, nbytes, i < errors)
+            autoscaler.release()
+
+    @mock.patch('s3_sync.migrator.time')
+    def test_additive_increase(self, mock_time):
+        mock_time.time.return_value = 0
+        autoscaler = s3_sync.migrator.WorkerAutoscaler(2, 4)
+        self.assertTrue(autoscaler.enabled)
+        self.assertEqual(2, autoscaler.limit)
+
+        # idle workers do not change the limit
+        self._run(autoscaler, 1)
+        autoscaler.adjust(10)
+        self.assertEqual(2, autoscaler.limit)
+
+        for now in (20, 30, 40):
+            self._run(autoscaler, autoscaler.limit)
+            autoscaler.adjust(now)
+        self.assertEqual(4, autoscaler.limit)
+        self.assertEqual(4, autoscaler.gauges['workers.limit'])
+        self.assertEqual(0, autoscaler.gauges['workers.error_rate'])
+
+        # no work in the interval
+        autoscaler.adjust(50)
+        self.assertEqual(4, autoscaler.limit)
+
+    @mock.patch('s3_sync.migrator.time')
+    def test_multiplicative_decrease(self, mock_time):
+        mock_time.time.return_value = 0
+        autoscaler = s3_sync.migrator.WorkerAutoscaler(1, 16)
+        autoscaler._set_limit(16)
+
+        self._run(autoscaler, 16, errors=1)
+        autoscaler.adjust(10)
+        self.assertEqual(8, autoscaler.limit)
+        self.assertEqual(1 / 16.0, autoscaler.gauges['workers.error_rate'])
+
+        # throughput dropped and latency went up
+        self._run(autoscaler, 8, elapsed=2.0, nbytes=50)
+        autoscaler.adjust(20)
+        self.assertEqual(4, autoscaler.limit)
+
+        # slower, but latency is unchanged
+        self._run(autoscaler, 4, elapsed=2.0, nbytes=50)
+        autoscaler.adjust(30)
+        self.assertEqual(5, autoscaler.limit)
+
+        autoscaler._set_limit(0)
+        self.assertEqual(1, autoscaler.limit)
+
+    @mock.patch('s3_sync.migrator.time')
+    def test_shrink_busy_workers(self, mock_time):
+        mock_time.time.return_value = 0
+        autoscaler = s3_sync.migrator.WorkerAutoscaler(1, 4)
+        autoscaler._set_limit(4)
+        for _ in range(3):
+            autoscaler.acquire()
+        autoscaler._set_limit(1)
+        self.assertEqual(2, autoscaler._debt)
+        for _ in range(3):
+            autoscaler.release()
+        self.assertEqual(0, autoscaler._debt)
+        # a single slot is left
+        autoscaler.acquire()
+        self.assertFalse(autoscaler._slots.acquire(blocking=False))
+
+    def test_disabled(self):
+        autoscaler = s3_sync.migrator.WorkerAutoscaler(10, 10)
+        self.assertFalse(autoscaler.enabled)
+        self.assertEqual(10, autoscaler.limit)
+
+    def test_set_max_workers(self):
+        # without autoscaling, the limit follows the maximum
+        autoscaler = s3_sync.migrator.WorkerAutoscaler(10, 10)
+        autoscaler.set_max_workers(4)
+        self.assertEqual((4, 4, 4), (autoscaler.min_workers,
+                                     autoscaler.max_workers, autoscaler.limit))
+        autoscaler.set_max_workers(10)
+        self.assertEqual(10, autoscaler.limit)
+        self.assertFalse(autoscaler.enabled)
+
+        autoscaler = s3_sync.migrator.WorkerAutoscaler(4, 10)
+        autoscaler._set_limit(8)
+        autoscaler.set_max_workers(2)
+        self.assertEqual((2, 2, 2), (autoscaler.min_workers,
+                                     autoscaler.max_workers, autoscaler.limit))
+        # the autoscaling resumes from the configured minimum
+        autoscaler.set_max_workers(10)
+        self.assertTrue(autoscaler.enabled)
+        self.assertEqual(
+            (4, 10, 4),
+            (autoscaler.min_workers, autoscaler.max_workers, autoscaler.limit))
+
+
 class TestStatus(unittest.TestCase):
 
     def setUp(self):
@@ -2786,6 +4049,67 @@ class TestMain(unittest.TestCase):
                 'Finished cycle in 1.00s, sleeping for 29.00s.',
             ], self.pop_log_lines().splitlines())
 
+    @mock.patch('s3_sync.migrator.signal')
+    @mock.patch('s3_sync.migrator.os')
+    def test_run_processes(self, mock_os, mock_signal):
+        mock_os.fork.side_effect = [101, 102, 103]
+        mock_os.wait.side_effect = [(102, 0), (101, 0)]
+        target = mock.Mock()
+        s3_sync.migrator.run_processes(2, target, self.logger, True)
+        self.assertEqual(2, mock_os.fork.call_count)
+        # the target only runs in the child processes
+        target.assert_not_called()
+        self.assertEqual(2, mock_os.wait.call_count)
+
+        # processes that exit are restarted, unless running once
+        mock_os.fork.reset_mock()
+        mock_os.fork.side_effect = [101, 102, 103, 104]
+        mock_os.wait.side_effect = [(102, 256), (101, 0), (105, 0),
+                                    RuntimeError('stop')]
+        with self.patch('time') as mock_time, \
+                self.assertRaises(RuntimeError):
+            s3_sync.migrator.run_processes(2, target, self.logger, False)
+        self.assertEqual(4, mock_os.fork.call_count)
+        self.assertEqual(2, mock_time.sleep.call_count)
+        self.assertIn('Migrator process 1 (pid 102) exited with status 256',
+                      self.pop_log_lines())
+
+    @mock.patch('s3_sync.migrator.signal')
+    @mock.patch('s3_sync.migrator.os')
+    def test_run_processes_stop(self, mock_os, mock_signal):
+        mock_os.fork.side_effect = [101, 102]
+        mock_os.kill.side_effect = [OSError(), None]
+        handlers = {}
+
+        def _wait():
+            # the supervisor is stopped while waiting for the processes
+            handlers[mock_signal.SIGTERM](mock_signal.SIGTERM, None)
+
+        mock_os.wait.side_effect = _wait
+        mock_signal.signal.side_effect = \
+            lambda signum, handler: handlers.update({signum: handler})
+        with self.assertRaises(SystemExit) as cm:
+            s3_sync.migrator.run_processes(2, mock.Mock(), self.logger, True)
+        self.assertEqual(0, cm.exception.code)
+        self.assertEqual(
+            sorted([mock.call(101, mock_signal.SIGTERM),
+                    mock.call(102, mock_signal.SIGTERM)]),
+            sorted(mock_os.kill.mock_calls))
+
+    @mock.patch('s3_sync.migrator.signal')
+    @mock.patch('s3_sync.migrator.os')
+    def test_run_processes_child(self, mock_os, mock_signal):
+        mock_os.fork.return_value = 0
+        mock_os._exit.side_effect = SystemExit
+        target = mock.Mock(side_effect=[None, RuntimeError('failed')])
+        for status in (0, 1):
+            with self.assertRaises(SystemExit):
+                s3_sync.migrator.run_processes(2, target, self.logger, True)
+            mock_os._exit.assert_called_once_with(status)
+            mock_os._exit.reset_mock()
+        self.assertEqual([mock.call(0), mock.call(0)], target.mock_calls)
+        self.assertIn('Migrator process 0 failed', self.pop_log_lines())
+
     def test_conf_parsing(self):
         config = {
             'migrator_settings': {
@@ -2819,10 +4143,11 @@ class TestMain(unittest.TestCase):
                     'run',
                     new_callable=lambda: mock.Mock(side_effect=old_run))\
                 as mock_run,\
+                self.patch('run_processes') as mock_run_processes,\
                 self.patch('StatsReporterFactory') as mock_statsd_factory:
             fake_container_ring = mock.Mock()
             mock_ring.return_value = fake_container_ring
-            fake_container_ring.get_nodes.return_value = ('foo', [
+            fake_container_ring.get_nodes.return_value = (30, [
                 {'ip': 'a.b.c', 'port': 6100},
                 {'ip': 'b.c.a', 'port': 6100},
                 {'ip': 'b.c.d', 'port': 6100}])
@@ -2830,15 +4155,35 @@ class TestMain(unittest.TestCase):
             mock_setup_context.return_value = (
                 mock.Mock(log_level='warn', console=True, once=True),
                 config)
+            # run the first of the processes in place
+            mock_run_processes.side_effect = \
+                lambda processes, target, logger, once: target(0)
 
             s3_sync.migrator.main()
-            mock_status.assert_called_once_with('/test/status')
+            mock_run_processes.assert_called_once_with(
+                15, mock.ANY, mock.ANY, True)
+            mock_status.assert_called_once_with(
+                '/test/status.0', '/test/status')
             mock_migrator.assert_called_once_with(
                 config['migrations'][0], mock_status.return_value, 42, 1337,
-                mock.ANY, mock.ANY, mock.ANY, 100000000, mock.ANY)
+                mock.ANY, mock.ANY, mock.ANY, 100000000, mock.ANY,
+                segment_workers=1, listing_shards=1, listing_prefetch=1,
+                reconcile_workers=10, migrated_objects=mock.ANY,
+                min_workers=1337, autoscale_interval=10, container_workers=1,
+                queue_order='fifo', queue_size=None,
+                verify_queue_memory=10000, spool_dir=None,
+                skip_unchanged=False, max_skip_time=3600, events=None,
+                full_scan_interval=3600)
             mock_run.assert_called_once_with(
                 config['migrations'], mock_status.return_value, mock.ANY,
-                mock.ANY, 42, 1337, mock.ANY, 60, 100000000, mock.ANY, True)
+                mock.ANY, 42, 1337, mock.ANY, 60, 100000000, mock.ANY, True,
+                segment_workers=1, listing_shards=1, listing_prefetch=1,
+                reconcile_workers=10, migrated_objects=mock.ANY,
+                min_workers=1337, autoscale_interval=10, container_workers=1,
+                migration_workers=1, queue_order='fifo', queue_size=None,
+                verify_queue_memory=10000, spool_dir=None,
+                skip_unchanged=False, max_skip_time=3600,
+                full_scan_interval=3600, event_log=None)
             mock_statsd_factory.assert_called_once_with(
                 'statsd.example.com', 8133, '1space.migration')
 
@@ -2877,6 +4222,124 @@ class TestMain(unittest.TestCase):
             self.stats_factory, True)
         self.assertEqual(old_list, status.status_list)
 
+    def test_migration_workers(self):
+        tests = [
+            ({}, 1, 10),
+            ({}, 4, 2),
+            ({'weight': 3}, 6, 5),
+            ({'weight': 3, 'max_workers': 3}, 6, 3),
+            ({'weight': 10}, 10, 10),
+            # a migration that runs alone gets every worker
+            ({'weight': 0.5}, 0.5, 10),
+            ({'weight': 0.5, 'max_workers': 4}, 0.5, 4),
+            ({'weight': 0.1}, 4, 1),
+        ]
+        for migration, total_weight, expected in tests:
+            self.assertEqual(expected, s3_sync.migrator._migration_workers(
+                migration, 10, total_weight))
+
+    def test_worker_shares(self):
+        shares = s3_sync.migrator.WorkerShares(12)
+        large = mock.Mock()
+        small = mock.Mock()
+        shares.add({'weight': 3}, large)
+        large.set_max_workers.assert_called_once_with(12)
+        shares.add({}, small)
+        large.set_max_workers.assert_called_with(9)
+        small.set_max_workers.assert_called_once_with(3)
+        # the workers of the finished migrations go to the others
+        shares.remove(small)
+        large.set_max_workers.assert_called_with(12)
+        self.assertEqual(1, small.set_max_workers.call_count)
+
+    def test_process_migrations_concurrently(self):
+        migrations = [
+            {'account': 'AUTH_test', 'aws_bucket': 'large',
+             'aws_identity': 'identity', 'weight': 3},
+            {'account': 'AUTH_test', 'aws_bucket': 'small',
+             'aws_identity': 'identity'},
+            {'account': 'AUTH_test', 'aws_bucket': 'other',
+             'aws_identity': 'identity'},
+            {'account': 'AUTH_test', 'aws_bucket': 'tiny',
+             'aws_identity': 'identity'},
+        ]
+        finished = []
+        large_done = eventlet.event.Event()
+
+        def _next_pass(migrator):
+            if migrator.config['aws_bucket'] == 'large':
+                large_done.wait()
+            else:
+                eventlet.sleep(0)
+            finished.append(migrator.config['aws_bucket'])
+            if len(finished) == 2:
+                large_done.send()
+            return [migrator.config]
+
+        status = mock.Mock()
+        selector = mock.Mock()
+        selector.is_local_container.side_effect = \
+            lambda account, bucket: bucket != 'other'
+        shares = []
+        with self.patch('Migrator') as mock_migrator:
+            def _make_migrator(config, *args, **kwargs):
+                migrator = mock.Mock(config=config)
+                migrator.next_pass.side_effect = lambda: _next_pass(migrator)
+                migrator.autoscaler.set_max_workers.side_effect = \
+                    lambda share: shares.append((config['aws_bucket'], share))
+                return migrator
+
+            mock_migrator.side_effect = _make_migrator
+            s3_sync.migrator.process_migrations(
+                migrations, status, None, self.logger, 1000, 12, selector,
+                1000000, self.stats_factory, migration_workers=2)
+
+        # the small migrations are not held up by the large one
+        self.assertEqual(['small', 'tiny', 'large'], finished)
+        # enough workers are started for every migration to run alone
+        self.assertEqual(
+            [('large', 12), ('small', 12), ('tiny', 12)],
+            [(call[0][0]['aws_bucket'], call[0][3])
+             for call in mock_migrator.call_args_list])
+        # the shares change as the migrations start and finish
+        self.assertEqual(
+            [('large', 12), ('large', 9), ('small', 3), ('large', 12),
+             ('large', 9), ('tiny', 3), ('large', 12)],
+            shares)
+        status.prune.assert_called_once_with(
+            [migrations[1], migrations[3], migrations[0]])
+
+    def test_process_migrations_failure(self):
+        migrations = [
+            {'account': 'AUTH_test', 'aws_bucket': bucket,
+             'aws_identity': 'identity'}
+            for bucket in ('failed', 'other')]
+        status = mock.Mock()
+        selector = mock.Mock()
+        migrators = []
+        with self.patch('Migrator') as mock_migrator:
+            def _make_migrator(config, *args, **kwargs):
+                migrator = mock.Mock(config=config)
+                if config['aws_bucket'] == 'failed':
+                    migrator.next_pass.side_effect = RuntimeError('failed')
+                else:
+                    migrator.next_pass.return_value = [config]
+                migrators.append(migrator)
+                return migrator
+
+            mock_migrator.side_effect = _make_migrator
+            with self.assertRaises(RuntimeError):
+                s3_sync.migrator.process_migrations(
+                    migrations, status, None, self.logger, 1000, 12,
+                    selector, 1000000, self.stats_factory,
+                    migration_workers=2)
+
+        # every migrator is closed and the failed migration is not pruned
+        self.assertEqual(2, len(migrators))
+        for migrator in migrators:
+            migrator.close.assert_called_once_with()
+        status.prune.assert_called_once_with([migrations[1], migrations[0]])
+
     def test_invalid_storage_policy_name(self):
         config = {'aws_bucket': 'bucket',
                   'account': 'AUTH_test',
@@ -0,0 +1,100 @@
+"""
+Copyright 2019 SwiftStack
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import mock
+import unittest
+
+from s3_sync.provider_factory import ProviderCache
+from s3_sync.sync_s3 import SyncS3
+from s3_sync.sync_swift import SyncSwift
+
+
+class TestProviderCache(unittest.TestCase):
+    def setUp(self):
+        self.settings = {'aws_bucket': 'bucket',
+                         'aws_identity': 'identity',
+                         'aws_secret': 'credential',
+                         'account': 'account',
+                         'container': 'container'}
+
+    def test_reuses_providers(self):
+        cache = ProviderCache()
+        provider = cache.get_provider(self.settings, 10)
+        self.assertIsInstance(provider, SyncS3)
+        self.assertIs(provider, cache.get_provider(dict(self.settings), 10))
+        self.assertEqual(1, len(cache))
+
+        swift_settings = dict(self.settings, protocol='swift',
+                              aws_endpoint='http://swift.example.com')
+        swift_provider = cache.get_provider(swift_settings, 10)
+        self.assertIsInstance(swift_provider, SyncSwift)
+        # different connection limits use separate providers
+        self.assertIsNot(provider, cache.get_provider(self.settings, 1))
+        self.assertIsNot(provider, cache.get_provider(
+            self.settings, 10, per_account=True))
+        self.assertEqual(4, len(cache))
+
+    def test_evicts_least_recently_used(self):
+        cache = ProviderCache(max_size=2)
+        providers = []
+        for bucket in ('bucket1', 'bucket2'):
+            providers.append(cache.get_provider(
+                dict(self.settings, aws_bucket=bucket), 10))
+        # refresh the first provider
+        cache.get_provider(dict(self.settings, aws_bucket='bucket1'), 10)
+
+        with mock.patch.object(providers[1], 'close') as mock_close:
+            cache.get_provider(dict(self.settings, aws_bucket='bucket3'), 10)
+        mock_close.assert_called_once_with()
+        self.assertEqual(2, len(cache))
+        self.assertIs(providers[0], cache.get_provider(
+            dict(self.settings, aws_bucket='bucket1'), 10))
+        self.assertIsNot(providers[1], cache.get_provider(
+            dict(self.settings, aws_bucket='bucket2'), 10))
+
+    @mock.patch('s3_sync.provider_factory.time')
+    def test_evicts_idle_providers(self, mock_time):
+        cache = ProviderCache(idle_timeout=60)
+        mock_time.time.return_value = 1000
+        provider = cache.get_provider(self.settings, 10)
+        other_settings = dict(self.settings, aws_bucket='other')
+        other_provider = cache.get_provider(other_settings, 10)
+
+        mock_time.time.return_value = 1059
+        self.assertIs(other_provider, cache.get_provider(other_settings, 10))
+        # a provider that is in use is dropped, but not closed
+        client = provider.client_pool.get_client()
+        mock_time.time.return_value = 1060
+        with mock.patch.object(provider, 'close') as mock_close:
+            new_provider = cache.get_provider(self.settings, 10)
+        self.assertIsNot(provider, new_provider)
+        mock_close.assert_not_called()
+        client.close()
+        self.assertEqual(2, len(cache))
+
+    def test_busy_provider(self):
+        cache = ProviderCache()
+        provider = cache.get_provider(self.settings, 2, needed_conns=2)
+        client = provider.client_pool.get_client()
+        self.assertIs(provider, cache.get_provider(
+            self.settings, 2, needed_conns=1))
+        new_provider = cache.get_provider(self.settings, 2, needed_conns=2)
+        self.assertIsNot(provider, new_provider)
+        self.assertEqual(2, new_provider.client_pool.free_count())
+        client.close()
+        self.assertIs(provider, cache.get_provider(
+            self.settings, 2, needed_conns=2))
+        self.assertEqual(1, len(cache))
@@ -14,6 +14,7 @@ See the License for the specific language governing permissions and
 limitations under the License.
 """
 
+import eventlet
 import hashlib
 import json
 import logging
@@ -536,6 +537,58 @@ class TestShunt(unittest.TestCase):
         _test_shunted('/v1/AUTH_b/c1/o', True)
         _test_shunted('/v1/AUTH_b/c2/o', True)
 
+    @mock.patch('s3_sync.shunt.time')
+    def test_lookup_cache(self, mock_time):
+        mock_time.return_value = 1000
+
+        def _request(path, method='HEAD', status='404 Not Found',
+                     headers=None):
+            req = swob.Request.blank(path, headers=headers, environ={
+                'REQUEST_METHOD': method,
+                '__test__.status': status,
+                '__test__.headers': [('X-Trans-Id', 'local trans id')],
+                'swift.trans_id': 'local trans id'})
+            status, headers, body_iter = req.call_application(self.app)
+            return status, headers
+
+        # missing on both sides
+        self.mock_shunt_s3.return_value = ('404 Not Found', [], [])
+        self.assertEqual('404 Not Found', _request('/v1/AUTH_a/s3/o')[0])
+        self.assertEqual('404 Not Found', _request('/v1/AUTH_a/s3/o')[0])
+        self.assertEqual('404 Not Found',
+                         _request('/v1/AUTH_a/s3/o', 'GET')[0])
+        self.assertEqual(1, self.mock_shunt_s3.call_count)
+
+        # entries expire
+        mock_time.return_value = 1005
+        _request('/v1/AUTH_a/s3/o')
+        self.assertEqual(2, self.mock_shunt_s3.call_count)
+
+        # metadata is served for HEAD requests
+        self.mock_shunt_s3.reset_mock()
+        self.mock_shunt_s3.return_value = (
+            '200 OK', [('etag', 'deadbeef')], [])
+        for _ in range(2):
+            self.assertEqual(
+                ('200 OK', [('etag', 'deadbeef'),
+                            ('X-Trans-Id', 'local trans id')]),
+                _request('/v1/AUTH_a/s3/o2'))
+        self.assertEqual(1, self.mock_shunt_s3.call_count)
+        _request('/v1/AUTH_a/s3/o2', headers={'If-None-Match': 'deadbeef'})
+        _request('/v1/AUTH_a/s3/o2', 'GET')
+        self.assertEqual(3, self.mock_shunt_s3.call_count)
+
+        # writes invalidate the entries
+        self.mock_shunt_s3.reset_mock()
+        self.mock_shunt_s3.return_value = ('404 Not Found', [], [])
+        _request('/v1/AUTH_migrate/destination/o')
+        _request('/v1/AUTH_migrate/destination/o', 'DELETE',
+                 '204 No Content')
+        _request('/v1/AUTH_migrate/destination/o')
+        _request('/v1/AUTH_migrate/destination/o', 'POST', '202 Accepted')
+        _request('/v1/AUTH_migrate/destination/o')
+        self.assertEqual(3, self.mock_shunt_s3.call_count)
+
     @mock.patch.object(sync_swift.SyncSwift, 'get_manifest')
     @mock.patch.object(sync_s3.SyncS3, 'get_manifest')
     @mock.patch.object(sync_swift.SyncSwift, 'shunt_object')
@@ -816,13 +869,96 @@ class TestShunt(unittest.TestCase):
                      '__test__.body': '[]',
                      'swift.trans_id': 'id'})
         status, headers, body_iter = req.call_application(self.app)
+        resp_body = b''.join(body_iter)
         self.assertEqual(self.mock_shunt_swift.mock_calls, [])
         self.mock_list_s3.assert_has_calls([
             mock.call(marker='', limit=10000, prefix='', delimiter=''),
             mock.call(marker=u'unicod\xe9', limit=10000, prefix='',
                       delimiter='')])
-        names = body_iter.split('\n')
+        names = resp_body.split('\n')
         self.assertEqual(['abc', u'unicod\xe9'.encode('utf-8')], names)
+        # the spliced listing is streamed
+        self.assertNotIn('content-length',
+                         [h.lower() for h, _ in headers])
+
+    def test_list_container_local_error(self):
+        # the remote listing is cancelled if the local response is an error
+        self.mock_list_s3.side_effect = Exception('remote failure')
+        req = swob.Request.blank(
+            '/v1/AUTH_a/s3',
+            environ={'__test__.status': '503 Service Unavailable',
+                     '__test__.body': 'Unavailable',
+                     'swift.trans_id': 'id'})
+        status, headers, body_iter = req.call_application(self.app)
+        self.assertEqual('503 Service Unavailable', status)
+        self.assertEqual('Unavailable', b''.join(body_iter))
+        self.assertEqual(self.mock_list_s3.mock_calls, [])
+
+    def test_list_container_concurrently(self):
+        # only requests that are authorized up front list the remote store
+        # while the local listing is requested
+        for authorize, concurrent in ((None, False),
+                                      (mock.Mock(return_value=None), True)):
+            self.mock_list_s3.reset_mock()
+            self.mock_list_s3.side_effect = [
+                ProviderResponse(True, 200, {}, [])]
+            environ = {'__test__.status': '200 OK',
+                       '__test__.body': '[]',
+                       'swift.trans_id': 'id'}
+            if authorize:
+                environ['swift.authorize'] = authorize
+            req = swob.Request.blank('/v1/AUTH_a/s3', environ=environ)
+            with mock.patch('eventlet.greenthread.spawn',
+                            wraps=eventlet.greenthread.spawn) as mock_spawn:
+                status, headers, body_iter = req.call_application(self.app)
+                self.assertEqual('', b''.join(body_iter))
+            self.assertEqual('200 OK', status)
+            self.assertEqual(concurrent, mock_spawn.called)
+            self.mock_list_s3.assert_called_once_with(
+                marker='', limit=10000, prefix='', delimiter='')
+
+    def test_list_container_unauthorized(self):
+        # unauthorized requests never list the remote store
+        self.mock_list_s3.side_effect = Exception('remote failure')
+        authorize = mock.Mock(return_value=swob.HTTPForbidden())
+        req = swob.Request.blank(
+            '/v1/AUTH_a/s3',
+            environ={'__test__.status': '403 Forbidden',
+                     '__test__.body': 'Forbidden',
+                     'swift.authorize': authorize,
+                     'swift.trans_id': 'id'})
+        status, headers, body_iter = req.call_application(self.app)
+        self.assertEqual('403 Forbidden', status)
+        self.assertEqual('Forbidden', b''.join(body_iter))
+        self.assertEqual(self.mock_list_s3.mock_calls, [])
+        self.assertEqual(1, authorize.call_count)
+
+    def test_list_container_authorized_by_proxy(self):
+        # requests which cannot be authorized up front (e.g. through ACLs)
+        # list the remote store after the local listing
+        self.mock_list_s3.side_effect = [
+            ProviderResponse(
+                True, 200, {},
+                [{'name': 'abc',
+                  'hash': 'ffff',
+                  'bytes': 42,
+                  'last_modified': 'date',
+                  'content_type': 'type',
+                  'content_location': 'mock-s3:bucket'}]),
+            ProviderResponse(True, 200, {}, [])]
+        authorize = mock.Mock(return_value=swob.HTTPForbidden())
+        req = swob.Request.blank(
+            '/v1/AUTH_a/s3',
+            environ={'__test__.status': '200 OK',
+                     '__test__.body': '[]',
+                     'swift.authorize': authorize,
+                     'swift.trans_id': 'id'})
+        status, headers, body_iter = req.call_application(self.app)
+        self.assertEqual('200 OK', status)
+        self.assertEqual('abc', b''.join(body_iter))
+        self.assertEqual(
+            mock.call(marker='', limit=10000, prefix='', delimiter=''),
+            self.mock_list_s3.mock_calls[0])
 
     def test_list_container_shunt_s3_xml(self):
         elements = [{'name': 'abc',
@@ -846,12 +982,13 @@ class TestShunt(unittest.TestCase):
                      '__test__.body': '[]',
                      'swift.trans_id': 'id'})
         status, headers, body_iter = req.call_application(self.app)
+        resp_body = b''.join(body_iter)
         self.assertEqual(self.mock_shunt_swift.mock_calls, [])
         self.mock_list_s3.assert_has_calls([
             mock.call(marker='', limit=10000, prefix='', delimiter=''),
             mock.call(marker=u'unicod\xe9', limit=10000,
                       prefix='', delimiter='')])
-        self._assert_xml_listing(body_iter, elements, 's3')
+        self._assert_xml_listing(resp_body, elements, 's3')
 
     def test_list_container_accept_xml(self):
         elements = [{'name': 'abc',
@@ -877,12 +1014,13 @@ class TestShunt(unittest.TestCase):
                      'swift.trans_id': 'id'},
             headers={'Accept': 'application/xml'})
         status, headers, body_iter = req.call_application(self.app)
+        resp_body = b''.join(body_iter)
         self.assertEqual(self.mock_shunt_swift.mock_calls, [])
         self.mock_list_s3.assert_has_calls([
             mock.call(marker='', limit=10000, prefix='', delimiter=''),
             mock.call(marker=u'unicod\xe9', limit=10000,
                       prefix='', delimiter='')])
-        self._assert_xml_listing(body_iter, elements, 's3')
+        self._assert_xml_listing(resp_body, elements, 's3')
 
     def test_list_container_shunt_s3_json(self):
         elements = [{'name': 'abc',
@@ -907,12 +1045,13 @@ class TestShunt(unittest.TestCase):
                      '__test__.body': '[]',
                      'swift.trans_id': 'id'})
         status, headers, body_iter = req.call_application(self.app)
+        resp_body = b''.join(body_iter)
         self.assertEqual(self.mock_shunt_swift.mock_calls, [])
         self.mock_list_s3.assert_has_calls([
             mock.call(marker='', limit=10000, prefix='', delimiter=''),
             mock.call(marker=u'unicod\xe9', limit=10000,
                       prefix='', delimiter='')])
-        results = json.loads(body_iter)
+        results = json.loads(resp_body)
         for i, entry in enumerate(results):
             for k in entry.keys():
                 if k == 'content_location':
@@ -944,12 +1083,13 @@ class TestShunt(unittest.TestCase):
                      'swift.trans_id': 'id'},
             headers={'Accept': 'application/json'})
         status, headers, body_iter = req.call_application(self.app)
+        resp_body = b''.join(body_iter)
         self.assertEqual(self.mock_shunt_swift.mock_calls, [])
         self.mock_list_s3.assert_has_calls([
             mock.call(marker='', limit=10000, prefix='', delimiter=''),
             mock.call(marker=u'unicod\xe9', limit=10000,
                       prefix='', delimiter='')])
-        results = json.loads(body_iter)
+        results = json.loads(resp_body)
         for i, entry in enumerate(results):
             for k in elements[i].keys():
                 if k == 'content_location':
@@ -957,11 +1097,12 @@ class TestShunt(unittest.TestCase):
                 else:
                     self.assertEqual(elements[i][k], entry[k])
 
-    @mock.patch('s3_sync.shunt.create_provider')
+    @mock.patch('s3_sync.provider_factory.create_provider')
     def test_list_container_shunt_all_containers(self, create_mock):
         create_mock.return_value = mock.Mock()
         create_mock.return_value.list_objects.return_value = ProviderResponse(
             True, 200, {}, [])
+        create_mock.return_value.client_pool.free_count.return_value = 10
         req = swob.Request.blank(
             '/v1/AUTH_b/s3',
             environ={'__test__.status': '200 OK',
@@ -975,7 +1116,7 @@ class TestShunt(unittest.TestCase):
             'propagate_delete': False,
             'aws_bucket': 'dest-bucket',
             'aws_identity': 'user',
-            'aws_secret': 'key'}, max_conns=1, per_account=True)
+            'aws_secret': 'key'}, 10, True, None, None)
 
         # Follow it up with another request to a *different* container to make
         # sure we didn't bleed state
@@ -993,7 +1134,45 @@ class TestShunt(unittest.TestCase):
             'propagate_delete': False,
             'aws_bucket': 'dest-bucket',
             'aws_identity': 'user',
-            'aws_secret': 'key'}, max_conns=1, per_account=True)
+            'aws_secret': 'key'}, 10, True, None, None)
+
+    @mock.patch('s3_sync.provider_factory.create_provider')
+    def test_provider_reuse(self, create_mock):
+        provider = create_mock.return_value
+        provider.list_objects.return_value = ProviderResponse(
+            True, 200, {}, [])
+        provider.client_pool.free_count.return_value = 10
+
+        def _list_container():
+            req = swob.Request.blank(
+                '/v1/AUTH_a/s3',
+                environ={'__test__.status': '200 OK',
+                         '__test__.body': '[]',
+                         'swift.trans_id': 'id'})
+            req.call_application(self.app)
+
+        _list_container()
+        _list_container()
+        profile = self.app.shunted_app.sync_profiles[('AUTH_a', 's3')]
+        create_mock.assert_called_once_with(profile, 10, False, None, None)
+        self.assertEqual(2, provider.list_objects.call_count)
+
+        # a busy provider is not waited on
+        provider.client_pool.free_count.return_value = 0
+        create_mock.reset_mock()
+        _list_container()
+        create_mock.assert_called_once_with(profile, 1, False, None, None)
+
+        # providers are recreated when the configuration changes
+        provider.client_pool.free_count.return_value = 10
+        with tempfile.NamedTemporaryFile() as fp:
+            json.dump(self.conf, fp)
+            fp.flush()
+            self.app.shunted_app.conf_file = fp.name
+            self.app.shunted_app._reload(force=True)
+        create_mock.reset_mock()
+        _list_container()
+        create_mock.assert_called_once_with(profile, 10, False, None, None)
 
     def test_list_container_shunt_swift(self):
         self.mock_list_swift.side_effect = [
@@ -1018,12 +1197,13 @@ class TestShunt(unittest.TestCase):
                      '__test__.body': '[]',
                      'swift.trans_id': 'id'})
         status, headers, body_iter = req.call_application(self.app)
+        resp_body = b''.join(body_iter)
         self.assertEqual(self.mock_shunt_swift.mock_calls, [])
         self.mock_list_swift.assert_has_calls([
             mock.call(marker='', limit=10000, prefix='', delimiter=''),
             mock.call(marker=u'unicod\xe9', limit=10000,
                       prefix='', delimiter='')])
-        names = body_iter.split('\n')
+        names = resp_body.split('\n')
         self.assertEqual(['abc', u'unicod\xe9'.encode('utf-8')], names)
 
     def test_list_container_shunt_with_duplicates(self):
@@ -1066,10 +1246,11 @@ class TestShunt(unittest.TestCase):
                      '__test__.body': json.dumps(local_data),
                      'swift.trans_id': 'id'})
         status, headers, body_iter = req.call_application(self.app)
+        resp_body = b''.join(body_iter)
         self.assertEqual(self.mock_shunt_swift.mock_calls, [])
         self.mock_list_swift.assert_called_once_with(
             marker='', limit=4, prefix='', delimiter='/')
-        names = body_iter.split('\n')
+        names = resp_body.split('\n')
         self.assertEqual(names, [
             'a', 'a/', u'unicod\xe9'.encode('utf-8'), 'z/',
         ])
@@ -1096,13 +1277,14 @@ class TestShunt(unittest.TestCase):
                      '__test__.body': '[]',
                      'swift.trans_id': 'id'})
         status, headers, body_iter = req.call_application(self.app)
+        resp_body = b''.join(body_iter)
         self.assertEqual(self.mock_shunt_swift.mock_calls, [])
         self.assertEqual(
             [mock.call(marker='', limit=10000, prefix='', delimiter=''),
              mock.call(marker=u'unicod\xe9', limit=10000,
                        prefix='', delimiter='')],
             mock_list_buckets.mock_calls)
-        results = json.loads(body_iter)
+        results = json.loads(resp_body)
         for index, entry in enumerate(results):
             for k, v in entry.items():
                 if k == 'content_location':
@@ -1132,6 +1314,7 @@ class TestShunt(unittest.TestCase):
                      '__test__.body': '[]',
                      'swift.trans_id': 'id'})
         status, headers, body_iter = req.call_application(self.app)
+        resp_body = b''.join(body_iter)
         self.assertEqual(self.mock_shunt_swift.mock_calls, [])
         self.assertEqual(
             [mock.call(marker='', limit=10000, prefix='', delimiter=''),
@@ -1139,7 +1322,7 @@ class TestShunt(unittest.TestCase):
                        prefix='', delimiter='')],
             mock_list_buckets.mock_calls)
         self.assertEqual(['abc', u'unicod\xe9'.encode('utf-8')],
-                         body_iter.split('\n'))
+                         resp_body.split('\n'))
 
     @mock.patch('s3_sync.sync_s3.SyncS3.list_buckets')
     def test_list_account_accept_xml(self, mock_list_buckets):
@@ -1163,13 +1346,14 @@ class TestShunt(unittest.TestCase):
                      '__test__.body': '[]',
                      'swift.trans_id': 'id'})
         status, headers, body_iter = req.call_application(self.app)
+        resp_body = b''.join(body_iter)
         self.assertEqual(self.mock_shunt_swift.mock_calls, [])
         self.assertEqual(
             [mock.call(marker='', limit=10000, prefix='', delimiter=''),
              mock.call(marker=u'unicod\xe9', limit=10000,
                        prefix='', delimiter='')],
             mock_list_buckets.mock_calls)
-        self._assert_xml_listing(body_iter, elements,
+        self._assert_xml_listing(resp_body, elements,
                                  account='AUTH_migrate-star')
 
     @mock.patch('s3_sync.sync_s3.SyncS3.list_buckets')
@@ -1186,6 +1370,7 @@ class TestShunt(unittest.TestCase):
                                       '{"subdir": "xyz-"}]',
                      'swift.trans_id': 'id'})
         status, headers, body_iter = req.call_application(self.app)
+        resp_body = b''.join(body_iter)
         self.assertEqual(self.mock_shunt_swift.mock_calls, [])
         self.assertEqual(
             [mock.call(marker='', limit=10000, prefix='', delimiter='-'),
@@ -1193,7 +1378,7 @@ class TestShunt(unittest.TestCase):
                        prefix='', delimiter='-')],
             mock_list_buckets.mock_calls)
         self.assertEqual(['abc-', u'unicod\xe9-'.encode('utf-8'), 'xyz-'],
-                         body_iter.split('\n'))
+                         resp_body.split('\n'))
 
     def test_shunt_migration_put_object_missing_container(self):
         responses = {'PUT': {
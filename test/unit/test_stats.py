@@ -37,3 +37,7 @@ class TestStatsReporter(unittest.TestCase):
         instance.timing('timing_metric', 100)
         self.factory.statsd_client.timing.assert_called_once_with(
             'metric_prefix.timing_metric', 100)
+
+        instance.gauge('gauge_metric', 10)
+        self.factory.statsd_client.gauge.assert_called_once_with(
+            'metric_prefix.gauge_metric', 10)
@@ -14,6 +14,7 @@ See the License for the specific language governing permissions and
 limitations under the License.
 """
 
+import eventlet
 import json
 import mock
 import os
@@ -24,7 +25,7 @@ import unittest
 
 from container_crawler.exceptions import RetryError
 from s3_sync.sync_container import (SyncContainer, SyncContainerFactory,
-                                    hash_dict)
+                                    SyncStatusCache, hash_dict)
 from s3_sync.sync_s3 import SyncS3
 from s3_sync.sync_swift import SyncSwift
 from swift.common.utils import decode_timestamps
@@ -196,6 +197,7 @@ class TestSyncContainer(unittest.TestCase):
 
             mock_exists.return_value = True
             mock_open.return_value = self.MockMetaConf(fake_status)
+            self.sync_container.status_cache = SyncStatusCache()
 
             status = self.sync_container.get_last_processed_row(entry['id'])
             self.assertEqual(entry['last_row'], status)
@@ -228,6 +230,7 @@ class TestSyncContainer(unittest.TestCase):
 
             mock_exists.return_value = True
             mock_open.return_value = self.MockMetaConf(fake_status)
+            self.sync_container.status_cache = SyncStatusCache()
 
             status = self.sync_container.get_last_verified_row(entry['id'])
             if 'last_verified_row' in entry:
@@ -239,48 +242,47 @@ class TestSyncContainer(unittest.TestCase):
                 self.scratch_space, self.sync_container._account,
                 self.sync_container._container))
 
-    @mock.patch('__builtin__.open')
-    def test_save_last_processed_row(self, mock_open):
+    def _setup_status_dir(self, status_entries=None):
+        status_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, status_dir)
+        self.sync_container = SyncContainer(
+            status_dir, self.sync_container._settings, self.stats_factory)
+        if status_entries is not None:
+            os.mkdir(self.sync_container._status_account_dir)
+            with open(self.sync_container._status_file, 'w') as f:
+                json.dump(status_entries, f)
+
+    def _read_status_file(self):
+        with open(self.sync_container._status_file) as f:
+            return json.load(f)
+
+    def test_save_last_processed_row(self):
         db_entries = {'db-id-1': {'aws_bucket': 'bucket', 'last_row': 5},
                       'db-id-2': {'aws_bucket': 'bucket', 'last_row': 7}}
         new_row = 42
         for db_id, entry in db_entries.items():
+            self._setup_status_dir(db_entries)
             self.sync_container.aws_bucket = entry['aws_bucket']
-            fake_conf_file = self.MockMetaConf(db_entries)
-            mock_open.return_value = fake_conf_file
-
-            with mock.patch('s3_sync.sync_container.os.path.exists')\
-                    as mock_exists:
-                mock_exists.return_value = True
-
-                self.sync_container.save_last_processed_row(new_row, db_id)
-                file_entries = fake_conf_file.fake_status
-                for file_db_id, status in file_entries.items():
-                    if file_db_id == db_id:
-                        self.assertEqual(new_row, status['last_row'])
-                        self.assertEqual(
-                            entry['last_row'], status['last_verified_row'])
-                    else:
-                        self.assertEqual(db_entries[file_db_id]['last_row'],
-                                         status['last_row'])
-                    if db_id != file_db_id:
-                        continue
-                    else:
-                        self.assertIn('policy', status)
-                    for field in SyncContainer.POLICY_FIELDS:
-                        self.assertEqual(status['policy'][field],
-                                         getattr(self.sync_container, field))
-
-                self.assertEqual(
-                    [mock.call('%s/%s' % (self.scratch_space,
-                                          self.sync_container._account)),
-                     mock.call('%s/%s/%s' % (self.scratch_space,
-                                             self.sync_container._account,
-                                             self.sync_container._container))],
-                    mock_exists.call_args_list)
 
-    @mock.patch('__builtin__.open')
-    def test_save_last_verified_row(self, mock_open):
+            self.sync_container.save_last_processed_row(new_row, db_id)
+            file_entries = self._read_status_file()
+            for file_db_id, status in file_entries.items():
+                if file_db_id == db_id:
+                    self.assertEqual(new_row, status['last_row'])
+                    self.assertEqual(
+                        entry['last_row'], status['last_verified_row'])
+                else:
+                    self.assertEqual(db_entries[file_db_id]['last_row'],
+                                     status['last_row'])
+                if db_id != file_db_id:
+                    continue
+                else:
+                    self.assertIn('policy', status)
+                for field in SyncContainer.POLICY_FIELDS:
+                    self.assertEqual(status['policy'][field],
+                                     getattr(self.sync_container, field))
+
+    def test_save_last_verified_row(self):
         db_entries = {'db-id-1': {'aws_bucket': 'bucket',
                                   'last_row': 100,
                                   'last_verified_row': 10},
@@ -291,109 +293,124 @@ class TestSyncContainer(unittest.TestCase):
                                   'last_row': 1000}}
         new_row = 99
         for db_id, entry in db_entries.items():
+            self._setup_status_dir(db_entries)
             self.sync_container.aws_bucket = entry['aws_bucket']
-            fake_conf_file = self.MockMetaConf(db_entries)
-            mock_open.return_value = fake_conf_file
-
-            with mock.patch('s3_sync.sync_container.os.path.exists')\
-                    as mock_exists:
-                mock_exists.return_value = True
-
-                self.sync_container.save_last_verified_row(new_row, db_id)
-                file_entries = fake_conf_file.fake_status
-                for file_db_id, status in file_entries.items():
-                    if file_db_id == db_id:
-                        self.assertEqual(new_row, status['last_verified_row'])
-                    elif 'last_verified_row' in db_entries[file_db_id]:
-                        self.assertEqual(
-                            db_entries[file_db_id]['last_verified_row'],
-                            status['last_verified_row'])
-                    self.assertEqual(
-                        db_entries[file_db_id]['last_row'],
-                        status['last_row'])
-                    if db_id != file_db_id:
-                        continue
-                    else:
-                        self.assertIn('policy', status)
-                    for field in SyncContainer.POLICY_FIELDS:
-                        self.assertEqual(status['policy'][field],
-                                         getattr(self.sync_container, field))
 
+            self.sync_container.save_last_verified_row(new_row, db_id)
+            file_entries = self._read_status_file()
+            for file_db_id, status in file_entries.items():
+                if file_db_id == db_id:
+                    self.assertEqual(new_row, status['last_verified_row'])
+                elif 'last_verified_row' in db_entries[file_db_id]:
+                    self.assertEqual(
+                        db_entries[file_db_id]['last_verified_row'],
+                        status['last_verified_row'])
                 self.assertEqual(
-                    [mock.call('%s/%s' % (self.scratch_space,
-                                          self.sync_container._account)),
-                     mock.call('%s/%s/%s' % (self.scratch_space,
-                                             self.sync_container._account,
-                                             self.sync_container._container))],
-                    mock_exists.call_args_list)
-
-    @mock.patch('__builtin__.open')
-    @mock.patch('s3_sync.sync_container.os.path.exists')
-    def test_save_no_prior_status(self, mock_exists, mock_open):
-        def existence_check(path):
-            if path == '%s/%s' % (self.scratch_space,
-                                  self.sync_container._account):
-                return True
-            elif path == '%s/%s/%s' % (self.scratch_space,
-                                       self.sync_container._account,
-                                       self.sync_container._container):
-                return False
-            else:
-                raise RuntimeError('Invalid path')
-
+                    db_entries[file_db_id]['last_row'],
+                    status['last_row'])
+                if db_id != file_db_id:
+                    continue
+                else:
+                    self.assertIn('policy', status)
+                for field in SyncContainer.POLICY_FIELDS:
+                    self.assertEqual(status['policy'][field],
+                                     getattr(self.sync_container, field))
+
+    def test_save_no_prior_status(self):
+        self._setup_status_dir()
         self.sync_container.aws_bucket = 'bucket'
-        fake_conf_file = self.MockMetaConf({})
-        mock_exists.side_effect = existence_check
-        mock_open.return_value = fake_conf_file
 
         self.sync_container.save_last_processed_row(42, 'db-id')
-        self.assertEqual(42, fake_conf_file.fake_status['db-id']['last_row'])
-        self.assertEqual(
-            0, fake_conf_file.fake_status['db-id']['last_verified_row'])
-        self.assertEqual('bucket',
-                         fake_conf_file.fake_status['db-id']['aws_bucket'])
-
+        file_entries = self._read_status_file()
+        self.assertEqual(42, file_entries['db-id']['last_row'])
+        self.assertEqual(0, file_entries['db-id']['last_verified_row'])
+        self.assertEqual('bucket', file_entries['db-id']['aws_bucket'])
+        # the status file is replaced rather than rewritten in place
         self.assertEqual(
-            [mock.call('%s/%s' % (self.scratch_space,
-                                  self.sync_container._account)),
-             mock.call('%s/%s/%s' % (self.scratch_space,
-                                     self.sync_container._account,
-                                     self.sync_container._container))],
-            mock_exists.call_args_list)
+            [os.path.basename(self.sync_container._status_file)],
+            os.listdir(self.sync_container._status_account_dir))
 
-    @mock.patch('__builtin__.open')
-    @mock.patch('s3_sync.sync_container.os.path.exists')
-    def test_save_last_processed_row_new_bucket(self, mock_exists, mock_open):
+    def test_save_last_processed_row_new_bucket(self):
         db_entries = {'db-id-1': {'aws_bucket': 'bucket', 'last_row': 5},
                       'db-id-2': {'aws_bucket': 'old-bucket', 'last_row': 7}}
         new_row = 42
         for db_id, entry in db_entries.items():
+            self._setup_status_dir(db_entries)
             self.sync_container.aws_bucket = 'bucket'
-            fake_conf_file = self.MockMetaConf(db_entries)
-            mock_open.return_value = fake_conf_file
-
-            with mock.patch('s3_sync.sync_container.os.path.exists')\
-                    as mock_exists:
-                mock_exists.return_value = True
-                self.sync_container.save_last_processed_row(new_row, db_id)
-                file_entries = fake_conf_file.fake_status
-                for file_db_id, status in file_entries.items():
-                    if file_db_id == db_id:
-                        self.assertEqual(new_row, status['last_row'])
-                        self.assertEqual('bucket', status['aws_bucket'])
-                    else:
-                        self.assertEqual(db_entries[file_db_id]['last_row'],
-                                         status['last_row'])
-                        self.assertEqual(db_entries[file_db_id]['aws_bucket'],
-                                         status['aws_bucket'])
+            self.sync_container.save_last_processed_row(new_row, db_id)
+            file_entries = self._read_status_file()
+            for file_db_id, status in file_entries.items():
+                if file_db_id == db_id:
+                    self.assertEqual(new_row, status['last_row'])
+                    self.assertEqual('bucket', status['aws_bucket'])
+                else:
+                    self.assertEqual(db_entries[file_db_id]['last_row'],
+                                     status['last_row'])
+                    self.assertEqual(db_entries[file_db_id]['aws_bucket'],
+                                     status['aws_bucket'])
+
+    def test_status_cache(self):
+        db_entries = {'db-id-1': {'aws_bucket': 'bucket', 'last_row': 5}}
+        self._setup_status_dir(db_entries)
+        status_cache = SyncStatusCache(flush_interval=60)
+        self.sync_container.status_cache = status_cache
+
+        self.assertEqual(5, self.sync_container.get_last_processed_row(
+            'db-id-1'))
+        with mock.patch('__builtin__.open') as mock_open:
+            self.sync_container.save_last_processed_row(10, 'db-id-1')
+            self.sync_container.save_last_verified_row(7, 'db-id-1')
+            self.assertEqual(
+                10, self.sync_container.get_last_processed_row('db-id-1'))
+            self.assertEqual(
+                7, self.sync_container.get_last_verified_row('db-id-1'))
+        # status is only read once and written out in batches
+        self.assertEqual([], mock_open.mock_calls)
+        self.assertEqual(db_entries, self._read_status_file())
+
+        status_cache.flush()
+        file_entries = self._read_status_file()
+        self.assertEqual(10, file_entries['db-id-1']['last_row'])
+        self.assertEqual(7, file_entries['db-id-1']['last_verified_row'])
+
+        # updates are written out once the flush interval expires
+        now = time.time()
+        with mock.patch('s3_sync.sync_container.time.time') as mock_time:
+            mock_time.return_value = now + 60
+            self.sync_container.save_last_processed_row(20, 'db-id-1')
+        self.assertEqual(20, self._read_status_file()['db-id-1']['last_row'])
+
+    def test_status_cache_flusher(self):
+        self._setup_status_dir(
+            {'db-id-1': {'aws_bucket': 'bucket', 'last_row': 5}})
+        status_cache = SyncStatusCache(flush_interval=60)
+        self.sync_container.status_cache = status_cache
+        self.sync_container.save_last_processed_row(10, 'db-id-1')
+        self.assertEqual(5, self._read_status_file()['db-id-1']['last_row'])
+
+        # dirty entries are written out once the interval expires, even
+        # without further updates
+        status_cache._last_flush -= 60
+        status_cache.start()
+        self.addCleanup(status_cache.stop)
+        eventlet.sleep(0)
+        self.assertEqual(10, self._read_status_file()['db-id-1']['last_row'])
+
+        self.sync_container.save_last_processed_row(20, 'db-id-1')
+        status_cache.stop()
+        self.assertIsNone(status_cache._flusher)
+        self.assertEqual(20, self._read_status_file()['db-id-1']['last_row'])
+
+    def test_status_cache_corrupted_file(self):
+        self._setup_status_dir()
+        os.mkdir(self.sync_container._status_account_dir)
+        with open(self.sync_container._status_file, 'w') as f:
+            f.write('{"db-id-1": {"aws_bu')
 
-                self.assertEqual(
-                    [mock.call('%s/%s' % (self.scratch_space,
-                                          self.sync_container._account)),
-                     mock.call('%s/%s/%s' % (self.scratch_space,
-                                             self.sync_container._account,
-                                             self.sync_container._container))],
-                    mock_exists.call_args_list)
+        self.assertEqual(
+            0, self.sync_container.get_last_processed_row('db-id-1'))
+        self.sync_container.save_last_processed_row(42, 'db-id-1')
+        self.assertEqual(42, self._read_status_file()['db-id-1']['last_row'])
 
     def test_s3_provider(self):
         defaults = {'aws_bucket': self.aws_bucket,
@@ -551,15 +568,14 @@ class TestSyncContainer(unittest.TestCase):
         for case in testdata:
             self.assertEqual(hash_dict(case[0]), hash_dict(case[1]))
 
-    @mock.patch('__builtin__.open')
-    @mock.patch('s3_sync.sync_container.os.path.exists')
     @mock.patch('s3_sync.sync_swift.swiftclient.client.Connection')
-    def test_handle_container_new_metadata(
-            self, mock_swift, mock_exists, mock_open):
-        mock_exists.return_value = True
+    def test_handle_container_new_metadata(self, mock_swift):
         db_entries = {'db-id-1': {'aws_bucket': 'bucket', 'last_row': 5}}
-        fake_conf_file = self.MockMetaConf(db_entries)
-        mock_open.return_value = fake_conf_file
+        status_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, status_dir)
+        os.mkdir(os.path.join(status_dir, 'account'))
+        with open(os.path.join(status_dir, 'account', 'container'), 'w') as f:
+            json.dump(db_entries, f)
         settings = {
             'aws_bucket': self.aws_bucket,
             'aws_identity': 'identity',
@@ -578,8 +594,7 @@ class TestSyncContainer(unittest.TestCase):
 
         mock_swift.return_value.post_container.return_value = {}
 
-        sync = SyncContainer(self.scratch_space, settings,
-                             self.stats_factory)
+        sync = SyncContainer(status_dir, settings, self.stats_factory)
         sync.handle_container_info({'id': 'db-id-1'}, metadata)
 
         mock_swift.assert_called_once_with(
@@ -590,19 +605,23 @@ class TestSyncContainer(unittest.TestCase):
                           headers={'X-Container-Meta-Foo': 'foo',
                                    'X-Container-Meta-Bar': 'bar'})],
                          mock_swift.return_value.mock_calls)
+        with open(os.path.join(status_dir, 'account', 'container')) as f:
+            self.assertEqual(
+                hash_dict({'X-Container-Meta-Foo': 'foo',
+                           'X-Container-Meta-Bar': 'bar'}),
+                json.load(f)['db-id-1'][SyncContainer.METADATA_HASH_KEY])
 
-    @mock.patch('__builtin__.open')
-    @mock.patch('s3_sync.sync_container.os.path.exists')
     @mock.patch('s3_sync.sync_swift.swiftclient.client.Connection')
-    def test_handle_container_update_metadata(
-            self, mock_swift, mock_exists, mock_open):
-        mock_exists.return_value = True
+    def test_handle_container_update_metadata(self, mock_swift):
         old_hash = hash_dict({'X-Container-Meta': 'foo'})
         db_entries = {'db-id-1': {'aws_bucket': 'bucket',
                                   'last_row': 5,
                                   SyncContainer.METADATA_HASH_KEY: old_hash}}
-        fake_conf_file = self.MockMetaConf(db_entries)
-        mock_open.return_value = fake_conf_file
+        status_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, status_dir)
+        os.mkdir(os.path.join(status_dir, 'account'))
+        with open(os.path.join(status_dir, 'account', 'container'), 'w') as f:
+            json.dump(db_entries, f)
 
         settings = {
             'aws_bucket': self.aws_bucket,
@@ -614,8 +633,7 @@ class TestSyncContainer(unittest.TestCase):
             'container': 'container',
             'protocol': 'swift'}
 
-        sync = SyncContainer(self.scratch_space, settings,
-                             self.stats_factory)
+        sync = SyncContainer(status_dir, settings, self.stats_factory)
         metadata = {'X-Container-Meta-Foo': ('foo', '1545160000.1234'),
                     'X-Container-Meta-Bar': ('bar', '1546123456.7896'),
                     'Some-Other-Key': ('val', '1545179217.201453'),
@@ -631,6 +649,11 @@ class TestSyncContainer(unittest.TestCase):
                           headers={'X-Container-Meta-Foo': 'foo',
                                    'X-Container-Meta-Bar': 'bar'})],
                          mock_swift.return_value.mock_calls)
+        with open(os.path.join(status_dir, 'account', 'container')) as f:
+            self.assertEqual(
+                hash_dict({'X-Container-Meta-Foo': 'foo',
+                           'X-Container-Meta-Bar': 'bar'}),
+                json.load(f)['db-id-1'][SyncContainer.METADATA_HASH_KEY])
 
     @mock.patch('__builtin__.open')
     @mock.patch('s3_sync.sync_container.os.path.exists')
@@ -748,6 +771,33 @@ class TestSyncContainerFactory(unittest.TestCase):
         instance = factory.instance(instance_settings, per_account=True)
         self.assertEqual(status_dir, instance._status_dir)
         self.assertTrue(instance._per_account)
+        self.assertIs(factory.status_cache, instance.status_cache)
+        self.assertEqual(60, factory.status_cache.flush_interval)
+
+    @mock.patch('s3_sync.sync_container.StatsReporterFactory')
+    def test_instance_reuse(self, mock_stats_factory):
+        instance_settings = {'aws_bucket': 'bucket',
+                             'aws_identity': 'identity',
+                             'aws_secret': 'credential',
+                             'account': 'account',
+                             'container': 'container'}
+        factory = SyncContainerFactory({'status_dir': '/foo/bar',
+                                        'statsd_host': 'localhost'})
+        instance = factory.instance(instance_settings)
+        other_instance = factory.instance(dict(instance_settings))
+        self.assertIs(instance.provider, other_instance.provider)
+        self.assertEqual(
+            2, mock_stats_factory.return_value.instance.call_count)
+        mock_stats_factory.assert_called_once_with('localhost', 8125, None)
+
+        other_instance = factory.instance(
+            dict(instance_settings, container='other'))
+        self.assertIsNot(instance.provider, other_instance.provider)
+
+    def test_status_flush_interval(self):
+        factory = SyncContainerFactory({'status_dir': '/foo/bar',
+                                        'status_flush_interval': '5'})
+        self.assertEqual(5, factory.status_cache.flush_interval)
 
     def test_stats_reporting_prefix(self):
         status_dir = '/foo/bar'
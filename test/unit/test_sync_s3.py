@@ -1546,6 +1546,81 @@ class TestSyncS3(unittest.TestCase):
             Body=mock.ANY,
             UploadId='mpu-key-for-slo')
 
+    def test_slo_existing_parts(self):
+        manifest = [{'name': '/segments/slo-object/part1',
+                     'hash': 'deadbeef',
+                     'bytes': 5 * SyncS3.MB},
+                    {'name': '/segments/slo-object/part2',
+                     'hash': 'beefdead',
+                     'bytes': 2 * SyncS3.MB}]
+        s3_meta = {'Metadata': {}, 'ETag': '"%s"' % utils.get_slo_etag(
+            manifest)}
+        self.sync_s3.get_manifest = mock.Mock(return_value=manifest)
+
+        self.assertEqual(
+            {('deadbeef', 5 * SyncS3.MB): 'bytes=0-%d' % (5 * SyncS3.MB - 1),
+             ('beefdead', 2 * SyncS3.MB): 'bytes=%d-%d' % (
+                 5 * SyncS3.MB, 7 * SyncS3.MB - 1)},
+            self.sync_s3._get_existing_parts('slo-object', s3_meta))
+        self.sync_s3.get_manifest.assert_called_once_with('slo-object')
+
+        self.assertEqual({}, self.sync_s3._get_existing_parts(
+            'slo-object', None))
+        self.assertEqual({}, self.sync_s3._get_existing_parts(
+            'slo-object', dict(s3_meta, StorageClass='GLACIER')))
+        # the manifest does not describe the uploaded object
+        self.assertEqual({}, self.sync_s3._get_existing_parts(
+            'slo-object', dict(s3_meta, ETag='"other-etag"')))
+        self.sync_s3.get_manifest.return_value = None
+        self.assertEqual({}, self.sync_s3._get_existing_parts(
+            'slo-object', s3_meta))
+
+    def test_internal_slo_upload_existing_parts(self):
+        slo_meta = {'x-object-meta-foo': 'bar', 'content-type': 'test/blob'}
+        s3_key = self.sync_s3.get_s3_name('slo-object')
+        manifest = [{'name': '/segment_container/slo-object/part1',
+                     'hash': 'deadbeef',
+                     'bytes': 5 * SyncS3.MB},
+                    {'name': '/segment_container/slo-object/part2',
+                     'hash': 'beefdead',
+                     'bytes': 5 * SyncS3.MB}]
+        existing_parts = {('beefdead', 5 * SyncS3.MB): 'bytes=0-5242879'}
+
+        self.mock_boto3_client.create_multipart_upload.return_value = {
+            'UploadId': 'mpu-key-for-slo'}
+        self.mock_boto3_client.upload_part.return_value = {
+            'ETag': '"deadbeef"'}
+        self.mock_boto3_client.upload_part_copy.return_value = {
+            'CopyPartResult': {'ETag': '"beefdead"'}}
+        mock_ic = mock.Mock()
+        mock_ic.get_object.return_value = (
+            200, {'Content-Length': 5 * SyncS3.MB, 'etag': 'deadbeef'},
+            FakeStream(5 * SyncS3.MB))
+
+        self.sync_s3._upload_slo(manifest, slo_meta, s3_key, mock_ic,
+                                 existing_parts=existing_parts)
+
+        self.assertEqual(
+            1, self.mock_boto3_client.upload_part.call_count)
+        self.assertEqual(
+            1, self.mock_boto3_client.upload_part.mock_calls[0][2][
+                'PartNumber'])
+        self.assertEqual(1, mock_ic.get_object.call_count)
+        self.assertEqual(('segment_container', 'slo-object/part1'),
+                         mock_ic.get_object.mock_calls[0][1][1:3])
+        self.mock_boto3_client.upload_part_copy.assert_called_once_with(
+            Bucket=self.aws_bucket, Key=s3_key, PartNumber=2,
+            CopySource={'Bucket': self.aws_bucket, 'Key': s3_key},
+            CopySourceRange='bytes=0-5242879',
+            UploadId='mpu-key-for-slo')
+        self.mock_boto3_client.complete_multipart_upload\
+            .assert_called_once_with(
+                Bucket=self.aws_bucket, Key=s3_key,
+                UploadId='mpu-key-for-slo',
+                MultipartUpload={'Parts': [
+                    {'PartNumber': 1, 'ETag': 'deadbeef'},
+                    {'PartNumber': 2, 'ETag': 'beefdead'}]})
+
     @mock.patch('s3_sync.sync_s3.get_slo_etag')
     def test_slo_meta_changed(self, mock_get_slo_etag):
         slo_key = 'slo-object'
@@ -1624,7 +1699,7 @@ class TestSyncS3(unittest.TestCase):
         self.assertEqual(0, self.sync_s3.update_slo_metadata.call_count)
         self.sync_s3._upload_slo.assert_called_once_with(
             manifest, slo_meta, self.sync_s3.get_s3_name(slo_key), mock_ic,
-            None)
+            None, {})
         mock_ic.get_object_metadata.assert_called_once_with(
             'account', 'container', slo_key, headers=swift_req_headers)
         mock_ic.get_object.assert_called_once_with(
@@ -17,6 +17,7 @@ limitations under the License.
 """
 
 from itertools import repeat
+import eventlet
 import hashlib
 import json
 import mock
@@ -248,6 +249,123 @@ class TestUtilsFunctions(unittest.TestCase):
             'x-object-transient-sysmeta-' + utils.MIGRATOR_HEADER,
             utils.get_sys_migrator_header('object'))
 
+    def test_iter_listing_prefetch(self):
+        pages = [[{'name': 'a', 'content_location': 'loc'},
+                  {'name': 'b', 'content_location': 'loc'}],
+                 [{'subdir': 'c/', 'content_location': 'loc'}],
+                 []]
+        list_func = mock.Mock(side_effect=[
+            base_sync.ProviderResponse(True, 200, {}, page)
+            for page in pages])
+        resp, listing = utils.iter_listing(
+            list_func, mock.Mock(), 'marker', 2, 'prefix', 'delim')
+        self.assertEqual(1, list_func.call_count)
+        self.assertEqual(({'name': 'a', 'content_location': ['loc']}, 'a'),
+                         next(listing))
+        # the next page is requested while this one is consumed
+        eventlet.sleep(0)
+        self.assertEqual(2, list_func.call_count)
+        self.assertEqual(
+            [('b', 'b'), ('c/', 'c/'), (None, None)],
+            [(entry and entry.get('name', entry.get('subdir')), marker)
+             for entry, marker in listing])
+        self.assertEqual([
+            mock.call(marker='marker', limit=2, prefix='prefix',
+                      delimiter='delim'),
+            mock.call(marker='b', limit=2, prefix='prefix',
+                      delimiter='delim'),
+            mock.call(marker='c/', limit=2, prefix='prefix',
+                      delimiter='delim')], list_func.mock_calls)
+
+        # no pages past max_entries are prefetched
+        list_func.reset_mock()
+        list_func.side_effect = [
+            base_sync.ProviderResponse(True, 200, {}, page)
+            for page in pages]
+        resp, listing = utils.iter_listing(
+            list_func, mock.Mock(), '', 2, '', '', max_entries=2)
+        next(listing)
+        eventlet.sleep(0)
+        self.assertEqual(1, list_func.call_count)
+        # later pages are still listed on demand
+        self.assertEqual(3, len(list(listing)))
+        self.assertEqual(3, list_func.call_count)
+
+    def test_iter_prefetched_pages(self):
+        fetched = []
+
+        def _pages(count, error=None):
+            for i in range(count):
+                fetched.append(i)
+                yield [i * 2, i * 2 + 1]
+            if error:
+                raise error
+
+        entries = utils.iter_prefetched_pages(_pages(5), 2)
+        eventlet.sleep(0)
+        # at most depth pages are buffered, while another one is requested
+        self.assertEqual([0, 1, 2], fetched)
+        self.assertEqual(0, next(entries))
+        self.assertEqual(range(1, 10), list(entries))
+        self.assertEqual(range(5), fetched)
+
+        # errors are raised after the preceding entries
+        entries = utils.iter_prefetched_pages(
+            _pages(1, RuntimeError('oops')), 1)
+        self.assertEqual([0, 1], [next(entries), next(entries)])
+        with self.assertRaises(RuntimeError):
+            next(entries)
+
+        # abandoned listings are no longer requested
+        del fetched[:]
+        entries = utils.iter_prefetched_pages(_pages(100), 1)
+        self.assertEqual(0, next(entries))
+        entries.close()
+        eventlet.sleep(0)
+        eventlet.sleep(0)
+        self.assertLess(len(fetched), 5)
+
+        del fetched[:]
+        self.assertEqual(range(4), list(
+            utils.iter_prefetched_pages(_pages(2), 0)))
+        self.assertEqual([0, 1], fetched)
+
+    def test_iter_json_list(self):
+        listing = [{'name': u'\u062a' * i, 'bytes': i, 'hash': ']['}
+                   for i in range(50)]
+        body = json.dumps(listing)
+        chunks = [body[i:i + 7] for i in range(0, len(body), 7)]
+        for chunk_size in (1, 3, 100, utils.DEFAULT_CHUNK_SIZE):
+            self.assertEqual(listing, list(utils.iter_json_list(
+                iter(chunks), chunk_size)))
+        self.assertEqual([], list(utils.iter_json_list([' [\n] '])))
+        self.assertEqual([{'a': 1}, {'b': 2}], list(utils.iter_json_list(
+            ['\n[{"a":', ' 1}\n,\n', '{"b": 2}]'], 4)))
+        for bad in ('', '{}', '[{"a": 1}', '[{"a": 1},'):
+            with self.assertRaises(ValueError):
+                list(utils.iter_json_list([bad]))
+
+    def test_iter_listing_response(self):
+        listing = [{'name': u'a\u062a', 'bytes': 42, 'hash': 'ffff'},
+                   {'subdir': u'b/'}]
+        self.assertEqual(json.dumps(listing), ''.join(
+            utils.iter_listing_response(
+                iter(listing), 'application/json', 'c')))
+        self.assertEqual('[]', ''.join(
+            utils.iter_listing_response([], 'application/json', 'c')))
+        self.assertEqual(
+            '<?xml version="1.0" encoding="UTF-8"?>\n<container name="c"/>',
+            ''.join(utils.iter_listing_response([], 'application/xml', 'c')))
+        self.assertEqual(
+            '<?xml version="1.0" encoding="UTF-8"?>\n<container name="c">'
+            '<object><name>a\xd8\xaa</name><hash>ffff</hash>'
+            '<bytes>42</bytes></object><object><subdir>b/</subdir></object>'
+            '</container>',
+            ''.join(utils.iter_listing_response(
+                listing, 'application/xml', 'c')))
+        self.assertEqual('a\xd8\xaa\nb/', ''.join(
+            utils.iter_listing_response(listing, 'text/plain', 'c')))
+
 
 class FakeSwiftClient(object):
     def __init__(self, status=200, size=1024, content_length='UNSPECIFIED',